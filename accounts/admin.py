@@ -1,3 +1,17 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import UserOrderSummary
+
+
+@admin.register(UserOrderSummary)
+class UserOrderSummaryAdmin(admin.ModelAdmin):
+    list_display = [
+        'user', 'print_order_count', 'typing_order_count', 'shop_order_count',
+        'total_spent', 'last_order_at', 'updated_at'
+    ]
+    search_fields = ['user__username', 'user__email']
+    list_select_related = ['user']
+    readonly_fields = [
+        'user', 'print_order_count', 'print_total_spent', 'typing_order_count', 'typing_total_spent',
+        'shop_order_count', 'shop_total_spent', 'last_order_at', 'updated_at'
+    ]
@@ -0,0 +1,17 @@
+from django.contrib.auth.forms import PasswordResetForm
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+
+from jobs import queue as jobs
+
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """Password reset form that leaves sending the email to a background job"""
+
+    def send_mail(self, subject_template_name, email_template_name, context, from_email, to_email,
+                  html_email_template_name=None):
+        # Rendered here: the context holds the user and token, which can't be queued
+        subject = ''.join(render_to_string(subject_template_name, context).splitlines())
+        body = render_to_string(email_template_name, context)
+        html_message = render_to_string(html_email_template_name, context) if html_email_template_name else None
+        jobs.enqueue(send_mail, subject, body, from_email, [to_email], html_message=html_message, priority=10)
@@ -0,0 +1,54 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import UserOrderSummary
+from core import customers
+
+
+class Command(BaseCommand):
+    help = ('Fill in the normalized email of print and typing orders and link orders '
+            'without a user to the only account using their email')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Orders updated per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Emails used by more than one account are ambiguous and left unlinked
+        user_ids = {}
+        for user_id, email in User.objects.exclude(email='').values_list('id', 'email').iterator():
+            email = customers.normalize_email(email)
+            user_ids[email] = None if email in user_ids else user_id
+
+        touched_users = set()
+        for model in customers.order_models():
+            updated = linked = 0
+            last_pk = 0
+            while True:
+                # Keyset batches keep each query on the primary key index
+                rows = list(
+                    model.objects.filter(pk__gt=last_pk).order_by('pk')
+                    .values_list('pk', model.EMAIL_FIELD, 'email_normalized', 'user_id')[:batch_size]
+                )
+                if not rows:
+                    break
+                last_pk = rows[-1][0]
+                changed = []
+                for pk, email, stored, user_id in rows:
+                    email = customers.normalize_email(email)
+                    new_user_id = user_id or user_ids.get(email)
+                    if email != stored or new_user_id != user_id:
+                        changed.append(model(pk=pk, email_normalized=email, user_id=new_user_id))
+                        if new_user_id != user_id:
+                            linked += 1
+                            touched_users.add(new_user_id)
+                with transaction.atomic():
+                    model.objects.bulk_update(changed, ['email_normalized', 'user'])
+                updated += len(changed)
+            self.stdout.write(f'{model.__name__}: {updated} orders updated, {linked} linked to users')
+
+        for user in User.objects.filter(pk__in=touched_users).iterator():
+            UserOrderSummary.rebuild_for_user(user)
+        self.stdout.write(self.style.SUCCESS(f'Refreshed order summaries for {len(touched_users)} users'))
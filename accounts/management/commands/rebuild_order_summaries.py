@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from accounts.models import UserOrderSummary
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-user order summary table from the order tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild the summary of this username or email')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['user']:
+            users = users.filter(username=options['user']) | users.filter(email__iexact=options['user'])
+
+        count = 0
+        for user in users.iterator():
+            UserOrderSummary.rebuild_for_user(user)
+            count += 1
+            if count % 500 == 0:
+                self.stdout.write(f'  {count} users processed...')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt order summaries for {count} users'))
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserOrderSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('print_order_count', models.PositiveIntegerField(default=0, verbose_name='Print Orders')),
+                ('print_total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Print Spend')),
+                ('typing_order_count', models.PositiveIntegerField(default=0, verbose_name='Typing Orders')),
+                ('typing_total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Typing Spend')),
+                ('shop_order_count', models.PositiveIntegerField(default=0, verbose_name='Shop Orders')),
+                ('shop_total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Shop Spend')),
+                ('last_order_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Order At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='order_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Order Summary',
+                'verbose_name_plural': 'User Order Summaries',
+            },
+        ),
+    ]
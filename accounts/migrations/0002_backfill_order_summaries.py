@@ -0,0 +1,95 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import Coalesce
+
+FIELDS = [
+    'print_order_count', 'print_total_spent', 'typing_order_count', 'typing_total_spent',
+    'shop_order_count', 'shop_total_spent', 'last_order_at',
+]
+
+
+def backfill_order_summaries(apps, schema_editor):
+    """Fill UserOrderSummary for users with orders; mirrors UserOrderSummary.rebuild_for_user"""
+    UserOrderSummary = apps.get_model('accounts', 'UserOrderSummary')
+    PrintOrder = apps.get_model('print_service', 'PrintOrder')
+    PrintOrderAccessory = apps.get_model('print_service', 'PrintOrderAccessory')
+    PrintPriceSettings = apps.get_model('print_service', 'PrintPriceSettings')
+    TypingOrder = apps.get_model('typing_service', 'TypingOrder')
+    TypingOrderAccessory = apps.get_model('typing_service', 'TypingOrderAccessory')
+    Order = apps.get_model('digital_shop', 'Order')
+
+    totals = defaultdict(lambda: {
+        **{field: Decimal('0') if field.endswith('_spent') else 0 for field in FIELDS},
+        'last_order_at': None,
+    })
+
+    def add(user_id, service, count, spent, last):
+        row = totals[user_id]
+        row[f'{service}_order_count'] += count
+        row[f'{service}_total_spent'] += Decimal(spent or 0)
+        if last and (row['last_order_at'] is None or last > row['last_order_at']):
+            row['last_order_at'] = last
+
+    # Print orders have no stored price; priced per (color, sides) group like PrintOrder.calculate_base_price
+    price_settings = PrintPriceSettings.objects.order_by('pk').first()
+    groups = PrintOrder.objects.filter(user__isnull=False).values('user_id', 'color_mode', 'side_type').annotate(
+        count=Count('id'), copies=Sum(F('num_copies') * Coalesce('total_pages', 1)), last=Max('created_at'),
+    ).order_by()
+    for group in groups:
+        if price_settings is None:
+            spent = 50000 * group['count']
+        else:
+            price = price_settings.base_price_per_page
+            if group['color_mode'] == 'color':
+                price = int(price * price_settings.color_price_multiplier)
+            if group['side_type'] == 'double':
+                price = int(price * price_settings.double_sided_discount)
+            spent = price * group['copies']
+        add(group['user_id'], 'print', group['count'], spent, group['last'])
+
+    for row in TypingOrder.objects.filter(user__isnull=False).values('user_id').annotate(
+        count=Count('id'), spent=Sum('total_price'), last=Max('created_at'),
+    ).order_by():
+        add(row['user_id'], 'typing', row['count'], row['spent'], row['last'])
+
+    for service, lines in (('print', PrintOrderAccessory), ('typing', TypingOrderAccessory)):
+        for row in lines.objects.filter(order__user__isnull=False).values('order__user_id').annotate(
+            total=Sum('price'),
+        ).order_by():
+            add(row['order__user_id'], service, 0, row['total'], None)
+
+    for row in Order.objects.filter(user__isnull=False).values('user_id').annotate(
+        count=Count('id'), spent=Sum('total_amount'), last=Max('created_at'),
+    ).order_by():
+        add(row['user_id'], 'shop', row['count'], row['spent'], row['last'])
+
+    # Users without orders read as zero through a missing row; existing rows are recomputed
+    existing = set(UserOrderSummary.objects.values_list('user_id', flat=True))
+    UserOrderSummary.objects.bulk_create(
+        [UserOrderSummary(user_id=user_id, **row) for user_id, row in totals.items() if user_id not in existing],
+        batch_size=500,
+    )
+    summaries = list(UserOrderSummary.objects.filter(user_id__in=existing & set(totals)))
+    for summary in summaries:
+        for field, value in totals[summary.user_id].items():
+            setattr(summary, field, value)
+    UserOrderSummary.objects.bulk_update(summaries, FIELDS, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0001_initial'),
+        ('digital_shop', '0007_unindex_inactive_products'),
+        ('print_service', '0015_link_order_users'),
+        ('typing_service', '0017_link_order_users'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_summaries, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,120 @@
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import Coalesce
+from django.utils.translation import gettext_lazy as _
+
+
+class UserOrderSummary(models.Model):
+    """Denormalized per-user order totals across print, typing and shop orders.
+
+    Kept up to date by the signal handlers in ``accounts.signals`` so the
+    dashboards read one row instead of scanning three order tables. Use the
+    ``rebuild_order_summaries`` management command to backfill.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='order_summary')
+
+    print_order_count = models.PositiveIntegerField(_('Print Orders'), default=0)
+    print_total_spent = models.DecimalField(_('Print Spend'), max_digits=12, decimal_places=2, default=0)
+    typing_order_count = models.PositiveIntegerField(_('Typing Orders'), default=0)
+    typing_total_spent = models.DecimalField(_('Typing Spend'), max_digits=12, decimal_places=2, default=0)
+    shop_order_count = models.PositiveIntegerField(_('Shop Orders'), default=0)
+    shop_total_spent = models.DecimalField(_('Shop Spend'), max_digits=12, decimal_places=2, default=0)
+
+    last_order_at = models.DateTimeField(_('Last Order At'), blank=True, null=True)
+    updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('User Order Summary')
+        verbose_name_plural = _('User Order Summaries')
+
+    def __str__(self):
+        return f"Order summary for {self.user}"
+
+    @property
+    def total_orders(self):
+        return self.print_order_count + self.typing_order_count + self.shop_order_count
+
+    @property
+    def total_spent(self):
+        return self.print_total_spent + self.typing_total_spent + self.shop_total_spent
+
+    @classmethod
+    def for_user(cls, user):
+        """Return the user's summary, computing it if it does not exist yet"""
+        try:
+            return user.order_summary
+        except cls.DoesNotExist:
+            return cls.rebuild_for_user(user)
+
+    @classmethod
+    def rebuild_for_user(cls, user, services=('print', 'typing', 'shop')):
+        """Recompute the given services' totals for one user and save the row"""
+        summary, _ = cls.objects.get_or_create(user=user)
+        update_fields = ['updated_at']
+        for service in services:
+            count, spent, last = getattr(summary, f'_compute_{service}')()
+            setattr(summary, f'{service}_order_count', count)
+            setattr(summary, f'{service}_total_spent', spent)
+            setattr(summary, f'_{service}_last', last)
+            update_fields += [f'{service}_order_count', f'{service}_total_spent']
+        summary.last_order_at = summary._compute_last_order_at(services)
+        update_fields.append('last_order_at')
+        summary.save(update_fields=update_fields)
+        return summary
+
+    def _compute_print(self):
+        from print_service.models import PrintOrder, PrintOrderAccessory, PrintPriceSettings
+
+        orders = PrintOrder.objects.filter(user=self.user)
+        stats = orders.aggregate(count=Count('id'), last=Max('created_at'))
+        # Print orders have no stored price; mirror PrintOrder.calculate_base_price
+        # per (color, sides) group so the cost doesn't grow with the order count
+        price_settings = PrintPriceSettings.load()
+        if price_settings is None:
+            spent = Decimal(50000 * stats['count'])
+        else:
+            spent = Decimal('0')
+            groups = orders.values('color_mode', 'side_type').annotate(
+                copies=Sum(F('num_copies') * Coalesce('total_pages', 1))
+            ).order_by()
+            for group in groups:
+                price = price_settings.base_price_per_page
+                if group['color_mode'] == 'color':
+                    price = int(price * price_settings.color_price_multiplier)
+                if group['side_type'] == 'double':
+                    price = int(price * price_settings.double_sided_discount)
+                spent += Decimal(price * group['copies'])
+        spent += PrintOrderAccessory.objects.filter(order__in=orders).aggregate(total=Sum('price'))['total'] or 0
+        return stats['count'], spent, stats['last']
+
+    def _compute_typing(self):
+        from typing_service.models import TypingOrder, TypingOrderAccessory
+
+        orders = TypingOrder.objects.filter(user=self.user)
+        stats = orders.aggregate(count=Count('id'), spent=Sum('total_price'), last=Max('created_at'))
+        spent = Decimal(stats['spent'] or 0)
+        spent += TypingOrderAccessory.objects.filter(order__in=orders).aggregate(total=Sum('price'))['total'] or 0
+        return stats['count'], spent, stats['last']
+
+    def _compute_shop(self):
+        from digital_shop.models import Order
+
+        stats = Order.objects.filter(user=self.user).aggregate(
+            count=Count('id'), spent=Sum('total_amount'), last=Max('created_at')
+        )
+        return stats['count'], stats['spent'] or Decimal('0'), stats['last']
 
-# Create your models here.
+    def _compute_last_order_at(self, recomputed):
+        """Latest order time, recomputing only services not refreshed just now"""
+        candidates = []
+        for service in ('print', 'typing', 'shop'):
+            if service in recomputed:
+                last = getattr(self, f'_{service}_last')
+            else:
+                last = getattr(self, f'_compute_{service}')()[2]
+            if last:
+                candidates.append(last)
+        return max(candidates) if candidates else None
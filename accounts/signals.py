@@ -0,0 +1,103 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from core import customers
+from digital_shop.models import Order
+from print_service.models import PrintOrder, PrintOrderAccessory
+from print_service.order_lines import lines_created
+from typing_service.models import TypingOrder, TypingOrderAccessory
+from .models import UserOrderSummary
+
+
+def refresh_summaries(user_ids=(), service=None):
+    """Recompute one service's totals for the given users"""
+    services = (service,) if service else ('print', 'typing', 'shop')
+    for user in User.objects.filter(pk__in={pk for pk in user_ids if pk}):
+        UserOrderSummary.rebuild_for_user(user, services=services)
+
+
+@receiver(post_init, sender=PrintOrder)
+@receiver(post_init, sender=TypingOrder)
+def remember_order_user(sender, instance, **kwargs):
+    # Kept so moving an order to another user refreshes the previous owner's summary too
+    instance._summary_user_id = instance.user_id
+
+
+@receiver(post_save, sender=PrintOrder)
+@receiver(post_delete, sender=PrintOrder)
+def print_order_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_summaries([instance.user_id, getattr(instance, '_summary_user_id', None)], service='print')
+    instance._summary_user_id = instance.user_id
+
+
+@receiver(post_save, sender=TypingOrder)
+@receiver(post_delete, sender=TypingOrder)
+def typing_order_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_summaries([instance.user_id, getattr(instance, '_summary_user_id', None)], service='typing')
+    instance._summary_user_id = instance.user_id
+
+
+@receiver(post_save, sender=PrintOrderAccessory)
+@receiver(post_delete, sender=PrintOrderAccessory)
+def print_order_accessory_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    try:
+        user_id = instance.order.user_id
+    except PrintOrder.DoesNotExist:
+        return  # Deleted along with its order, which refreshes the summary itself
+    refresh_summaries([user_id], service='print')
+
+
+@receiver(post_save, sender=TypingOrderAccessory)
+@receiver(post_delete, sender=TypingOrderAccessory)
+def typing_order_accessory_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    try:
+        user_id = instance.order.user_id
+    except TypingOrder.DoesNotExist:
+        return
+    refresh_summaries([user_id], service='typing')
+
+
+@receiver(lines_created, sender=PrintOrderAccessory)
+@receiver(lines_created, sender=TypingOrderAccessory)
+def order_accessories_created(sender, order, **kwargs):
+    """Accessory lines are bulk created without post_save; refresh the summary once per order"""
+    service = 'print' if sender is PrintOrderAccessory else 'typing'
+    refresh_summaries([order.user_id], service=service)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def shop_order_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_summaries([instance.user_id], service='shop')
+
+
+@receiver(post_init, sender=User)
+def remember_user_email(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred email isn't fetched just to remember it
+    instance._linked_email = instance.__dict__.get('email')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Guest orders may predate the account or use its new email; claim them"""
+    if raw:
+        return
+    if update_fields is not None and 'email' not in update_fields:
+        return  # e.g. the last_login update on every login
+    if not created and customers.normalize_email(instance.email) == customers.normalize_email(
+            getattr(instance, '_linked_email', None)):
+        return
+    instance._linked_email = instance.email
+    customers.link_orders(instance)
+    UserOrderSummary.rebuild_for_user(instance)
@@ -1,3 +1,136 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+
+from digital_shop.models import Order
+from print_service.models import PrintOrder, PrintPriceSettings
+from typing_service.models import TypingOrder
+from .models import UserOrderSummary
+
+
+class UserOrderSummaryTests(TestCase):
+    """The summary row must track order saves and deletes across services"""
+
+    def setUp(self):
+        PrintPriceSettings.objects.create(base_price_per_page=1000)
+        self.user = User.objects.create(username='customer', email='customer@example.com')
+
+    def create_print_order(self, email='customer@example.com', **kwargs):
+        return PrintOrder.objects.create(
+            name='Customer', email=email, color_mode='bw', side_type='single',
+            paper_size='A4', delivery_method='pickup', payment_method='online', **kwargs
+        )
+
+    def summary(self):
+        return UserOrderSummary.objects.get(user=self.user)
+
+    def test_orders_update_summary(self):
+        self.create_print_order(num_copies=3)
+        TypingOrder.objects.create(user_name='Customer', user_email='Customer@Example.com', total_price=5000)
+        Order.objects.create(
+            order_number='ORD-1', user=self.user, customer_name='Customer', customer_email='customer@example.com',
+            customer_phone='0912', shipping_address='-', shipping_city='-', shipping_postal_code='-',
+            subtotal=Decimal('200'), total_amount=Decimal('200'),
+        )
+        summary = self.summary()
+        self.assertEqual(summary.print_order_count, 1)
+        self.assertEqual(summary.print_total_spent, Decimal('3000'))
+        self.assertEqual(summary.typing_order_count, 1)
+        self.assertEqual(summary.typing_total_spent, Decimal('5000'))
+        self.assertEqual(summary.shop_order_count, 1)
+        self.assertEqual(summary.total_spent, Decimal('8200'))
+        self.assertIsNotNone(summary.last_order_at)
+
+    def test_delete_and_reassign_update_summary(self):
+        order = self.create_print_order()
+        other = User.objects.create(username='other', email='other@example.com')
+        order.user = other
+        order.save()
+        self.assertEqual(self.summary().print_order_count, 0)
+        self.assertEqual(UserOrderSummary.objects.get(user=other).print_order_count, 1)
+        order.delete()
+        other_summary = UserOrderSummary.objects.get(user=other)
+        self.assertEqual(other_summary.print_order_count, 0)
+        self.assertIsNone(other_summary.last_order_at)
+
+    def test_rebuild_command_backfills(self):
+        self.create_print_order()
+        UserOrderSummary.objects.all().delete()
+        call_command('rebuild_order_summaries', stdout=StringIO())
+        self.assertEqual(self.summary().print_order_count, 1)
+
+
+class OrderUserLinkTests(TestCase):
+    """Print and typing orders are tied to accounts by foreign key"""
+
+    def create_print_order(self, email, **kwargs):
+        return PrintOrder.objects.create(
+            name='Customer', email=email, color_mode='bw', side_type='single',
+            paper_size='A4', delivery_method='pickup', payment_method='online', **kwargs
+        )
+
+    def test_orders_link_by_normalized_email(self):
+        user = User.objects.create(username='customer', email='customer@example.com')
+        order = self.create_print_order(' Customer@Example.COM ')
+        typing = TypingOrder.objects.create(user_name='Customer', user_email='CUSTOMER@example.com')
+        self.assertEqual(order.email_normalized, 'customer@example.com')
+        self.assertEqual(order.user, user)
+        self.assertEqual(typing.user, user)
+
+    def test_guest_orders_are_claimed_by_new_account(self):
+        order = self.create_print_order('guest@example.com')
+        self.assertIsNone(order.user)
+        user = User.objects.create(username='guest', email='Guest@example.com')
+        order.refresh_from_db()
+        self.assertEqual(order.user, user)
+        self.assertEqual(UserOrderSummary.objects.get(user=user).print_order_count, 1)
+
+    def test_only_email_changes_claim_orders(self):
+        user = User.objects.create(username='customer', email='customer@example.com')
+        self.create_print_order('new@example.com')
+        with self.assertNumQueries(1):
+            user.first_name = 'Cu'
+            user.save()
+        with self.assertNumQueries(1):
+            user.save(update_fields=['last_login'])
+        user.email = 'New@example.com'
+        user.save()
+        self.assertEqual(UserOrderSummary.objects.get(user=user).print_order_count, 1)
+
+    def test_shared_email_is_not_linked(self):
+        User.objects.create(username='a', email='shared@example.com')
+        User.objects.create(username='b', email='Shared@example.com')
+        self.assertIsNone(self.create_print_order('shared@example.com').user)
+
+    def test_my_orders_and_tracking_use_indexed_columns(self):
+        user = User.objects.create(username='customer', email='customer@example.com')
+        order = self.create_print_order('customer@example.com')
+        # Historical email spellings no longer matter once the order is linked
+        PrintOrder.objects.filter(pk=order.pk).update(email='old-address@example.com')
+        self.client.force_login(user)
+        response = self.client.get(reverse('print_service:my_orders'))
+        self.assertEqual(list(response.context['orders']), [order])
+
+        response = self.client.get(reverse('print_service:order_track'), {'email': 'Customer@Example.com'})
+        self.assertEqual(response.context['order'], order)
+
+    def test_link_command_backfills_historical_orders(self):
+        user = User.objects.create(username='customer', email='customer@example.com')
+        orders = [self.create_print_order('Customer@example.com') for _ in range(3)]
+        typing = TypingOrder.objects.create(user_name='Customer', user_email='customer@EXAMPLE.com')
+        # As left by the migration that added the columns
+        PrintOrder.objects.update(user=None, email_normalized='')
+        TypingOrder.objects.update(user=None, email_normalized='')
 
-# Create your tests here.
+        call_command('link_order_users', batch_size=2, stdout=StringIO())
+        self.assertEqual(
+            list(PrintOrder.objects.filter(user=user, email_normalized='customer@example.com').order_by('pk')),
+            orders,
+        )
+        typing.refresh_from_db()
+        self.assertEqual((typing.user, typing.email_normalized), (user, 'customer@example.com'))
+        self.assertEqual(UserOrderSummary.objects.get(user=user).print_order_count, 3)
@@ -19,4 +19,5 @@ urlpatterns = [
     path('api/logout/', views.api_logout, name='api_logout'),
     path('api/profile/', views.api_profile, name='api_profile'),
     path('api/register/', views.api_register, name='api_register'),
+    path('api/csrf/', views.api_csrf, name='api_csrf'),
 ] 
\ No newline at end of file
@@ -3,15 +3,18 @@ from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from django.middleware.csrf import get_token
 from django.contrib.auth.models import User
-from django.contrib.auth.forms import PasswordResetForm, SetPasswordForm
+from django.contrib.auth.forms import SetPasswordForm
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_decode
 from django.utils.encoding import force_str
 from django.urls import reverse
 from print_service.models import PrintOrder
 from typing_service.models import TypingOrder
+from .forms import QueuedPasswordResetForm
+from .models import UserOrderSummary
 import json
 
 # Create your views here.
@@ -72,7 +75,7 @@ def register_view(request):
 
 def password_reset_view(request):
     if request.method == 'POST':
-        form = PasswordResetForm(request.POST)
+        form = QueuedPasswordResetForm(request.POST)
         if form.is_valid():
             form.save(
                 request=request,
@@ -82,7 +85,7 @@ def password_reset_view(request):
             )
             return redirect('accounts:password_reset_done')
     else:
-        form = PasswordResetForm()
+        form = QueuedPasswordResetForm()
     return render(request, 'accounts/password_reset.html', {'form': form})
 
 def password_reset_done(request):
@@ -112,12 +115,12 @@ def password_reset_complete(request):
 @login_required
 def dashboard(request):
     user = request.user
-    # Show orders for this user (by email)
-    print_orders = PrintOrder.objects.filter(email__iexact=user.email).order_by('-created_at')
-    typing_orders = TypingOrder.objects.filter(user_email__iexact=user.email).order_by('-created_at')
+    print_orders = PrintOrder.objects.filter(user=user).order_by('-created_at')
+    typing_orders = TypingOrder.objects.filter(user=user).order_by('-created_at')
     return render(request, 'accounts/dashboard.html', {
         'print_orders': print_orders,
         'typing_orders': typing_orders,
+        'order_summary': UserOrderSummary.for_user(user),
         'user': user,
     })
 
@@ -196,6 +199,14 @@ def api_logout(request):
     
     return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
 
+@ensure_csrf_cookie
+def api_csrf(request):
+    """API endpoint giving the React frontend the CSRF token for protected endpoints such as uploads"""
+    if request.method == 'GET':
+        return JsonResponse({'success': True, 'csrf_token': get_token(request)})
+
+    return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
+
 @login_required
 def api_profile(request):
     """API endpoint to get user profile"""
@@ -14,4 +14,19 @@ def get_order_type(order):
 
 @register.filter
 def endswith(value, arg):
-    return str(value).endswith(arg)
\ No newline at end of file
+    return str(value).endswith(arg)
+
+@register.filter
+def div(value, arg):
+    """Divide value by arg, returning 0 when arg is zero or not a number"""
+    try:
+        return float(value) / float(arg)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return 0
+
+@register.filter
+def mul(value, arg):
+    try:
+        return float(value) * float(arg)
+    except (TypeError, ValueError):
+        return 0
@@ -1,3 +1,117 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from print_service.models import PrintOrder
+from typing_service.models import TypingOrder
+from .views import ORDER_QUEUE_PAGE_SIZE
+
+
+class UserStatisticsQueryCountTests(TestCase):
+    """User management pages must not issue per-user order queries"""
+
+    def setUp(self):
+        self.staff = User.objects.create(username='staff', email='staff@example.com', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def create_customers(self, count):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            email = f'user{i}@example.com'
+            User.objects.create(username=f'user{i}', email=email)
+            for _ in range(i % 3):
+                PrintOrder.objects.create(
+                    name='Customer', email=email, color_mode='bw', side_type='single',
+                    paper_size='A4', delivery_method='pickup', payment_method='online',
+                )
+            for _ in range(i % 2):
+                TypingOrder.objects.create(user_name='Customer', user_email=email)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def assert_constant_queries(self, url):
+        self.create_customers(2)
+        few, _ = self.count_queries(url)
+        self.create_customers(20)
+        many, response = self.count_queries(url)
+        self.assertEqual(few, many)
+        return response
+
+    def test_user_statistics_query_count_is_constant(self):
+        response = self.assert_constant_queries(reverse('admin_dashboard:user_statistics'))
+        top_users = response.context['top_users']
+        self.assertEqual(len(top_users), 10)
+        totals = [row['total_orders'] for row in top_users]
+        self.assertEqual(totals, sorted(totals, reverse=True))
+        for row in top_users:
+            email = row['user'].email
+            self.assertEqual(row['print_orders'], PrintOrder.objects.filter(email=email).count())
+            self.assertEqual(row['typing_orders'], TypingOrder.objects.filter(user_email=email).count())
+
+    def test_user_management_query_count_is_constant(self):
+        response = self.assert_constant_queries(reverse('admin_dashboard:user_management'))
+        rows = response.context['users_with_stats']
+        self.assertEqual(len(rows), User.objects.count())
+        self.assertEqual(response.context['stats']['total_users'], User.objects.count())
+        self.assertEqual(response.context['stats']['staff_users'], 1)
+        for row in rows:
+            self.assertEqual(
+                row['total_orders'],
+                PrintOrder.objects.filter(email=row['user'].email).count()
+                + TypingOrder.objects.filter(user_email=row['user'].email).count(),
+            )
+
+
+class OrderQueueTests(TestCase):
+    """The dashboard order queue is merged, ordered and paginated in SQL"""
+
+    def setUp(self):
+        self.staff = User.objects.create(username='staff', email='staff@example.com', is_staff=True)
+        self.client.force_login(self.staff)
+        now = timezone.now()
+        self.expected = []
+        for i in range(ORDER_QUEUE_PAGE_SIZE + 5):
+            if i % 2:
+                order = TypingOrder.objects.create(
+                    user_name=f'Typist {i}', user_email=f't{i}@example.com', payment_slip='slip.png'
+                )
+            else:
+                order = PrintOrder.objects.create(
+                    name=f'Printer {i}', email=f'p{i}@example.com', color_mode='bw', side_type='single',
+                    paper_size='A4', delivery_method='pickup', payment_method='online', payment_slip='slip.png',
+                )
+            type(order).objects.filter(pk=order.pk).update(created_at=now - timedelta(minutes=i))
+            self.expected.append((type(order), order.pk))
+        # Orders without a slip never show up in the queue
+        PrintOrder.objects.create(
+            name='No slip', color_mode='bw', side_type='single',
+            paper_size='A4', delivery_method='pickup', payment_method='online',
+        )
+
+    def get_orders(self, **params):
+        response = self.client.get(reverse('admin_dashboard:dashboard'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, [(type(order), order.pk) for order in response.context['orders']]
+
+    def test_merged_queue_is_ordered_and_paginated(self):
+        response, first = self.get_orders()
+        self.assertEqual(first, self.expected[:ORDER_QUEUE_PAGE_SIZE])
+        self.assertEqual(response.context['page_obj'].paginator.count, len(self.expected))
+        _, second = self.get_orders(page=2)
+        self.assertEqual(second, self.expected[ORDER_QUEUE_PAGE_SIZE:])
 
-# Create your tests here.
+    def test_tab_and_exact_id_search(self):
+        _, typing = self.get_orders(tab='typing')
+        self.assertTrue(all(model is TypingOrder for model, _ in typing))
+        model, pk = self.expected[3]
+        _, found = self.get_orders(tab='typing', q=f'#{pk}')
+        self.assertEqual(found, [(model, pk)])
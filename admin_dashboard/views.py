@@ -8,7 +8,8 @@ from typing_service.models import TypingOrder, TypingPriceSettings
 from government_services.models import DigitalService, DigitalServiceCategory, UserServiceRequest
 from digital_shop.models import Category, Brand, Product, ProductImage, ProductAttribute, Order, OrderItem, Coupon, Banner
 from print_service.forms import AdminPaymentReviewForm
-from django.db.models import Q, Count, F
+from django.db.models import Q, Count, F, Value, CharField
+from django.db.models.functions import Coalesce
 from typing_service.forms import FinalApprovalForm
 from .forms import (
     TypingPriceSettingsForm, PrintPriceSettingsForm, AccessoryForm, 
@@ -23,44 +24,82 @@ from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
 from digital_shop.models import PaymentReceipt
+from accounts.models import UserOrderSummary
+from core import counters, response_cache
 import json
 
 # فقط کاربران staff یا superuser دسترسی داشته باشند
 def staff_required(view_func):
     return user_passes_test(lambda u: u.is_staff or u.is_superuser)(view_func)
 
+ORDER_QUEUE_PAGE_SIZE = 25
+
+def _order_queue_filter(queryset, name_field, email_field, query):
+    """Search filter for the order queue; numeric queries match the order id exactly"""
+    lookup = Q(**{f'{name_field}__icontains': query}) | Q(**{f'{email_field}__icontains': query})
+    order_id = query.lstrip('#')
+    if order_id.isdecimal():
+        lookup |= Q(id=int(order_id))
+    return queryset.filter(lookup)
+
+def _order_queue_rows(queryset, service_type):
+    """Project an order queryset onto the columns shared by the union"""
+    return queryset.annotate(
+        service_type=Value(service_type, output_field=CharField())
+    ).values('id', 'created_at', 'service_type').order_by()
+
 @staff_required
 def dashboard_view(request):
     tab = request.GET.get('tab', '')
     status = request.GET.get('status', '')
     query = request.GET.get('q', '').strip()
 
-    print_orders = PrintOrder.objects.filter(payment_slip__isnull=False)
-    typing_orders = TypingOrder.objects.filter(payment_slip__isnull=False)
+    # Empty file fields are stored as '', so isnull alone keeps orders without a slip
+    print_orders = PrintOrder.objects.filter(payment_slip__isnull=False).exclude(payment_slip='')
+    typing_orders = TypingOrder.objects.filter(payment_slip__isnull=False).exclude(payment_slip='')
 
     if status in ['pending', 'approved', 'rejected']:
         print_orders = print_orders.filter(payment_status=status)
         typing_orders = typing_orders.filter(status=status)
 
     if query:
-        print_orders = print_orders.filter(
-            Q(id__icontains=query) | Q(name__icontains=query) | Q(email__icontains=query)
-        )
-        typing_orders = typing_orders.filter(
-            Q(id__icontains=query) | Q(user_name__icontains=query) | Q(user_email__icontains=query)
-        )
+        print_orders = _order_queue_filter(print_orders, 'name', 'email', query)
+        typing_orders = _order_queue_filter(typing_orders, 'user_name', 'user_email', query)
 
+    # Order, count and slice the merged queue in SQL; only the page's rows are loaded
     if tab == 'print':
-        orders = list(print_orders)
+        rows = _order_queue_rows(print_orders, 'print')
     elif tab == 'typing':
-        orders = list(typing_orders)
+        rows = _order_queue_rows(typing_orders, 'typing')
     else:
-        orders = list(print_orders) + list(typing_orders)
+        rows = _order_queue_rows(print_orders, 'print').union(
+            _order_queue_rows(typing_orders, 'typing'), all=True
+        )
+    rows = rows.order_by('-created_at', '-id')
 
-    orders.sort(key=lambda x: x.created_at, reverse=True)
+    paginator = Paginator(rows, ORDER_QUEUE_PAGE_SIZE)
+    page = paginator.get_page(request.GET.get('page'))
+
+    page_rows = list(page.object_list)
+    print_ids = [row['id'] for row in page_rows if row['service_type'] == 'print']
+    typing_ids = [row['id'] for row in page_rows if row['service_type'] == 'typing']
+    loaded = {
+        'print': PrintOrder.objects.in_bulk(print_ids) if print_ids else {},
+        'typing': TypingOrder.objects.in_bulk(typing_ids) if typing_ids else {},
+    }
+    orders = [
+        loaded[row['service_type']][row['id']]
+        for row in page_rows
+        if row['id'] in loaded[row['service_type']]
+    ]
+
+    page_query = request.GET.copy()
+    page_query.pop('page', None)
 
     context = {
         'orders': orders,
+        'page_obj': page,
+        'page_query': page_query.urlencode(),
         'active_filter': status if status else 'all',
         'active_tab': tab if tab else 'all',
         'query': query,
@@ -68,6 +107,25 @@ def dashboard_view(request):
     return render(request, 'admin_dashboard/dashboard.html', context)
 
 # User Management Views
+def _user_counts(**extra):
+    """Headline user counts (plus any extra aggregates) in a single query"""
+    return User.objects.aggregate(
+        total_users=Count('id'),
+        active_users=Count('id', filter=Q(is_active=True)),
+        staff_users=Count('id', filter=Q(is_staff=True)),
+        superusers=Count('id', filter=Q(is_superuser=True)),
+        **extra
+    )
+
+def _annotate_order_counts(users):
+    """Annotate users with their print/typing order counts from the summary table"""
+    return users.annotate(
+        print_orders_count=Coalesce(F('order_summary__print_order_count'), 0),
+        typing_orders_count=Coalesce(F('order_summary__typing_order_count'), 0),
+    ).annotate(
+        total_orders=F('print_orders_count') + F('typing_orders_count'),
+    )
+
 @staff_required
 def user_management_view(request):
     """Main user management dashboard"""
@@ -96,38 +154,25 @@ def user_management_view(request):
         users = users.filter(is_active=False)
     
     # Get user statistics
-    total_users = User.objects.count()
-    active_users = User.objects.filter(is_active=True).count()
-    staff_users = User.objects.filter(is_staff=True).count()
-    superusers = User.objects.filter(is_superuser=True).count()
-    
-    # Get users with their order counts
-    users_with_stats = []
-    for user in users:
-        print_orders_count = PrintOrder.objects.filter(email=user.email).count()
-        typing_orders_count = TypingOrder.objects.filter(user_email=user.email).count()
-        total_orders = print_orders_count + typing_orders_count
-        
-        users_with_stats.append({
-            'user': user,
-            'print_orders_count': print_orders_count,
-            'typing_orders_count': typing_orders_count,
-            'total_orders': total_orders,
-        })
+    stats = _user_counts()
     
-    # Sort by total orders (most active first)
-    users_with_stats.sort(key=lambda x: x['total_orders'], reverse=True)
+    # Get users with their order counts, most active first
+    users = _annotate_order_counts(users).order_by('-total_orders', 'id')
+    users_with_stats = [
+        {
+            'user': user,
+            'print_orders_count': user.print_orders_count,
+            'typing_orders_count': user.typing_orders_count,
+            'total_orders': user.total_orders,
+        }
+        for user in users
+    ]
     
     context = {
         'users_with_stats': users_with_stats,
         'query': query,
         'filter_type': filter_type,
-        'stats': {
-            'total_users': total_users,
-            'active_users': active_users,
-            'staff_users': staff_users,
-            'superusers': superusers,
-        }
+        'stats': stats,
     }
     return render(request, 'admin_dashboard/user_management.html', context)
 
@@ -137,14 +182,14 @@ def user_detail_view(request, user_id):
     user = get_object_or_404(User, id=user_id)
     
     # Get user's orders
-    print_orders = PrintOrder.objects.filter(email=user.email).order_by('-created_at')
-    typing_orders = TypingOrder.objects.filter(user_email=user.email).order_by('-created_at')
+    print_orders = PrintOrder.objects.filter(user=user).order_by('-created_at')
+    typing_orders = TypingOrder.objects.filter(user=user).order_by('-created_at')
     
-    # Calculate statistics
-    total_print_orders = print_orders.count()
-    total_typing_orders = typing_orders.count()
-    total_spent = sum(order.total_price for order in print_orders if order.total_price) + \
-                  sum(order.total_price for order in typing_orders if order.total_price)
+    # Statistics come from the denormalized summary row
+    summary = UserOrderSummary.for_user(user)
+    total_print_orders = summary.print_order_count
+    total_typing_orders = summary.typing_order_count
+    total_spent = summary.print_total_spent + summary.typing_total_spent
     
     context = {
         'user_detail': user,
@@ -153,6 +198,7 @@ def user_detail_view(request, user_id):
         'total_print_orders': total_print_orders,
         'total_typing_orders': total_typing_orders,
         'total_spent': total_spent,
+        'order_summary': summary,
     }
     return render(request, 'admin_dashboard/user_detail.html', context)
 
@@ -231,54 +277,34 @@ def toggle_staff_status_view(request, user_id):
 @staff_required
 def user_statistics_view(request):
     """Display user statistics and analytics"""
-    # Basic statistics
-    total_users = User.objects.count()
-    active_users = User.objects.filter(is_active=True).count()
-    staff_users = User.objects.filter(is_staff=True).count()
-    superusers = User.objects.filter(is_superuser=True).count()
-    
-    # Users with orders
-    users_with_print_orders = User.objects.filter(
-        email__in=PrintOrder.objects.values_list('email', flat=True).distinct()
-    ).count()
-    
-    users_with_typing_orders = User.objects.filter(
-        email__in=TypingOrder.objects.values_list('user_email', flat=True).distinct()
-    ).count()
-    
-    # Recent activity
-    recent_users = User.objects.filter(
-        date_joined__gte=timezone.now() - timezone.timedelta(days=30)
-    ).count()
+    # Basic statistics, users with orders and recent activity in one query
+    stats = _user_counts(
+        users_with_print_orders=Count('id', filter=Q(
+            id__in=PrintOrder.objects.values('user')
+        )),
+        users_with_typing_orders=Count('id', filter=Q(
+            id__in=TypingOrder.objects.values('user')
+        )),
+        recent_users=Count('id', filter=Q(
+            date_joined__gte=timezone.now() - timezone.timedelta(days=30)
+        )),
+    )
     
     # Top users by order count
-    top_users = []
-    for user in User.objects.all():
-        print_count = PrintOrder.objects.filter(email=user.email).count()
-        typing_count = TypingOrder.objects.filter(user_email=user.email).count()
-        total_orders = print_count + typing_count
-        
-        if total_orders > 0:
-            top_users.append({
-                'user': user,
-                'total_orders': total_orders,
-                'print_orders': print_count,
-                'typing_orders': typing_count,
-            })
-    
-    top_users.sort(key=lambda x: x['total_orders'], reverse=True)
-    top_users = top_users[:10]  # Top 10 users
+    top_users = [
+        {
+            'user': user,
+            'total_orders': user.total_orders,
+            'print_orders': user.print_orders_count,
+            'typing_orders': user.typing_orders_count,
+        }
+        for user in _annotate_order_counts(User.objects.all()).filter(
+            total_orders__gt=0
+        ).order_by('-total_orders', 'id')[:10]  # Top 10 users
+    ]
     
     context = {
-        'stats': {
-            'total_users': total_users,
-            'active_users': active_users,
-            'staff_users': staff_users,
-            'superusers': superusers,
-            'users_with_print_orders': users_with_print_orders,
-            'users_with_typing_orders': users_with_typing_orders,
-            'recent_users': recent_users,
-        },
+        'stats': stats,
         'top_users': top_users,
     }
     return render(request, 'admin_dashboard/user_statistics.html', context)
@@ -340,7 +366,7 @@ def review_payment_view(request, service_type, order_id):
             form = AdminPaymentReviewForm(instance=order)
     else: # This is a typing order
         order = get_object_or_404(TypingOrder, id=order_id)
-        pricing_settings = TypingPriceSettings.objects.first()
+        pricing_settings = TypingPriceSettings.load()
         
         if request.method == 'POST':
             page_count = request.POST.get('page_count')
@@ -508,9 +534,11 @@ def bulk_edit_accessories_view(request):
             
             if action == 'activate':
                 accessories.update(is_active=True)
+                response_cache.touch(Accessory)
                 messages.success(request, f'{accessories.count()} accessories activated!')
             elif action == 'deactivate':
                 accessories.update(is_active=False)
+                response_cache.touch(Accessory)
                 messages.success(request, f'{accessories.count()} accessories deactivated!')
             elif action == 'delete':
                 count = accessories.count()
@@ -633,6 +661,7 @@ def government_services_view(request):
     recent_requests = UserServiceRequest.objects.select_related('user', 'service').order_by('-created_at')[:5]
     
     # Get popular services
+    counters.refresh_for_sort(DigitalService)
     popular_services = DigitalService.objects.filter(status='active').order_by('-view_count')[:5]
     
     context = {
@@ -1240,8 +1269,8 @@ def settings_dashboard(request):
     featured_accessories_count = Accessory.objects.filter(is_featured=True).count()
     
     # Get pricing data
-    print_pricing = PrintPriceSettings.objects.first()
-    typing_pricing = TypingPriceSettings.objects.first()
+    print_pricing = PrintPriceSettings.load()
+    typing_pricing = TypingPriceSettings.load()
     
     # Calculate average bulk discount for print
     avg_bulk_discount = 0
@@ -1261,7 +1290,7 @@ def settings_dashboard(request):
     pending_typing_orders = TypingOrder.objects.filter(status='pending').count()
     
     # Get payment settings
-    payment_settings = PaymentSettings.objects.first()
+    payment_settings = PaymentSettings.load()
     bank_name = payment_settings.bank_name if payment_settings else None
     card_number = payment_settings.card_number if payment_settings else None
     
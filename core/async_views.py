@@ -0,0 +1,25 @@
+"""Helpers for ``async def`` views.
+
+The read-heavy JSON APIs used by the React frontend are async views, so
+under an ASGI server (``smart_office/asgi.py``) a slow client waiting on
+its response no longer holds a worker thread. Under WSGI Django runs them
+in an event loop per request, so both deployments keep working.
+
+Django 4.2's view decorators and shortcuts are sync only; these are the
+async equivalents the API views need.
+"""
+from django.http import Http404
+
+
+def async_csrf_exempt(view):
+    """``csrf_exempt`` for async views: Django 4.2's version hides the coroutine function"""
+    view.csrf_exempt = True
+    return view
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    """``get_object_or_404`` for a queryset, awaiting the lookup"""
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
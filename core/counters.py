@@ -0,0 +1,328 @@
+"""Buffered counters for hot ``+1`` columns such as ``view_count``.
+
+Detail pages used to do a read-modify-write ``save()`` on every hit, which
+takes SQLite's write lock per request and loses increments under concurrency.
+Increments are now accumulated in a buffer and written periodically, one
+``UPDATE ... SET field = field + n`` per distinct ``n``, in a single
+transaction.
+
+Two buffers are available, selected with ``VIEW_COUNTER_BACKEND``:
+
+- ``'local'`` (default): a per-process dict. Cheapest, but each worker flushes
+  only its own increments.
+- ``'cache'``: counts live in the shared Django cache, so any process
+  (including ``manage.py flush_view_counters``) can flush them.
+
+The request that makes a flush due never writes the counters itself: the
+local buffer hands its counts to a ``write_counts`` job and the cache buffer
+queues one ``flush`` job (see ``jobs/queue.py``) for ``run_workers``.
+
+Settings:
+- ``VIEW_COUNTER_FLUSH_INTERVAL``: seconds between automatic flushes (30)
+- ``VIEW_COUNTER_MAX_PENDING``: flush early once this many rows are dirty (500)
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from jobs import queue as jobs
+
+logger = logging.getLogger(__name__)
+
+
+def _group_by_amount(counts):
+    """Turn {pk: n} into {n: [pk, ...]} so equal increments share one UPDATE"""
+    grouped = defaultdict(list)
+    for pk, amount in counts.items():
+        if amount:
+            grouped[amount].append(pk)
+    return grouped
+
+
+def _apply(model, field, counts):
+    """Write {pk: n} increments for one model field, returning rows updated"""
+    updated = 0
+    for amount, pks in _group_by_amount(counts).items():
+        updated += model._default_manager.filter(pk__in=pks).update(**{field: F(field) + amount})
+    return updated
+
+
+class LocalCounterBuffer:
+    """Per-process increment buffer"""
+
+    def __init__(self, flush_interval, max_pending):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._counts = defaultdict(int)  # (model label, field, pk) -> n
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def increment(self, model, pk, field, amount=1):
+        with self._lock:
+            self._counts[(model._meta.label, field, pk)] += amount
+            due = (len(self._counts) >= self.max_pending or
+                   time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.hand_off()
+
+    def pending(self, model, pk, field):
+        with self._lock:
+            return self._counts.get((model._meta.label, field, pk), 0)
+
+    def has_pending(self, model=None):
+        with self._lock:
+            if model is None:
+                return bool(self._counts)
+            label = model._meta.label
+            return any(key[0] == label for key in self._counts)
+
+    def _take(self, model=None):
+        """Remove and return pending counts as {(label, field): {pk: n}}"""
+        label = model._meta.label if model is not None else None
+        taken = defaultdict(dict)
+        with self._lock:
+            for key in list(self._counts):
+                if label is None or key[0] == label:
+                    taken[key[:2]][key[2]] = self._counts.pop(key)
+            if model is None:
+                self._last_flush = time.monotonic()
+        return taken
+
+    def _restore(self, taken):
+        with self._lock:
+            for (label, field), counts in taken.items():
+                for pk, amount in counts.items():
+                    self._counts[(label, field, pk)] += amount
+
+    def hand_off(self):
+        """Move every pending increment into a ``write_counts`` job"""
+        taken = self._take()
+        if not taken:
+            return
+        try:
+            jobs.enqueue(write_counts, [
+                [label, field, list(counts.items())] for (label, field), counts in taken.items()
+            ])
+        except Exception:
+            self._restore(taken)
+            logger.exception('Failed to queue buffered counters')
+
+    def flush(self, model=None):
+        """Write pending increments to the database, returning rows updated"""
+        taken = self._take(model)
+        if not taken:
+            return 0
+        try:
+            with transaction.atomic():
+                return sum(
+                    _apply(apps.get_model(label), field, counts)
+                    for (label, field), counts in taken.items()
+                )
+        except Exception:
+            # Keep the increments for the next flush rather than dropping them
+            self._restore(taken)
+            logger.exception('Failed to flush buffered counters')
+            return 0
+
+
+class CacheCounterBuffer:
+    """Increment buffer stored in the shared Django cache.
+
+    Each row's pending count is a cache integer. A row is added to its
+    model's dirty set when its count goes from zero to positive, which
+    ``incr`` reports atomically, so the dirty set lock is only taken once
+    per row per flush interval rather than on every hit.
+    """
+    prefix = 'view-counter'
+    lock_timeout = 5
+
+    def __init__(self, flush_interval, max_pending):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._last_flush = time.monotonic()
+
+    def _count_key(self, label, field, pk):
+        return f'{self.prefix}:count:{label}:{field}:{pk}'
+
+    def _dirty_key(self, label, field):
+        return f'{self.prefix}:dirty:{label}:{field}'
+
+    def _registry_key(self):
+        return f'{self.prefix}:fields'
+
+    def _acquire(self, key):
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + self.lock_timeout
+        while not cache.add(lock_key, 1, self.lock_timeout):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'Could not acquire {lock_key}')
+            time.sleep(0.01)
+        return lock_key
+
+    def _mark_dirty(self, label, field, pks):
+        dirty_key = self._dirty_key(label, field)
+        lock_key = self._acquire(dirty_key)
+        try:
+            dirty = cache.get(dirty_key) or set()
+            dirty.update(pks)
+            cache.set(dirty_key, dirty, None)
+            fields = cache.get(self._registry_key()) or set()
+            if (label, field) not in fields:
+                fields.add((label, field))
+                cache.set(self._registry_key(), fields, None)
+        finally:
+            cache.delete(lock_key)
+        return len(dirty)
+
+    def _pop_dirty(self, label, field):
+        dirty_key = self._dirty_key(label, field)
+        lock_key = self._acquire(dirty_key)
+        try:
+            dirty = cache.get(dirty_key) or set()
+            cache.delete(dirty_key)
+        finally:
+            cache.delete(lock_key)
+        return dirty
+
+    def increment(self, model, pk, field, amount=1):
+        label = model._meta.label
+        key = self._count_key(label, field, pk)
+        try:
+            value = cache.incr(key, amount)
+        except ValueError:
+            if cache.add(key, amount, None):
+                value = amount
+            else:
+                value = cache.incr(key, amount)
+        if value == amount:
+            dirty_count = self._mark_dirty(label, field, [pk])
+            if dirty_count >= self.max_pending:
+                self.hand_off()
+                return
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.hand_off()
+
+    def hand_off(self):
+        """Queue a ``flush`` job unless one is already waiting"""
+        self._last_flush = time.monotonic()
+        if cache.add(f'{self.prefix}:flush-queued', 1, self.flush_interval):
+            jobs.enqueue(flush)
+
+    def pending(self, model, pk, field):
+        return cache.get(self._count_key(model._meta.label, field, pk)) or 0
+
+    def has_pending(self, model=None):
+        for label, field in cache.get(self._registry_key()) or set():
+            if model is None or label == model._meta.label:
+                if cache.get(self._dirty_key(label, field)):
+                    return True
+        return False
+
+    def flush(self, model=None):
+        """Write pending increments to the database, returning rows updated"""
+        if model is None:
+            self._last_flush = time.monotonic()
+            cache.delete(f'{self.prefix}:flush-queued')
+        updated = 0
+        for label, field in cache.get(self._registry_key()) or set():
+            if model is not None and label != model._meta.label:
+                continue
+            pks = self._pop_dirty(label, field)
+            if not pks:
+                continue
+            keys = {pk: self._count_key(label, field, pk) for pk in pks}
+            values = cache.get_many(list(keys.values()))
+            counts = {pk: values.get(key, 0) for pk, key in keys.items()}
+            try:
+                with transaction.atomic():
+                    updated += _apply(apps.get_model(label), field, counts)
+            except Exception:
+                self._mark_dirty(label, field, pks)
+                logger.exception('Failed to flush buffered counters')
+                continue
+            # Subtract what was written; anything added meanwhile stays pending
+            still_dirty = []
+            for pk, amount in counts.items():
+                if not amount:
+                    continue
+                try:
+                    remaining = cache.decr(keys[pk], amount)
+                except ValueError:
+                    # The count was evicted after it was read; nothing more is pending
+                    continue
+                if remaining > 0:
+                    still_dirty.append(pk)
+            if still_dirty:
+                self._mark_dirty(label, field, still_dirty)
+        return updated
+
+
+BACKENDS = {
+    'local': LocalCounterBuffer,
+    'cache': CacheCounterBuffer,
+}
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                backend = getattr(settings, 'VIEW_COUNTER_BACKEND', 'local')
+                _buffer = BACKENDS[backend](
+                    flush_interval=getattr(settings, 'VIEW_COUNTER_FLUSH_INTERVAL', 30),
+                    max_pending=getattr(settings, 'VIEW_COUNTER_MAX_PENDING', 500),
+                )
+    return _buffer
+
+
+def increment(instance, field='view_count', amount=1):
+    """Buffer an increment of ``instance.<field>``"""
+    get_buffer().increment(type(instance), instance.pk, field, amount)
+
+
+def pending(instance, field='view_count'):
+    """Increments of ``instance.<field>`` not yet written to the database"""
+    return get_buffer().pending(type(instance), instance.pk, field)
+
+
+def flush(model=None):
+    """Write buffered increments, optionally for one model only"""
+    return get_buffer().flush(model)
+
+
+def write_counts(batches):
+    """Job: write increments handed off as ``[[label, field, [[pk, n], ...]], ...]``"""
+    with transaction.atomic():
+        return sum(_apply(apps.get_model(label), field, dict(counts)) for label, field, counts in batches)
+
+
+def refresh_for_sort(model):
+    """Flush a model's pending increments before ordering by a counted field.
+
+    Call this ahead of ``order_by('-view_count')`` style queries so rankings
+    reflect recent hits instead of lagging by up to a flush interval.
+    """
+    buffer = get_buffer()
+    if buffer.has_pending(model):
+        buffer.flush(model)
+
+
+@atexit.register
+def _flush_on_exit():
+    if _buffer is not None:
+        try:
+            _buffer.flush()
+        except Exception:
+            logger.exception('Failed to flush buffered counters at exit')
@@ -0,0 +1,55 @@
+"""Linking print and typing orders to user accounts.
+
+Print and typing orders can be placed without logging in, so besides the
+``user`` foreign key each order stores its contact email lower-cased in an
+indexed ``email_normalized`` column. Lookups by user go through the foreign
+key and guest lookups by email through the normalized column, never through
+``email__iexact`` (which SQLite runs as an unindexable ``LIKE``).
+
+An order is linked to a user when it is created by a logged-in user, when
+its email matches exactly one account, or later when an account with its
+email is created (see ``accounts.signals``). ``manage.py link_order_users``
+backfills orders created before the foreign key existed.
+"""
+from django.contrib.auth import get_user_model
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def user_id_for_email(email):
+    """Return the id of the only account using ``email``, or None if there is none or several"""
+    email = normalize_email(email)
+    if not email:
+        return None
+    ids = list(get_user_model().objects.filter(email__iexact=email).values_list('id', flat=True)[:2])
+    return ids[0] if len(ids) == 1 else None
+
+
+def prepare_order(order, save_kwargs):
+    """Normalize an order's email and link a new order to its account before saving"""
+    order.email_normalized = normalize_email(getattr(order, order.EMAIL_FIELD))
+    if order._state.adding and order.user_id is None:
+        order.user_id = user_id_for_email(order.email_normalized)
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None and order.EMAIL_FIELD in update_fields:
+        save_kwargs['update_fields'] = {*update_fields, 'email_normalized'}
+
+
+def order_models():
+    from print_service.models import PrintOrder
+    from typing_service.models import TypingOrder
+
+    return PrintOrder, TypingOrder
+
+
+def link_orders(user):
+    """Attach unclaimed orders placed with ``user``'s email, returning how many were linked"""
+    email = normalize_email(user.email)
+    if not email:
+        return 0
+    return sum(
+        model.objects.filter(user__isnull=True, email_normalized=email).update(user=user)
+        for model in order_models()
+    )
@@ -0,0 +1,315 @@
+"""Background processing of uploaded images.
+
+Catalog images: listings used to send the original upload to every client.
+Models with a ``RENDITION_SOURCE_FIELD`` (product images, category images,
+brand logos and accessory images) get fixed-width WebP and JPEG copies,
+stored next to the original under deterministic names::
+
+    products/phone.jpg -> products/phone.w320.webp, products/phone.w320.jpg, ...
+
+Originals are never upscaled: widths larger than the upload are skipped,
+and an image narrower than every width gets one rendition at its own width.
+The files made for an upload are recorded in the model's ``renditions``
+JSON field together with the source name, so a replaced upload is noticed
+and its old renditions removed. ``srcset(instance)`` lists them for APIs.
+
+Payment slips: models with a ``SLIP_FIELD`` (shop payment receipts, print
+and typing orders) store phone photos of bank slips. Each new slip has its
+EXIF data (including location) stripped, is downsized to
+``SLIP_MAX_DIMENSION`` and recompressed in place, keeping its name and
+format, and gets a small ``<name>.thumb.jpg`` for the staff queues. Its
+dimensions and byte sizes are recorded in ``slip_details``.
+
+Both are queued as durable jobs (see ``jobs/queue.py``) in the upload's
+transaction and run by ``manage.py run_workers``, or inline when
+``JOB_QUEUE_ASYNC`` is False.
+``manage.py build_image_renditions`` and ``manage.py normalize_payment_slips``
+process existing rows.
+
+Settings:
+- ``IMAGE_RENDITION_WIDTHS``: widths in pixels ((320, 640, 1024))
+- ``IMAGE_RENDITION_FORMATS``: ``'webp'`` and/or ``'jpeg'`` (both)
+- ``IMAGE_RENDITION_QUALITY``: encoder quality (80)
+- ``SLIP_MAX_DIMENSION``: longest slip edge in pixels (2000)
+- ``SLIP_QUALITY``: slip encoder quality (85)
+- ``SLIP_THUMBNAIL_SIZE``: longest thumbnail edge in pixels (320)
+"""
+import io
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from jobs import queue as jobs
+
+from . import response_cache
+
+FORMATS = {
+    'webp': ('WEBP', '.webp', 'image/webp'),
+    'jpeg': ('JPEG', '.jpg', 'image/jpeg'),
+}
+SLIP_FORMATS = ('JPEG', 'PNG', 'WEBP')  # slips in other formats are only thumbnailed
+
+
+def rendition_models():
+    from digital_shop.models import Brand, Category, ProductImage
+    from print_service.models import Accessory
+
+    return ProductImage, Category, Brand, Accessory
+
+
+def _source(instance):
+    return getattr(instance, instance.RENDITION_SOURCE_FIELD)
+
+
+def rendition_name(name, width, fmt):
+    """Deterministic storage name of one rendition of the file ``name``"""
+    return f'{os.path.splitext(name)[0]}.w{width}{FORMATS[fmt][1]}'
+
+
+def is_current(instance):
+    """Whether the stored renditions were made from the instance's current file"""
+    source = _source(instance)
+    return (instance.renditions or {}).get('source', '') == (source.name if source else '')
+
+
+def _widths(original_width):
+    widths = sorted(w for w in getattr(settings, 'IMAGE_RENDITION_WIDTHS', (320, 640, 1024)) if w < original_width)
+    return widths or [original_width]
+
+
+def _flatten(image):
+    """RGB copy of ``image`` for JPEG, which has no alpha channel: transparency becomes white"""
+    from PIL import Image
+
+    if image.mode == 'RGB':
+        return image
+    rgba = image.convert('RGBA')
+    flat = Image.new('RGB', rgba.size, (255, 255, 255))
+    flat.paste(rgba, mask=rgba.getchannel('A'))
+    return flat
+
+
+def _encode(image, fmt):
+    pil_format = FORMATS[fmt][0]
+    quality = getattr(settings, 'IMAGE_RENDITION_QUALITY', 80)
+    if pil_format == 'JPEG':
+        image = _flatten(image)
+    elif pil_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    buffer = io.BytesIO()
+    options = {'optimize': True, 'progressive': True} if pil_format == 'JPEG' else {'method': 4}
+    image.save(buffer, format=pil_format, quality=quality, **options)
+    return buffer.getvalue()
+
+
+def render(field_file):
+    """Write the renditions of a stored image, returning ``[{'width', 'format', 'name'}]``"""
+    from PIL import Image, ImageOps
+
+    storage = field_file.storage
+    with field_file.open('rb') as fh:
+        with Image.open(fh) as original:
+            original = ImageOps.exif_transpose(original)
+            original.load()
+    files = []
+    for width in _widths(original.width):
+        height = max(round(original.height * width / original.width), 1)
+        resized = original if width == original.width else original.resize((width, height), Image.LANCZOS)
+        for fmt in getattr(settings, 'IMAGE_RENDITION_FORMATS', ('webp', 'jpeg')):
+            name = rendition_name(field_file.name, width, fmt)
+            # Replace rather than letting the storage pick a new name
+            if storage.exists(name):
+                storage.delete(name)
+            name = storage.save(name, ContentFile(_encode(resized, fmt)))
+            files.append({'width': width, 'format': fmt, 'name': name})
+    return files
+
+
+def build_renditions(model_label, pk, force=False):
+    """Build the renditions of one row unless they are already current"""
+    model = apps.get_model(model_label)
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None or (is_current(instance) and not force):
+        return None
+    source = _source(instance)
+    renditions = {'source': source.name if source else '', 'files': []}
+    if source:
+        try:
+            renditions['files'] = render(source)
+        except Exception as e:
+            # Unreadable uploads are recorded so they aren't retried on every save
+            renditions['error'] = str(e)[:255] or e.__class__.__name__
+    model._default_manager.filter(pk=pk).update(renditions=renditions)
+    # APIs list the renditions in their srcset
+    response_cache.touch(model)
+
+    kept = {f['name'] for f in renditions['files']}
+    storage = model._meta.get_field(model.RENDITION_SOURCE_FIELD).storage
+    for old in (instance.renditions or {}).get('files', []):
+        if old['name'] not in kept:
+            storage.delete(old['name'])
+    return renditions
+
+
+def srcset(instance):
+    """``[{'url', 'width', 'format', 'type'}]`` of the current renditions, WebP first, narrowest first"""
+    if not is_current(instance):
+        return []
+    storage = _source(instance).storage
+    return [
+        {
+            'url': storage.url(f['name']),
+            'width': f['width'],
+            'format': f['format'],
+            'type': FORMATS[f['format']][2],
+        }
+        for f in sorted(instance.renditions.get('files', []), key=lambda f: (list(FORMATS).index(f['format']), f['width']))
+    ]
+
+
+# Payment slips
+
+def slip_models():
+    from digital_shop.models import PaymentReceipt
+    from print_service.models import PrintOrder
+    from typing_service.models import TypingOrder
+
+    return PaymentReceipt, PrintOrder, TypingOrder
+
+
+def _slip(instance):
+    return getattr(instance, instance.SLIP_FIELD)
+
+
+def slip_is_current(instance):
+    """Whether the instance's slip has been normalized since it was uploaded"""
+    slip = _slip(instance)
+    return (instance.slip_details or {}).get('source', '') == (slip.name if slip else '')
+
+
+def thumbnail_name(name):
+    return f'{os.path.splitext(name)[0]}.thumb.jpg'
+
+
+def _replace(storage, name, content):
+    # Same name as before, so rows and pages referencing the file stay valid
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(content))
+
+
+def _encode_slip(image, pil_format):
+    quality = getattr(settings, 'SLIP_QUALITY', 85)
+    buffer = io.BytesIO()
+    if pil_format == 'JPEG':
+        _flatten(image).save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+    elif pil_format == 'WEBP':
+        image.save(buffer, format='WEBP', quality=quality, method=4)
+    else:
+        image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def normalize_slip(field_file):
+    """Strip EXIF from a slip, downsize and recompress it in place and write a thumbnail.
+
+    Returns the details recorded on the row. The slip keeps its name and
+    format; it is only rewritten when it carried EXIF data, was larger than
+    ``SLIP_MAX_DIMENSION`` or recompressing saves at least a tenth of its size.
+    """
+    from PIL import Image, ImageOps
+
+    storage = field_file.storage
+    name = field_file.name
+    original_bytes = storage.size(name)
+    with field_file.open('rb') as fh:
+        data = fh.read()
+    with Image.open(io.BytesIO(data)) as image:
+        pil_format = image.format if image.format in SLIP_FORMATS else None
+        has_exif = bool(image.getexif()) or 'exif' in image.info
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    max_dimension = getattr(settings, 'SLIP_MAX_DIMENSION', 2000)
+    oversize = max(image.size) > max_dimension
+    if oversize:
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    size = original_bytes
+    if pil_format is not None:
+        encoded = _encode_slip(image, pil_format)
+        # Re-encoding an already compressed slip for a few bytes would only cost quality
+        if has_exif or oversize or len(encoded) < original_bytes * 0.9:
+            name = _replace(storage, name, encoded)
+            size = len(encoded)
+
+    thumbnail_size = getattr(settings, 'SLIP_THUMBNAIL_SIZE', 320)
+    thumbnail = image.copy()
+    thumbnail.thumbnail((thumbnail_size, thumbnail_size), Image.LANCZOS)
+    buffer = io.BytesIO()
+    _flatten(thumbnail).save(buffer, format='JPEG', quality=75, optimize=True)
+    thumbnail_path = _replace(storage, thumbnail_name(name), buffer.getvalue())
+    return {
+        'source': name,
+        'width': image.width,
+        'height': image.height,
+        'bytes': size,
+        'original_bytes': original_bytes,
+        'thumbnail': thumbnail_path,
+    }
+
+
+def process_slip(model_label, pk, force=False):
+    """Normalize one row's slip unless that was already done"""
+    model = apps.get_model(model_label)
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None or (slip_is_current(instance) and not force):
+        return None
+    slip = _slip(instance)
+    details = {'source': slip.name if slip else ''}
+    if slip:
+        try:
+            details = normalize_slip(slip)
+        except Exception as e:
+            # Unreadable uploads are recorded so they aren't retried on every save
+            details['error'] = str(e)[:255] or e.__class__.__name__
+    # A slip replaced meanwhile keeps its own (pending) details
+    model._default_manager.filter(pk=pk, **{model.SLIP_FIELD: slip.name if slip else ''}).update(
+        slip_details=details, **{model.SLIP_FIELD: details['source']},
+    )
+
+    old_thumbnail = (instance.slip_details or {}).get('thumbnail')
+    if old_thumbnail and old_thumbnail != details.get('thumbnail'):
+        model._meta.get_field(model.SLIP_FIELD).storage.delete(old_thumbnail)
+    return details
+
+
+def slip_thumbnail_url(instance):
+    """URL of the slip's review thumbnail, or of the slip itself until one exists"""
+    slip = _slip(instance)
+    if not slip:
+        return ''
+    if slip_is_current(instance) and instance.slip_details.get('thumbnail'):
+        return slip.storage.url(instance.slip_details['thumbnail'])
+    return slip.url
+
+
+def _schedule(task, instance, field):
+    jobs.enqueue(task, instance._meta.label, instance.pk)
+    if jobs.runs_inline():
+        # Keep the caller's instance in step so a later save doesn't write the old value back
+        manager = type(instance)._default_manager
+        setattr(instance, field, manager.filter(pk=instance.pk).values_list(field, flat=True).get())
+
+
+def schedule(instance):
+    """Queue building an instance's renditions if its file changed"""
+    if not is_current(instance):
+        _schedule(build_renditions, instance, 'renditions')
+
+
+def schedule_slip(instance):
+    """Queue normalizing a newly uploaded slip"""
+    if not slip_is_current(instance):
+        _schedule(process_slip, instance, 'slip_details')
@@ -0,0 +1,98 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+DEFAULT_PATHS = [
+    ('digital_shop:api_products', [], {}),
+    ('print_service:pricing_api', [], {}),
+    ('print_service:accessories_api', [], {}),
+    ('print_service:typing_accessories_api', [], {}),
+    ('government_services:service_search_api', [], {'q': 'a'}),
+]
+
+
+def _summary(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Compare concurrent throughput of the async JSON APIs served through the ASGI handler '
+            'with the same views behind a fixed pool of WSGI worker threads')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and mode')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--workers', type=int, default=4, help='WSGI worker threads')
+        parser.add_argument('--client-delay', type=float, default=0.0,
+                            help='Seconds each client spends reading its response, to model slow clients')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='URL to benchmark instead of the default API endpoints (repeatable)')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [
+            reverse(name, args=url_args) + (f'?q={params["q"]}' if params else '')
+            for name, url_args, params in DEFAULT_PATHS
+        ]
+        self.stdout.write(f'{"endpoint":<40} {"mode":<5} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8}')
+        # The in-process test clients send "testserver" as their host
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for path in paths:
+                for mode, run in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+                    result = run(path, options)
+                    self.stdout.write(
+                        f'{path:<40} {mode:<5} {result["rps"]:>8.1f} {result["p50"]:>8.1f} {result["p95"]:>8.1f}'
+                    )
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["requests"]} requests per endpoint, concurrency {options["concurrency"]}, '
+            f'{options["workers"]} WSGI workers, database {settings.DATABASES["default"]["ENGINE"]}'
+        ))
+
+    def run_wsgi(self, path, options):
+        delay = options['client_delay']
+        workers = threading.BoundedSemaphore(options['workers'])
+
+        def request(_):
+            start = time.perf_counter()
+            # Clients wait for a free worker, which stays busy until a slow client has read the response
+            with workers:
+                response = Client().get(path)
+                time.sleep(delay)
+                response.close()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as clients:
+            latencies = list(clients.map(request, range(options['requests'])))
+        return _summary(latencies, time.perf_counter() - start)
+
+    def run_asgi(self, path, options):
+        delay = options['client_delay']
+
+        async def run():
+            client = AsyncClient()
+            slots = asyncio.Semaphore(options['concurrency'])
+
+            async def request():
+                async with slots:
+                    start = time.perf_counter()
+                    await client.get(path)
+                    await asyncio.sleep(delay)
+                    return time.perf_counter() - start
+
+            start = time.perf_counter()
+            latencies = await asyncio.gather(*(request() for _ in range(options['requests'])))
+            return _summary(latencies, time.perf_counter() - start)
+
+        return asyncio.run(run())
@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+ENGINES = ('django.contrib.sessions.backends.db', 'core.sessions')
+
+
+class Command(BaseCommand):
+    help = ('Count django_session writes per 1,000 signed-in requests with the database session engine '
+            'and with core.sessions')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per engine')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='URL requested in turn by the signed-in client (repeatable)')
+        parser.add_argument('--write-every', type=int, default=0,
+                            help='Change the session data on every Nth request (0: never)')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [reverse('digital_shop:api_cart'), reverse('digital_shop:api_products')]
+        self.stdout.write(f'{"engine":<40} {"requests":>8} {"writes":>8} {"per 1k":>8} {"req/s":>8}')
+        # The in-process test client sends "testserver" as its host
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for engine in ENGINES:
+                requests, writes, elapsed = self.run(engine, paths, options)
+                self.stdout.write(
+                    f'{engine:<40} {requests:>8} {writes:>8} {writes * 1000 / requests:>8.1f} '
+                    f'{requests / elapsed:>8.1f}'
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'SESSION_SAVE_EVERY_REQUEST={settings.SESSION_SAVE_EVERY_REQUEST}, '
+            f'SESSION_REFRESH_INTERVAL={getattr(settings, "SESSION_REFRESH_INTERVAL", 300)}s'
+        ))
+
+    def run(self, engine, paths, options):
+        writes = 0
+
+        def count_writes(execute, sql, params, many, context):
+            nonlocal writes
+            if 'django_session' in sql and sql.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')):
+                writes += 1
+            return execute(sql, params, many, context)
+
+        # The benchmark user and its sessions are rolled back at the end
+        with transaction.atomic(), override_settings(SESSION_ENGINE=engine):
+            user = User.objects.create_user(f'session-benchmark-{time.time_ns()}')
+            client = Client()
+            client.force_login(user)
+            start = time.perf_counter()
+            with connection.execute_wrapper(count_writes):
+                for i in range(options['requests']):
+                    if options['write_every'] and i % options['write_every'] == 0:
+                        session = client.session
+                        session['benchmark'] = i
+                        session.save()
+                    client.get(paths[i % len(paths)])
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return options['requests'], writes, elapsed
@@ -0,0 +1,42 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from core import images
+
+
+class Command(BaseCommand):
+    help = 'Build resized WebP/JPEG renditions for catalog images that are missing or out of date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', help='Only process one model, e.g. digital_shop.ProductImage')
+        parser.add_argument('--force', action='store_true', help='Rebuild renditions that are already current')
+
+    def handle(self, *args, **options):
+        models = images.rendition_models()
+        if options['model']:
+            try:
+                model = apps.get_model(options['model'])
+            except (LookupError, ValueError):
+                raise CommandError(f"Unknown model '{options['model']}'")
+            if model not in models:
+                raise CommandError(f'{model._meta.label} has no image renditions')
+            models = [model]
+
+        for model in models:
+            field = model.RENDITION_SOURCE_FIELD
+            built = failed = 0
+            # Read the rows up front: SQLite can't update a table while a cursor over it is open
+            rows = list(model._default_manager.order_by('pk').values_list('pk', field, 'renditions'))
+            for pk, name, renditions in rows:
+                if not options['force'] and (renditions or {}).get('source', '') == (name or ''):
+                    continue
+                result = images.build_renditions(model._meta.label, pk, force=options['force'])
+                if result is None:
+                    continue
+                if result.get('error'):
+                    failed += 1
+                    self.stderr.write(f'{model._meta.label} {pk}: {result["error"]}')
+                else:
+                    built += 1
+            self.stdout.write(f'{model._meta.label}: built renditions for {built} images, {failed} failed')
+        self.stdout.write(self.style.SUCCESS('Image renditions are up to date'))
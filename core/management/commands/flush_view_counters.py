@@ -0,0 +1,32 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from core import counters
+
+
+class Command(BaseCommand):
+    help = 'Write buffered view counter increments to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            help='Only flush one model, e.g. digital_shop.Product',
+        )
+
+    def handle(self, *args, **options):
+        model = None
+        if options['model']:
+            try:
+                model = apps.get_model(options['model'])
+            except (LookupError, ValueError):
+                raise CommandError(f"Unknown model '{options['model']}'")
+
+        buffer = counters.get_buffer()
+        if isinstance(buffer, counters.LocalCounterBuffer):
+            self.stdout.write(self.style.WARNING(
+                'VIEW_COUNTER_BACKEND is "local": only this process\'s buffer can be flushed. '
+                'Use the "cache" backend to flush increments buffered by web workers.'
+            ))
+
+        updated = counters.flush(model)
+        self.stdout.write(self.style.SUCCESS(f'Flushed view counters for {updated} rows'))
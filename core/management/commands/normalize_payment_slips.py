@@ -0,0 +1,48 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from core import images
+
+
+class Command(BaseCommand):
+    help = 'Strip EXIF from, downsize and thumbnail payment slips that have not been processed yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', help='Only process one model, e.g. print_service.PrintOrder')
+
+    def handle(self, *args, **options):
+        models = images.slip_models()
+        if options['model']:
+            try:
+                model = apps.get_model(options['model'])
+            except (LookupError, ValueError):
+                raise CommandError(f"Unknown model '{options['model']}'")
+            if model not in models:
+                raise CommandError(f'{model._meta.label} has no payment slips')
+            models = [model]
+
+        for model in models:
+            field = model.SLIP_FIELD
+            processed = failed = saved = 0
+            # Read the rows up front: SQLite can't update a table while a cursor over it is open
+            rows = list(
+                model._default_manager.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                .order_by('pk').values_list('pk', field, 'slip_details')
+            )
+            for pk, name, details in rows:
+                if (details or {}).get('source') == name:
+                    continue
+                result = images.process_slip(model._meta.label, pk)
+                if result is None:
+                    continue
+                if result.get('error'):
+                    failed += 1
+                    self.stderr.write(f'{model._meta.label} {pk}: {result["error"]}')
+                else:
+                    processed += 1
+                    saved += result['original_bytes'] - result['bytes']
+            self.stdout.write(
+                f'{model._meta.label}: processed {processed} slips, {failed} failed, '
+                f'{saved / (1024 * 1024):.1f} MB saved'
+            )
+        self.stdout.write(self.style.SUCCESS('Payment slips are up to date'))
@@ -1,3 +1,27 @@
 from django.db import models
+from django.db.models import Min, Q
+from django.utils import timezone
 
-# Create your models here.
+
+class ScheduledQuerySet(models.QuerySet):
+    """Queries for rows shown between ``start_date`` and an optional ``end_date``.
+
+    Mirrors the ``is_current`` property of banners and notifications, but in
+    SQL so only live rows are loaded.
+    """
+
+    def current(self, now=None):
+        now = now or timezone.now()
+        return self.filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=now),
+            is_active=True, start_date__lte=now,
+        )
+
+    def next_change(self, now=None):
+        """When the next active row starts or ends after ``now``, or None if none will"""
+        now = now or timezone.now()
+        changes = self.filter(is_active=True).aggregate(
+            start=Min('start_date', filter=Q(start_date__gt=now)),
+            end=Min('end_date', filter=Q(end_date__gte=now)),
+        )
+        return min(filter(None, changes.values()), default=None)
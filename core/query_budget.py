@@ -0,0 +1,151 @@
+"""Per-request query budgets and N+1 detection.
+
+``QueryBudgetMiddleware`` wraps every database connection while a request is
+handled and records each query's SQL, duration and the project line that
+issued it. After the response it:
+
+- flags SQL run more than ``QUERY_BUDGET_MAX_DUPLICATES`` times (the usual
+  N+1 signature: one query per row of a list) with the line that issued it
+- compares the query count against the view's budget, looked up in
+  ``QUERY_BUDGETS`` by URL name (``'digital_shop:api_products'``) or view
+  path (``'digital_shop.views.api_products'``), else ``QUERY_BUDGET_DEFAULT``
+- writes one JSON line per request to the ``core.query_budget`` logger
+  (INFO, or WARNING when the request broke its budget or has N+1 queries)
+- adds an ``X-DB-Queries`` and a ``Server-Timing`` header for staff users
+
+With ``QUERY_BUDGET_ACTION = 'raise'`` violations raise
+``QueryBudgetExceeded`` instead, which is meant for tests.
+
+The middleware is opt-in: it removes itself unless ``QUERY_BUDGET_ENABLED``
+is set.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_THIS_FILE = os.path.normcase(os.path.abspath(__file__))
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised for budget or N+1 violations when ``QUERY_BUDGET_ACTION`` is ``'raise'``"""
+
+
+def sql_shape(sql):
+    """Collapse the parts of parameterized SQL that vary with the data"""
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+def _caller():
+    """Return ``"path:line in function"`` for the innermost project frame"""
+    root = os.path.normcase(str(settings.BASE_DIR))
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.normcase(os.path.abspath(frame.f_code.co_filename))
+        if filename.startswith(root) and filename != _THIS_FILE and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, root)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class QueryRecorder:
+    """Database execute wrapper collecting the queries of one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.callers = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            shape = sql_shape(sql)
+            self.shapes[shape] += 1
+            self.callers[shape][_caller()] += 1
+
+    def duplicates(self, threshold):
+        """Return the SQL shapes run more than ``threshold`` times, most repeated first"""
+        return [
+            {
+                'sql': shape[:500],
+                'count': count,
+                'caller': self.callers[shape].most_common(1)[0][0],
+            }
+            for shape, count in self.shapes.most_common()
+            if count > threshold
+        ]
+
+
+def budget_for(resolver_match):
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    if resolver_match is not None:
+        func = resolver_match.func
+        view_path = f'{func.__module__}.{getattr(func, "__name__", type(func).__name__)}'
+        for key in (resolver_match.view_name, view_path):
+            if key in budgets:
+                return budgets[key]
+    return getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        budget = budget_for(match)
+        duplicates = recorder.duplicates(getattr(settings, 'QUERY_BUDGET_MAX_DUPLICATES', 5))
+        over_budget = budget is not None and recorder.count > budget
+        report = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_time_ms': round(recorder.duration * 1000, 2),
+            'budget': budget,
+            'over_budget': over_budget,
+            'duplicates': duplicates,
+        }
+        violation = over_budget or bool(duplicates)
+        logger.log(logging.WARNING if violation else logging.INFO, json.dumps(report))
+
+        if violation and getattr(settings, 'QUERY_BUDGET_ACTION', 'log') == 'raise':
+            problems = []
+            if over_budget:
+                problems.append(f'{recorder.count} queries (budget {budget})')
+            problems += [f'{d["count"]}x from {d["caller"]}: {d["sql"]}' for d in duplicates]
+            raise QueryBudgetExceeded(f'{request.method} {request.path}: ' + '; '.join(problems))
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            response['X-DB-Queries'] = (
+                f'count={recorder.count}, time_ms={report["db_time_ms"]}, '
+                f'budget={budget if budget is not None else "none"}, duplicates={len(duplicates)}'
+            )
+            response['Server-Timing'] = f'db;dur={report["db_time_ms"]};desc="{recorder.count} queries"'
+        return response
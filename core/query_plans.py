@@ -0,0 +1,38 @@
+"""EXPLAIN QUERY PLAN helpers for the query plan regression tests.
+
+The storefront, "my orders" and dashboard pages rely on the indexes declared
+in the models' ``Meta.indexes``. ``full_scans`` asks SQLite how it would run a
+statement and returns the tables it would read row by row without an index,
+so a test fails as soon as a query change or a dropped index brings a full
+table scan back. SQLite only; other backends word their plans differently.
+"""
+import re
+
+from django.db import connection
+
+# "SCAN <table>" ("SCAN TABLE <table>" before SQLite 3.36). Index scans read
+# "SCAN <table> USING [COVERING] INDEX ..." and don't match.
+_FULL_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def explain(sql, params=(), using=connection):
+    """Return the detail lines of SQLite's plan for ``sql``"""
+    with using.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(sql, tables, params=(), using=connection):
+    """Return the names in ``tables`` that ``sql`` would scan without an index"""
+    scans = []
+    for detail in explain(sql, params, using=using):
+        match = _FULL_SCAN_RE.match(detail.strip())
+        if match and match.group(1) in tables:
+            scans.append(match.group(1))
+    return scans
+
+
+def queryset_full_scans(queryset, tables=None):
+    """``full_scans`` for a queryset, checking its own table by default"""
+    sql, params = queryset.query.sql_with_params()
+    return full_scans(sql, tables or [queryset.model._meta.db_table], params, using=connection)
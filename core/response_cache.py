@@ -0,0 +1,175 @@
+"""Conditional GET and a shared response cache for catalog JSON APIs.
+
+The product, accessory and pricing APIs return the same JSON on every page
+load although the catalog changes a few times a day. ``cached_response``
+wraps such an async view:
+
+- Each model the view reads has a change version in the Django cache, the
+  time it was last saved or deleted. ``track(Model)`` bumps it from
+  ``post_save``/``post_delete`` (and again on commit, so a reader that saw
+  the old rows can't cache them under the new version); code that writes
+  with queryset ``update()`` calls ``touch(Model)`` itself.
+- The strong ETag is a hash of the view, the URL with its query parameters
+  and those versions, so it's known before the view runs. A matching
+  ``If-None-Match`` gets a ``304 Not Modified`` without any query or
+  serialization. ``If-Modified-Since`` is only consulted without
+  ``If-None-Match`` and only answers 304 when the newest version is
+  strictly older than its second. ``Last-Modified`` is rounded up to the
+  next second once that second has passed, so a change made later in the
+  same second is never reported as unmodified.
+- Otherwise the response body is looked up under the ETag in the cache and
+  only rendered by the view on a miss. Only ``200`` responses are stored.
+
+Responses are sent with ``Cache-Control: no-cache``, so browsers keep them
+but revalidate on every use. Every worker must share the cache for
+invalidation to reach it: configure ``CACHES`` with Redis or Memcached when
+running more than one process. Other caches of catalog data can key their
+entries on ``versions()`` to share the same invalidation.
+
+Settings:
+- ``RESPONSE_CACHE_TIMEOUT``: seconds a rendered body is kept (3600)
+"""
+import functools
+import hashlib
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+CACHE_CONTROL = 'no-cache'
+
+
+def _version_key(model):
+    return f'response-cache:version:{model._meta.label_lower}'
+
+
+def _bump(model):
+    cache.set(_version_key(model), time.time_ns(), None)
+
+
+def touch(model):
+    """Mark ``model`` as changed, e.g. after a queryset ``update()``"""
+    _bump(model)
+    transaction.on_commit(lambda: _bump(model))
+
+
+def _model_changed(sender, raw=False, **kwargs):
+    if not raw:
+        touch(sender)
+
+
+def track(*models):
+    """Bump each model's version whenever one of its rows is saved or deleted"""
+    for model in models:
+        uid = f'response-cache:{model._meta.label_lower}'
+        post_save.connect(_model_changed, sender=model, dispatch_uid=uid)
+        post_delete.connect(_model_changed, sender=model, dispatch_uid=uid)
+
+
+def versions(models):
+    """The current version of each model, starting a version for models never changed"""
+    keys = [_version_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # add() so concurrent workers agree on one starting version
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+async def aversions(models):
+    """``versions()`` for async code"""
+    keys = [_version_key(model) for model in models]
+    found = await cache.aget_many(keys)
+    for key in keys:
+        if key not in found:
+            await cache.aadd(key, time.time_ns(), None)
+            found[key] = await cache.aget(key)
+    return [found[key] for key in keys]
+
+
+def _etag(view, request, model_versions):
+    query = sorted(request.GET.lists())
+    seed = f'{view.__module__}.{view.__qualname__}|{request.path}|{query}|{model_versions}'
+    return f'"{hashlib.sha1(seed.encode()).hexdigest()}"'
+
+
+def _last_modified(changed_ns):
+    """The ``Last-Modified`` second for a change made at ``changed_ns``"""
+    second = changed_ns // 10 ** 9
+    # Claim the end of the second only once it is over: until then it may see more changes
+    if time.time_ns() >= (second + 1) * 10 ** 9:
+        second += 1
+    return second
+
+
+def _not_modified(request, etag, changed_ns):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        # If-None-Match takes precedence; the weak comparison applies
+        tags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+        return etag in tags or '*' in tags
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and changed_ns < since * 10 ** 9
+
+
+def cached_response(*models, refresh=None):
+    """Serve an async GET view with ETags, 304s and a shared body cache.
+
+    ``models`` are every model whose rows appear in the response. For views
+    that also show data that changes without a save (counters), ``refresh``
+    limits how many seconds one ETag stays valid.
+    """
+    def decorator(view):
+        if not iscoroutinefunction(view):
+            raise TypeError(f'{view.__qualname__} must be an async view')
+
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view(request, *args, **kwargs)
+
+            model_versions = await aversions(models)
+            changed_ns = max(model_versions)
+            if refresh:
+                window = int(time.time() // refresh)
+                model_versions.append(window)
+                changed_ns = max(changed_ns, window * refresh * 10 ** 9)
+            etag = _etag(view, request, model_versions)
+            headers = {
+                'ETag': etag,
+                'Last-Modified': http_date(_last_modified(changed_ns)),
+                'Cache-Control': CACHE_CONTROL,
+            }
+
+            if _not_modified(request, etag, changed_ns):
+                not_modified = HttpResponseNotModified()
+                for header, value in headers.items():
+                    not_modified[header] = value
+                return not_modified
+
+            body_key = f'response-cache:body:{etag}'
+            cached = await cache.aget(body_key)
+            if cached is not None:
+                content_type, content = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = await view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    return response
+                await cache.aset(
+                    body_key, (response['Content-Type'], response.content),
+                    getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 3600),
+                )
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+        return wrapper
+    return decorator
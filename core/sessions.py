@@ -0,0 +1,141 @@
+"""Session engine that only writes to the database when something changed.
+
+With ``SESSION_SAVE_EVERY_REQUEST`` and the database engine every request
+of a signed-in user, including the React app's JSON polling, ends in an
+``UPDATE django_session``; on SQLite each of those takes the database's
+write lock. This engine keeps every session in the shared cache together
+with a digest of its data and the expiry stored in the database, and saves
+to the database only when:
+
+- the session is new, or its data differs from what was last stored, or
+- the expiry would move forward by at least ``SESSION_REFRESH_INTERVAL``
+  seconds.
+
+Reads come from the cache and fall back to the database. The expiry in the
+database can lag the session cookie by up to the refresh interval.
+
+The cache must be shared by every web process (Redis, Memcached): with a
+per-process ``LocMemCache`` a logout or password change in one process
+would go unnoticed by the others while their copy lives. The system check
+``core.E001`` refuses that configuration, so the project keeps Django's
+database engine until a shared cache is configured. A cache entry is kept
+for at most ``SESSION_REFRESH_INTERVAL`` seconds, which also bounds how
+long an evicted-and-rewritten entry can disagree with the database.
+``manage.py benchmark_sessions`` counts session writes per 1,000 requests
+with this engine and with Django's database engine.
+
+Settings:
+- ``SESSION_ENGINE = 'core.sessions'``, with a shared ``CACHES`` backend
+- ``SESSION_REFRESH_INTERVAL``: seconds between expiry-only writes (300)
+- ``SESSION_CACHE_ALIAS``: cache holding the sessions (``'default'``)
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+KEY_PREFIX = 'core.sessions'
+
+
+def refresh_interval():
+    return getattr(settings, 'SESSION_REFRESH_INTERVAL', 300)
+
+
+def check_session_cache(app_configs=None, **kwargs):
+    """Refuse to cache sessions in a cache that other processes cannot see"""
+    if settings.SESSION_ENGINE != __name__:
+        return []
+    if not isinstance(caches[settings.SESSION_CACHE_ALIAS], LocMemCache):
+        return []
+    return [checks.Error(
+        f'SESSION_ENGINE {__name__!r} needs a shared cache, but SESSION_CACHE_ALIAS '
+        f'{settings.SESSION_CACHE_ALIAS!r} is a per-process LocMemCache.',
+        hint=(
+            'A session ended or changed in one web process would keep working in the others. '
+            "Configure a shared CACHES backend (Redis, Memcached) or use "
+            "SESSION_ENGINE = 'django.contrib.sessions.backends.db'."
+        ),
+        obj=__name__,
+        id='core.E001',
+    )]
+
+
+class SessionStore(DBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        # What the database holds for this session, once known
+        self._stored_digest = None
+        self._stored_expiry = None
+        super().__init__(session_key)
+
+    @property
+    def cache_key(self):
+        return self.cache_key_prefix + self._get_or_create_session_key()
+
+    def _digest(self, data):
+        return hashlib.sha1(self.serializer().dumps(data)).hexdigest()
+
+    def _remember(self, data, expire_date):
+        self._stored_digest = self._digest(data)
+        self._stored_expiry = expire_date
+        entry = {'data': data, 'digest': self._stored_digest, 'expire_date': expire_date}
+        timeout = min(self.get_expiry_age(expiry=expire_date), refresh_interval())
+        self._cache.set(self.cache_key, entry, timeout)
+
+    def load(self):
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            # Some backends (e.g. memcache) raise on invalid keys; start a new session
+            entry = None
+        if entry is not None:
+            self._stored_digest = entry['digest']
+            self._stored_expiry = entry['expire_date']
+            return entry['data']
+        s = self._get_session_from_db()
+        if s is None:
+            return {}
+        data = self.decode(s.session_data)
+        self._remember(data, s.expire_date)
+        return data
+
+    def exists(self, session_key):
+        return (
+            bool(session_key) and (self.cache_key_prefix + session_key) in self._cache
+            or super().exists(session_key)
+        )
+
+    def _unchanged(self, data):
+        if self._stored_expiry is None or self._digest(data) != self._stored_digest:
+            return False
+        interval = timedelta(seconds=refresh_interval())
+        return self.get_expiry_date() - self._stored_expiry < interval
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        if not must_create and self._unchanged(data):
+            return
+        super().save(must_create)
+        self._remember(data, self.get_expiry_date())
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache.delete(self.cache_key_prefix + session_key)
+
+    def flush(self):
+        """Remove the session from the cache and the database and start a new key"""
+        self.clear()
+        self.delete(self.session_key)
+        self._session_key = None
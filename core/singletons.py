@@ -0,0 +1,105 @@
+"""Cached loader for single-row settings models.
+
+Pricing and payment settings are one row each but used to be fetched with
+``Model.objects.first()`` in model methods and views, once per order on list
+pages. ``CachedSingletonMixin.load()`` returns the row from two cache layers:
+
+- a process-local copy, trusted for ``SINGLETON_SETTINGS_LOCAL_TTL`` seconds (5)
+- the shared Django cache, kept for ``SINGLETON_SETTINGS_CACHE_TIMEOUT`` seconds (3600)
+
+Saving or deleting the row through the model clears both layers (and again
+on commit, so a concurrent reader can't re-cache the old row). Other
+processes notice within the local TTL. Queryset ``update()``/``delete()``
+bypass this; call ``invalidate(Model)`` after using them.
+
+Changing the ``SINGLETON_SETTINGS_*`` or ``CACHES`` settings (e.g. with
+``override_settings``) clears every cached row, and the test runner in
+``core/test_runner.py`` clears them before each test.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+_MISSING = object()
+_NONE = '__none__'  # stored in the shared cache when the table is empty
+
+_local = {}  # model label -> (instance or None, loaded at)
+_local_lock = threading.Lock()
+_shared_keys = set()  # shared cache keys written by this process
+
+
+def _cache_key(model):
+    return f'singleton-settings:{model._meta.label_lower}'
+
+
+def get(model):
+    """Return the model's settings row (or None), served from cache when possible"""
+    label = model._meta.label_lower
+    ttl = getattr(settings, 'SINGLETON_SETTINGS_LOCAL_TTL', 5)
+    entry = _local.get(label)
+    if entry is not None and time.monotonic() - entry[1] < ttl:
+        instance = entry[0]
+    else:
+        instance = cache.get(_cache_key(model), _MISSING)
+        if instance is _MISSING:
+            instance = model._default_manager.order_by('pk').first()
+            _shared_keys.add(_cache_key(model))
+            cache.set(
+                _cache_key(model), _NONE if instance is None else instance,
+                getattr(settings, 'SINGLETON_SETTINGS_CACHE_TIMEOUT', 3600),
+            )
+        elif instance == _NONE:
+            instance = None
+        with _local_lock:
+            _local[label] = (instance, time.monotonic())
+    # Callers get their own copy so edits never leak into the cache
+    return copy.copy(instance)
+
+
+def invalidate(model):
+    """Drop the cached row in this process and the shared cache"""
+    with _local_lock:
+        _local.pop(model._meta.label_lower, None)
+    cache.delete(_cache_key(model))
+
+
+def clear():
+    """Drop every cached row this process knows about, e.g. between tests"""
+    with _local_lock:
+        _local.clear()
+    cache.delete_many(list(_shared_keys))
+    _shared_keys.clear()
+
+
+@receiver(setting_changed)
+def settings_changed(setting, **kwargs):
+    if setting == 'CACHES' or setting.startswith('SINGLETON_SETTINGS_'):
+        clear()
+
+
+class CachedSingletonMixin:
+    """Adds a cached ``load()`` to a settings model and invalidates it on save/delete"""
+
+    @classmethod
+    def load(cls):
+        return get(cls)
+
+    def _invalidate_singleton(self):
+        model = type(self)
+        invalidate(model)
+        transaction.on_commit(lambda: invalidate(model))
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._invalidate_singleton()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self._invalidate_singleton()
+        return result
@@ -0,0 +1,216 @@
+"""Fingerprinted, precompressed static files served by the app itself.
+
+``CompressedManifestStaticFilesStorage`` is Django's manifest storage
+(``style.css`` is collected as ``style.3f2a1c9b.css`` and ``{% static %}``
+links to that name) that also writes ``.gz`` and, when the optional
+``brotli`` package is installed, ``.br`` copies of text assets during
+``collectstatic``. Compressed copies that don't save at least 5% are
+dropped.
+
+``StaticFilesMiddleware`` serves ``STATIC_ROOT`` under ``STATIC_URL`` before
+the rest of the middleware runs. It indexes the collected files once per
+process, picks the variant the client prefers by its ``Accept-Encoding``
+q-values (the smallest one on ties; ``q=0`` refuses an encoding), and marks
+fingerprinted names ``immutable`` for a year; other names are cached for
+``STATIC_SERVE_MAX_AGE`` seconds and revalidated with their ETag. Each
+encoding has its own ETag, so a cache never revalidates a gzip body with
+the identity one.
+
+Settings:
+- ``STATIC_SERVE_ENABLED``: serve static files from the app (False); the
+  middleware removes itself otherwise
+- ``STATIC_SERVE_MAX_AGE``: cache lifetime of unhashed names in seconds (60)
+- ``STATIC_COMPRESS_MIN_SIZE``: smallest file compressed, in bytes (512)
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot',
+)
+# Preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def _compressors():
+    compressors = []
+    if brotli is not None:
+        compressors.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    # mtime=0 keeps the output identical across collectstatic runs
+    compressors.append(('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)))
+    return compressors
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Not collected (development, tests): link to the file under its own name
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            yield name, hashed_name, processed
+            names.add(name)
+            if isinstance(hashed_name, str):
+                names.add(hashed_name)
+        for name in sorted(names):
+            for compressed_name in self.compress(name):
+                yield compressed_name, compressed_name, True
+
+    def compress(self, name):
+        """Write compressed copies of ``name``, returning their names"""
+        if not name.lower().endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+            return []
+        with self.open(name) as fh:
+            data = fh.read()
+        if len(data) < getattr(settings, 'STATIC_COMPRESS_MIN_SIZE', 512):
+            return []
+        written = []
+        for suffix, compress in _compressors():
+            compressed = compress(data)
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            if len(compressed) < len(data) * 0.95:
+                self._save(name + suffix, ContentFile(compressed))
+                written.append(name + suffix)
+        return written
+
+
+def parse_accept_encoding(header):
+    """Map each coding in an ``Accept-Encoding`` header to its q-value"""
+    qualities = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities
+
+
+class StaticFile:
+    __slots__ = ('path', 'content_type', 'etag', 'last_modified', 'variants', 'immutable')
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript', 'image/svg+xml'):
+            self.content_type += '; charset=utf-8'
+        self.etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+        self.last_modified = http_date(stat.st_mtime)
+        self.immutable = immutable
+        self.variants = [
+            (encoding, path + suffix, f'{self.etag[:-1]}-{encoding}"')
+            for encoding, suffix in ENCODINGS if os.path.isfile(path + suffix)
+        ]
+
+    def variant(self, accept_encoding):
+        """The (encoding, path, etag) to send for an ``Accept-Encoding`` header"""
+        qualities = parse_accept_encoding(accept_encoding)
+        default = qualities.get('*', 0.0)
+        best, best_quality = (None, self.path, self.etag), 0.0
+        for encoding, path, etag in self.variants:
+            quality = qualities.get(encoding, default)
+            if quality > best_quality:
+                best, best_quality = (encoding, path, etag), quality
+        # An explicitly preferred identity wins over a less wanted encoding
+        if best_quality and qualities.get('identity', 0.0) > best_quality:
+            return None, self.path, self.etag
+        return best
+
+
+def build_index(root):
+    """Map each collected file's URL path (relative to STATIC_URL) to a ``StaticFile``"""
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+    fingerprinted = set(hashed_files.values()) - set(hashed_files)
+    compressed_suffixes = tuple(suffix for _, suffix in ENCODINGS)
+    index = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            if filename.endswith(compressed_suffixes) and os.path.isfile(path[:-3]):
+                continue
+            index[name] = StaticFile(path, immutable=name in fingerprinted)
+    return index
+
+
+class StaticFilesMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'STATIC_SERVE_ENABLED', False) or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self._index = None
+
+    @property
+    def index(self):
+        # Built on first use: collectstatic runs before the app server starts
+        if self._index is None:
+            self._index = build_index(str(settings.STATIC_ROOT))
+        return self._index
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            name = posixpath.normpath(request.path[len(self.prefix):]).lstrip('/')
+            static_file = self.index.get(name)
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return self.get_response(request)
+
+    def serve(self, request, static_file):
+        if static_file.variants:
+            headers = {'Vary': 'Accept-Encoding'}
+        else:
+            headers = {}
+        encoding, path, etag = static_file.variant(request.headers.get('Accept-Encoding', ''))
+        headers['ETag'] = etag
+        headers['Last-Modified'] = static_file.last_modified
+        headers['Cache-Control'] = (
+            IMMUTABLE if static_file.immutable
+            else f'public, max-age={getattr(settings, "STATIC_SERVE_MAX_AGE", 60)}'
+        )
+        # If-None-Match uses the weak comparison
+        matches = [tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))]
+        if etag in matches or '*' in matches:
+            response = HttpResponseNotModified()
+        else:
+            if encoding:
+                headers['Content-Encoding'] = encoding
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=static_file.content_type)
+                response['Content-Length'] = os.path.getsize(path)
+            else:
+                response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+                del response['Content-Disposition']
+        for header, value in headers.items():
+            response[header] = value
+        return response
@@ -0,0 +1,40 @@
+"""Test runner that resets process-level caches before every test.
+
+Cached settings rows (see ``core/singletons.py``) live in module globals, so
+a row cached during one test would outlive the rollback of that test's
+transaction and be served to the next one. ``TEST_RUNNER`` points here so
+no test has to clear them by hand; parallel runs reset them in each worker.
+"""
+import unittest
+
+from django.test.runner import DiscoverRunner, ParallelTestSuite, RemoteTestResult, RemoteTestRunner
+
+from . import singletons
+
+
+class ResetCachesMixin:
+    """Result mixin clearing the process-level caches as each test starts"""
+
+    def startTest(self, test):
+        singletons.clear()
+        super().startTest(test)
+
+
+class RemoteResetCachesResult(ResetCachesMixin, RemoteTestResult):
+    pass
+
+
+class RemoteResetCachesRunner(RemoteTestRunner):
+    resultclass = RemoteResetCachesResult
+
+
+class ResetCachesParallelTestSuite(ParallelTestSuite):
+    runner_class = RemoteResetCachesRunner
+
+
+class TestRunner(DiscoverRunner):
+    parallel_test_suite = ResetCachesParallelTestSuite
+
+    def get_resultclass(self):
+        resultclass = super().get_resultclass() or unittest.TextTestResult
+        return type(f'ResetCaches{resultclass.__name__}', (ResetCachesMixin, resultclass), {})
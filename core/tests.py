@@ -1,3 +1,696 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import parse_http_date
+
+from core import counters, images, response_cache, sessions, staticfiles
+from core.query_budget import QueryBudgetExceeded
+from core.query_plans import full_scans, queryset_full_scans
+from digital_shop.models import Brand, Category, Order, PaymentReceipt, Product, ProductImage
+from government_services.models import UserServiceRequest
+from government_services.models import DigitalService, DigitalServiceCategory
+from jobs import queue
+from print_service.models import Accessory, PrintOrder, PrintPriceSettings
+from typing_service.models import TypingOrder
+
+
+class CachedSingletonTests(TestCase):
+    """Settings rows are loaded once and refreshed when saved"""
+
+    def test_pricing_many_orders_loads_settings_once(self):
+        PrintPriceSettings.objects.create(base_price_per_page=1000)
+        orders = [
+            PrintOrder(name='Customer', color_mode='bw', side_type='single', paper_size='A4',
+                       delivery_method='pickup', payment_method='cod', num_copies=i + 1)
+            for i in range(50)
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            prices = [order.calculate_base_price() for order in orders]
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(prices[4], 5000)
+
+    def test_save_and_delete_invalidate(self):
+        self.assertIsNone(PrintPriceSettings.load())
+        pricing = PrintPriceSettings.objects.create(base_price_per_page=1000)
+        self.assertEqual(PrintPriceSettings.load().base_price_per_page, 1000)
+
+        pricing.base_price_per_page = 2000
+        pricing.save()
+        self.assertEqual(PrintPriceSettings.load().base_price_per_page, 2000)
+
+        # Edits to a loaded copy never leak into the cache
+        loaded = PrintPriceSettings.load()
+        loaded.base_price_per_page = 1
+        self.assertEqual(PrintPriceSettings.load().base_price_per_page, 2000)
+
+        pricing.delete()
+        self.assertIsNone(PrintPriceSettings.load())
+
+    def test_changed_settings_drop_the_cached_rows(self):
+        PrintPriceSettings.objects.create(base_price_per_page=1000)
+        PrintPriceSettings.load()
+        with self.assertNumQueries(0):
+            PrintPriceSettings.load()
+        with override_settings(SINGLETON_SETTINGS_LOCAL_TTL=60), self.assertNumQueries(1):
+            PrintPriceSettings.load()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(TestCase):
+    """Hot pages must not fall back to full scans of the large tables"""
+
+    HOT_TABLES = [model._meta.db_table for model in (
+        Product, Order, PaymentReceipt, PrintOrder, TypingOrder, UserServiceRequest,
+    )]
+
+    def setUp(self):
+        self.user = User.objects.create(username='customer', email='customer@example.com', is_staff=True)
+        self.client.force_login(self.user)
+        self.category = Category.objects.create(name='Laptops', slug='laptops')
+        for i in range(3):
+            Product.objects.create(name=f'Laptop {i}', slug=f'laptop-{i}', sku=f'LP-{i}',
+                                   category=self.category, price=1000 + i)
+            PrintOrder.objects.create(
+                name='Customer', email=self.user.email, color_mode='bw', side_type='single', paper_size='A4',
+                delivery_method='pickup', payment_method='online', payment_slip='slip.png',
+            )
+            TypingOrder.objects.create(user_name='Customer', user_email=self.user.email, payment_slip='slip.png')
+
+    def assert_no_full_scans(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        checked = 0
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not any(table in sql for table in self.HOT_TABLES):
+                continue
+            checked += 1
+            self.assertEqual(full_scans(sql, self.HOT_TABLES), [], sql)
+        self.assertTrue(checked, f'{url} ran no queries on the indexed tables')
+
+    def test_product_list(self):
+        url = reverse('digital_shop:product_list')
+        self.assert_no_full_scans(url)
+        self.assert_no_full_scans(url, {'category': self.category.pk})
+        self.assert_no_full_scans(url, {'sort': 'price_low'})
+
+    def test_my_orders(self):
+        for name in ('digital_shop:my_orders', 'print_service:my_orders', 'typing_service:my_orders'):
+            self.assert_no_full_scans(reverse(name))
+
+    def test_dashboard_order_queue(self):
+        url = reverse('admin_dashboard:dashboard')
+        self.assert_no_full_scans(url)
+        self.assert_no_full_scans(url, {'status': 'pending'})
+        self.assert_no_full_scans(url, {'tab': 'typing', 'status': 'approved'})
+
+    def test_digital_life_dashboard(self):
+        self.assert_no_full_scans(reverse('government_services:digital_life_dashboard'))
+
+    def test_receipts_by_status(self):
+        self.assertEqual(queryset_full_scans(PaymentReceipt.objects.filter(status='pending')), [])
+
+    def test_full_scan_is_detected(self):
+        # Guards the check itself: phone has no index
+        self.assertEqual(
+            queryset_full_scans(PrintOrder.objects.filter(phone='0912')),
+            [PrintOrder._meta.db_table],
+        )
+
+
+@override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_MAX_DUPLICATES=5)
+class QueryBudgetTests(TestCase):
+    """The query budget middleware reports N+1 patterns and budget overruns"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='staff', email='staff@example.com', is_staff=True)
+        self.client.force_login(self.user)
+        for _ in range(7):
+            PrintOrder.objects.create(
+                name='Customer', email=self.user.email, color_mode='bw', side_type='single',
+                paper_size='A4', delivery_method='pickup', payment_method='online',
+            )
+        self.url = reverse('print_service:api_my_orders')
+
+    def test_log_mode_reports_duplicates(self):
+        with self.assertLogs('core.query_budget', 'WARNING') as logs:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        report = json.loads(logs.records[0].getMessage())
+        self.assertEqual(report['view'], 'print_service:api_my_orders')
+        self.assertFalse(report['over_budget'])
+        # Accessories are loaded per order
+        self.assertGreaterEqual(report['duplicates'][0]['count'], 7)
+        self.assertIn('print_service/views.py', report['duplicates'][0]['caller'])
+        self.assertIn(f'count={report["queries"]}', response['X-DB-Queries'])
+        self.assertIn('Server-Timing', response)
+
+    @override_settings(QUERY_BUDGET_ACTION='raise', QUERY_BUDGETS={'print_service:api_my_orders': 3})
+    def test_raise_mode(self):
+        with self.assertLogs('core.query_budget', 'WARNING'):
+            with self.assertRaisesMessage(QueryBudgetExceeded, '(budget 3)'):
+                self.client.get(self.url)
+
+    @override_settings(QUERY_BUDGET_ACTION='raise', QUERY_BUDGETS={'print_service.views.my_orders': 10})
+    def test_within_budget_by_view_path(self):
+        with self.assertLogs('core.query_budget', 'INFO') as logs:
+            response = self.client.get(reverse('print_service:my_orders'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(logs.records[0].getMessage())['budget'], 10)
+
+    @override_settings(QUERY_BUDGET_ENABLED=False)
+    def test_disabled_by_default(self):
+        self.assertNotIn('X-DB-Queries', self.client.get(self.url))
+
+
+def image_upload(name, size=(1200, 800), mode='RGB'):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'red').save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(JOB_QUEUE_ASYNC=False)
+class ImageRenditionTests(TestCase):
+    """Catalog uploads get deterministic WebP/JPEG renditions listed by the APIs"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.media_root = media_root
+        category = Category.objects.create(name='Phones', slug='phones')
+        self.product = Product.objects.create(name='Phone', slug='phone', sku='PH-1', category=category, price=100)
+
+    def test_upload_builds_renditions_without_upscaling(self):
+        from PIL import Image
+
+        image = ProductImage.objects.create(product=self.product, image=image_upload('phone.png'))
+        image.refresh_from_db()
+        files = image.renditions['files']
+        self.assertEqual(image.renditions['source'], 'products/phone.png')
+        self.assertEqual({(f['width'], f['name']) for f in files if f['format'] == 'webp'}, {
+            (320, 'products/phone.w320.webp'), (640, 'products/phone.w640.webp'), (1024, 'products/phone.w1024.webp'),
+        })
+        with Image.open(os.path.join(self.media_root, 'products/phone.w640.jpg')) as rendition:
+            self.assertEqual((rendition.format, rendition.size), ('JPEG', (640, 427)))
+
+        small = Accessory.objects.create(name='Clip', description='', base_price=1, category='binding',
+                                         service_type='print', image=image_upload('clip.png', (200, 50), 'RGBA'))
+        self.assertEqual([(s['width'], s['type']) for s in images.srcset(small)],
+                         [(200, 'image/webp'), (200, 'image/jpeg')])
+
+    def test_replaced_upload_removes_old_renditions(self):
+        image = ProductImage.objects.create(product=self.product, image=image_upload('old.png'))
+        image.image = image_upload('new.png', (400, 400))
+        image.save()
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'products/old.w320.webp')))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, 'products/new.w320.webp')))
+        self.assertEqual([s['width'] for s in images.srcset(image)], [320, 320])
+
+    def test_api_lists_srcset(self):
+        ProductImage.objects.create(product=self.product, image=image_upload('phone.png'))
+        response = self.client.get(reverse('digital_shop:api_products'))
+        srcset = response.json()['products'][0]['images'][0]['srcset']
+        self.assertEqual(srcset[0], {
+            'url': '/media/products/phone.w320.webp', 'width': 320, 'format': 'webp', 'type': 'image/webp',
+        })
+
+    def test_backfill_command(self):
+        image = ProductImage.objects.create(product=self.product, image=image_upload('phone.png'))
+        broken = ProductImage.objects.create(
+            product=self.product, image=SimpleUploadedFile('broken.png', b'not an image'),
+        )
+        ProductImage.objects.update(renditions={})
+        out, err = io.StringIO(), io.StringIO()
+        call_command('build_image_renditions', '--model', 'digital_shop.ProductImage', stdout=out, stderr=err)
+        self.assertIn('built renditions for 1 images, 1 failed', out.getvalue())
+        image.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual(len(image.renditions['files']), 6)
+        self.assertTrue(broken.renditions['error'])
+
+        out = io.StringIO()
+        call_command('build_image_renditions', stdout=out)
+        self.assertNotIn('built renditions for 1', out.getvalue())
+
+
+def photo_upload(name, size=(3000, 2000), orientation=6):
+    from PIL import Image
+
+    exif = Image.Exif()
+    exif[0x0112] = orientation  # rotated 90 degrees, as phone cameras store portrait shots
+    exif[0x010F] = 'PhoneMaker'
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'blue').save(buffer, format='JPEG', quality=95, exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(JOB_QUEUE_ASYNC=False, SLIP_MAX_DIMENSION=1000, SLIP_THUMBNAIL_SIZE=200)
+class PaymentSlipTests(TestCase):
+    """Slips are stripped of EXIF, downsized in place and thumbnailed for the staff queue"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.media_root = media_root
+
+    def test_slip_is_normalized_in_place(self):
+        from PIL import Image
+
+        order = TypingOrder.objects.create(user_name='Customer', payment_slip=photo_upload('slip.jpg'))
+        order.refresh_from_db()
+        details = order.slip_details
+        self.assertEqual(order.payment_slip.name, 'typing_payment_slips/slip.jpg')
+        self.assertEqual((details['width'], details['height']), (667, 1000))
+        self.assertLess(details['bytes'], details['original_bytes'])
+        with Image.open(order.payment_slip.path) as slip:
+            self.assertEqual((slip.format, slip.size, len(slip.getexif())), ('JPEG', (667, 1000), 0))
+        with Image.open(os.path.join(self.media_root, details['thumbnail'])) as thumbnail:
+            self.assertEqual(thumbnail.size, (133, 200))
+        self.assertEqual(order.slip_thumbnail_url, '/media/typing_payment_slips/slip.thumb.jpg')
+
+        # Later saves don't process the slip again
+        order.status = 'approved'
+        order.save()
+        self.assertEqual(os.path.getsize(order.payment_slip.path), details['bytes'])
+
+    def test_staff_queue_shows_thumbnails(self):
+        staff = User.objects.create(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        PrintOrder.objects.create(
+            name='Customer', email='c@example.com', color_mode='bw', side_type='single',
+            delivery_method='pickup', payment_method='online', payment_slip=photo_upload('slip.jpg'),
+        )
+        response = self.client.get(reverse('admin_dashboard:dashboard'))
+        self.assertContains(response, 'src="/media/payment_slips/slip.thumb.jpg"')
+
+    def test_backfill_command(self):
+        with override_settings(JOB_QUEUE_ASYNC=True):
+            order = TypingOrder.objects.create(user_name='Customer', payment_slip=photo_upload('old.jpg'))
+        self.assertEqual(order.slip_thumbnail_url, '/media/typing_payment_slips/old.jpg')
+        out = io.StringIO()
+        call_command('normalize_payment_slips', stdout=out)
+        self.assertIn('TypingOrder: processed 1 slips, 0 failed', out.getvalue())
+        order.refresh_from_db()
+        self.assertEqual(order.slip_details['height'], 1000)
+
+
+class StaticFilesTests(TestCase):
+    """collectstatic writes hashed, precompressed files that the middleware serves"""
+
+    def setUp(self):
+        source, root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        for directory in (source, root):
+            self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        os.makedirs(os.path.join(source, 'css'))
+        with open(os.path.join(source, 'css', 'app.css'), 'w') as fh:
+            fh.write('body { color: red; }\n' * 100)
+        with open(os.path.join(source, 'css', 'tiny.css'), 'w') as fh:
+            fh.write('a { color: blue; }\n')
+        overrides = override_settings(
+            STATICFILES_DIRS=[source], STATIC_ROOT=root, STATIC_SERVE_ENABLED=True, STATIC_SERVE_MAX_AGE=60,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.hashed = staticfiles_storage.stored_name('css/app.css')
+        self.root = root
+
+    def test_collectstatic_writes_hashed_compressed_files(self):
+        self.assertRegex(self.hashed, r'^css/app\.[0-9a-f]{12}\.css$')
+        with open(os.path.join(self.root, self.hashed), 'rb') as fh, \
+                gzip.open(os.path.join(self.root, self.hashed + '.gz')) as compressed:
+            self.assertEqual(compressed.read(), fh.read())
+        # Too small to be worth compressing
+        self.assertFalse(os.path.exists(os.path.join(self.root, staticfiles_storage.stored_name('css/tiny.css') + '.gz')))
+
+    def test_middleware_serves_compressed_immutable_files(self):
+        url = f'/static/{self.hashed}'
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertTrue(response['Content-Type'].startswith('text/css'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b'body { color: red; }\n' * 100)
+
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=plain['ETag']).status_code, 304)
+
+        unhashed = self.client.get('/static/css/app.css')
+        self.assertEqual(unhashed['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(self.client.get('/static/css/missing.css').status_code, 404)
+
+    def test_accept_encoding_q_values_and_etags(self):
+        url = f'/static/{self.hashed}'
+        refused = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0, br;q=0')
+        self.assertNotIn('Content-Encoding', refused)
+        self.assertNotIn('Content-Encoding', self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0.5, identity'))
+        self.assertNotIn('Content-Encoding', self.client.get(url, HTTP_ACCEPT_ENCODING='*;q=0'))
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='*')['Content-Encoding'], 'gzip')
+
+        gzipped = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotEqual(gzipped['ETag'], refused['ETag'])
+        # A cached gzip body is not confirmed for a client that needs identity, and vice versa
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=gzipped['ETag']).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='gzip',
+                                         HTTP_IF_NONE_MATCH=refused['ETag']).status_code, 200)
+        not_modified = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=f'W/{gzipped["ETag"]}')
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], gzipped['ETag'])
+
+    def test_parse_accept_encoding(self):
+        self.assertEqual(staticfiles.parse_accept_encoding('br;q=0, gzip ; q=0.8, deflate, , x;q=bad'),
+                         {'br': 0.0, 'gzip': 0.8, 'deflate': 1.0, 'x': 0.0})
+
+
+class AsyncApiTests(TestCase):
+    """The read-heavy JSON APIs are async views that work through both handlers"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Phones', slug='phones')
+        self.product = Product.objects.create(name='Phone', slug='phone', sku='PH-1', category=category, price=100)
+        Accessory.objects.create(name='Spiral binding', description='', base_price=5000, category='binding',
+                                 service_type='both')
+        Accessory.objects.create(name='Cover', description='', base_price=2000, category='finishing',
+                                 service_type='print')
+        service_category = DigitalServiceCategory.objects.create(name='Identity')
+        DigitalService.objects.create(name='Passport renewal', category=service_category,
+                                      description='Renew a passport', status='active')
+
+    async def test_async_client(self):
+        client = AsyncClient()
+        response = await client.get(reverse('digital_shop:api_products'))
+        self.assertEqual(response.json()['products'][0]['name'], 'Phone')
+        response = await client.get(reverse('digital_shop:api_product_detail', args=[self.product.pk]))
+        self.assertEqual(response.json()['product']['category']['name'], 'Phones')
+        response = await client.get(reverse('print_service:accessories_api'))
+        self.assertEqual(set(response.json()['accessories_by_category']), {'binding', 'finishing'})
+        response = await client.get(reverse('print_service:typing_accessories_api'))
+        self.assertEqual(set(response.json()['accessories_by_category']), {'binding'})
+        response = await client.get(reverse('government_services:service_search_api'), {'q': 'passport'})
+        self.assertEqual(response.json()['results'][0]['category'], 'Identity')
+        response = await client.get(reverse('print_service:pricing_api'))
+        self.assertIn('base_price_per_page', response.json())
+
+    def test_sync_client_and_csrf_exemption(self):
+        response = self.client.get(reverse('digital_shop:api_product_detail', args=[self.product.pk]))
+        self.assertEqual(response.json()['product']['name'], 'Phone')
+        csrf_client = self.client_class(enforce_csrf_checks=True)
+        self.assertEqual(csrf_client.post(reverse('digital_shop:api_products')).status_code, 405)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_api', '--requests', '4', '--concurrency', '2', '--workers', '2',
+                     '--path', reverse('print_service:pricing_api'), stdout=out)
+        self.assertRegex(out.getvalue(), r'/print/api/pricing/ +wsgi')
+        self.assertRegex(out.getvalue(), r'/print/api/pricing/ +asgi')
+
+
+class ResponseCacheTests(TestCase):
+    """Catalog APIs answer revalidations with 304 and reuse cached bodies until their models change"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        category = Category.objects.create(name='Phones', slug='phones')
+        self.product = Product.objects.create(name='Phone', slug='phone', sku='PH-1', category=category, price=100)
+        Accessory.objects.create(name='Cover', description='', base_price=2000, category='finishing',
+                                 service_type='print')
+        PrintPriceSettings.objects.create(base_price_per_page=1000)
+
+    def test_revalidation_returns_304_without_queries(self):
+        url = reverse('digital_shop:api_products')
+        response = self.client.get(url)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+
+    def test_if_modified_since(self):
+        url = reverse('digital_shop:api_products')
+        # Changes made within the current second can't be told apart by date
+        with mock.patch.object(response_cache.time, 'time_ns', return_value=time.time_ns()):
+            response_cache.touch(Product)
+            fresh = self.client.get(url)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=fresh['Last-Modified']).status_code, 200)
+
+        changed = time.time_ns() - 10 * 10 ** 9
+        with mock.patch.object(response_cache.time, 'time_ns', return_value=changed):
+            for model in (Product, ProductImage, Category, Brand):
+                response_cache.touch(model)
+        response = self.client.get(url)
+        self.assertEqual(parse_http_date(response['Last-Modified']), changed // 10 ** 9 + 1)
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+        # A stale ETag wins over a current date
+        stale = self.client.get(url, HTTP_IF_NONE_MATCH='"stale"', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(stale.status_code, 200)
+
+        response_cache.touch(Product)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 200)
+
+    def test_cached_body_is_shared(self):
+        url = reverse('print_service:pricing_api')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second['Content-Type'], 'application/json')
+
+    def test_query_parameters_are_part_of_the_etag(self):
+        url = reverse('digital_shop:api_products')
+        self.assertNotEqual(
+            self.client.get(url, {'fields': 'name'})['ETag'], self.client.get(url, {'fields': 'price'})['ETag']
+        )
+        self.assertEqual(
+            self.client.get(url + '?limit=5&fields=name')['ETag'], self.client.get(url + '?fields=name&limit=5')['ETag']
+        )
+
+    def test_saving_a_model_invalidates_its_apis_only(self):
+        products_url = reverse('digital_shop:api_products')
+        accessories_url = reverse('print_service:accessories_api')
+        products_etag = self.client.get(products_url)['ETag']
+        accessories_etag = self.client.get(accessories_url)['ETag']
+
+        self.product.name = 'Smartphone'
+        self.product.save()
+        response = self.client.get(products_url, HTTP_IF_NONE_MATCH=products_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['products'][0]['name'], 'Smartphone')
+        self.assertEqual(self.client.get(accessories_url, HTTP_IF_NONE_MATCH=accessories_etag).status_code, 304)
+
+        pricing_url = reverse('print_service:pricing_api')
+        self.client.get(pricing_url)
+        settings_row = PrintPriceSettings.objects.get()
+        settings_row.base_price_per_page = 1500
+        settings_row.save()
+        self.assertEqual(self.client.get(pricing_url).json()['base_price_per_page'], 1500)
+
+    def test_queryset_updates_touch_the_version(self):
+        url = reverse('digital_shop:api_product_detail', args=[self.product.pk])
+        etag = self.client.get(url)['ETag']
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=0)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response_cache.touch(Product)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['product']['in_stock'])
+
+    def test_errors_are_not_cached(self):
+        url = reverse('digital_shop:api_products')
+        self.assertEqual(self.client.get(url, {'cursor': 'bogus'}).status_code, 400)
+        response = self.client.get(url, {'cursor': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('ETag', response)
+
+
+@override_settings(SESSION_ENGINE='core.sessions')
+class SessionStoreTests(TestCase):
+    """Sessions are served from the cache and written only when they change"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user('reader', password='pw')
+        self.client.force_login(self.user)
+
+    def session_writes(self, *paths):
+        with CaptureQueriesContext(connection) as queries:
+            for path in paths:
+                self.client.get(path)
+        return [
+            q['sql'] for q in queries.captured_queries
+            if 'django_session' in q['sql'] and q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+
+    def test_unchanged_sessions_are_not_written(self):
+        url = reverse('digital_shop:api_cart')
+        self.assertEqual(self.session_writes(url, url, url), [])
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_changed_data_is_written_and_read_back(self):
+        session = self.client.session
+        session['theme'] = 'dark'
+        session.save()
+        cache.clear()
+        self.assertEqual(self.client.session['theme'], 'dark')
+        self.assertEqual(self.session_writes(reverse('digital_shop:api_cart')), [])
+
+    @override_settings(SESSION_REFRESH_INTERVAL=0)
+    def test_expiry_is_refreshed_after_the_interval(self):
+        self.assertEqual(len(self.session_writes(reverse('digital_shop:api_cart'))), 1)
+
+    @override_settings(SESSION_REFRESH_INTERVAL=120)
+    def test_cached_sessions_expire_after_the_refresh_interval(self):
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            session = self.client.session
+            session['theme'] = 'dark'
+            session.save()
+        self.assertEqual(cache_set.call_args.args[2], 120)
+
+    def test_per_process_cache_is_refused(self):
+        self.assertEqual([error.id for error in sessions.check_session_cache()], ['core.E001'])
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            self.assertEqual(sessions.check_session_cache(), [])
+
+    def test_logout_removes_the_cached_session(self):
+        session_key = self.client.session.session_key
+        self.client.logout()
+        self.assertFalse(self.client.session.exists(session_key))
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_sessions', '--requests', '10', stdout=out)
+        self.assertRegex(out.getvalue(), r'backends\.db +10 +10 ')
+        self.assertRegex(out.getvalue(), r'core\.sessions +10 +0 ')
+
+
+class CounterBufferMixin:
+    """Behaviour shared by both view counter buffers"""
+    buffer_class = None
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        category = Category.objects.create(name='Phones', slug='phones')
+        self.products = [
+            Product.objects.create(name=f'Phone {i}', slug=f'phone-{i}', sku=f'PH-{i}', category=category,
+                                   price=100)
+            for i in range(3)
+        ]
+
+    def make_buffer(self, flush_interval=3600, max_pending=100):
+        return self.buffer_class(flush_interval=flush_interval, max_pending=max_pending)
+
+    def view_counts(self):
+        return list(Product.objects.order_by('id').values_list('view_count', flat=True))
+
+    def test_increments_are_buffered_until_flushed(self):
+        buffer = self.make_buffer()
+        first, second, _ = self.products
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                buffer.increment(Product, first.pk, 'view_count')
+            buffer.increment(Product, second.pk, 'view_count', 2)
+        self.assertEqual(buffer.pending(Product, first.pk, 'view_count'), 3)
+        self.assertTrue(buffer.has_pending(Product))
+        self.assertEqual(self.view_counts(), [0, 0, 0])
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(self.view_counts(), [3, 2, 0])
+        self.assertEqual(buffer.pending(Product, first.pk, 'view_count'), 0)
+        self.assertFalse(buffer.has_pending())
+
+    def run_jobs(self, buffer):
+        with mock.patch.object(counters, '_buffer', buffer):
+            return queue.run_pending()
+
+    def test_flushes_when_max_pending_is_reached(self):
+        buffer = self.make_buffer(max_pending=2)
+        buffer.increment(Product, self.products[0].pk, 'view_count')
+        buffer.increment(Product, self.products[1].pk, 'view_count')
+        # The request only queues the write
+        self.assertEqual(self.view_counts(), [0, 0, 0])
+        self.assertEqual(self.run_jobs(buffer), 1)
+        self.assertEqual(self.view_counts(), [1, 1, 0])
+        self.assertFalse(buffer.has_pending())
+
+    def test_flushes_when_the_interval_has_passed(self):
+        buffer = self.make_buffer(flush_interval=0)
+        for _ in range(2):
+            buffer.increment(Product, self.products[2].pk, 'view_count')
+        self.assertEqual(self.view_counts(), [0, 0, 0])
+        self.run_jobs(buffer)
+        self.assertEqual(self.view_counts(), [0, 0, 2])
+
+    @override_settings(JOB_QUEUE_ASYNC=False)
+    def test_due_flush_runs_inline_without_workers(self):
+        buffer = self.make_buffer(flush_interval=0)
+        with mock.patch.object(counters, '_buffer', buffer):
+            buffer.increment(Product, self.products[0].pk, 'view_count')
+        self.assertEqual(self.view_counts(), [1, 0, 0])
+
+    def test_failed_flush_keeps_the_counts(self):
+        buffer = self.make_buffer()
+        buffer.increment(Product, self.products[0].pk, 'view_count', 4)
+        with mock.patch.object(counters, '_apply', side_effect=RuntimeError('locked')), \
+                self.assertLogs('core.counters', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.pending(Product, self.products[0].pk, 'view_count'), 4)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.view_counts(), [4, 0, 0])
+
+    def test_flush_command(self):
+        buffer = self.make_buffer()
+        buffer.increment(Product, self.products[1].pk, 'view_count')
+        out = io.StringIO()
+        with mock.patch.object(counters, '_buffer', buffer):
+            with self.assertRaises(CommandError):
+                call_command('flush_view_counters', '--model', 'digital_shop.Missing', stdout=out)
+            call_command('flush_view_counters', '--model', 'digital_shop.Product', stdout=out)
+        self.assertIn('Flushed view counters for 1 rows', out.getvalue())
+        self.assertEqual(self.view_counts(), [0, 1, 0])
+
+
+class LocalCounterBufferTests(CounterBufferMixin, TestCase):
+    buffer_class = counters.LocalCounterBuffer
+
+
+class CacheCounterBufferTests(CounterBufferMixin, TestCase):
+    buffer_class = counters.CacheCounterBuffer
+
+    def test_evicted_counts_do_not_break_the_flush(self):
+        buffer = self.make_buffer()
+        for product in self.products[:2]:
+            buffer.increment(Product, product.pk, 'view_count')
+        with mock.patch.object(counters.cache, 'decr', side_effect=ValueError):
+            self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(self.view_counts(), [1, 1, 0])
+        self.assertFalse(buffer.has_pending())
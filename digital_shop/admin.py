@@ -5,10 +5,13 @@ from django.utils.translation import gettext_lazy as _
 from django.db.models import Sum, Count, Avg
 from django.utils.safestring import mark_safe
 
+from core import response_cache
+
 from .models import (
     Category, Brand, Product, ProductImage, ProductAttribute, ProductReview,
     Cart, CartItem, Order, OrderItem, Wishlist, Coupon, Banner
 )
+from . import cart_summary, search
 
 class ProductImageInline(admin.TabularInline):
     """Inline admin for product images"""
@@ -122,31 +125,40 @@ class ProductAdmin(admin.ModelAdmin):
     
     def mark_featured(self, request, queryset):
         queryset.update(is_featured=True)
+        response_cache.touch(Product)
         self.message_user(request, _('Selected products marked as featured.'))
     mark_featured.short_description = _('Mark as featured')
     
     def mark_bestseller(self, request, queryset):
         queryset.update(is_bestseller=True)
+        response_cache.touch(Product)
         self.message_user(request, _('Selected products marked as best sellers.'))
     mark_bestseller.short_description = _('Mark as best seller')
     
     def mark_new(self, request, queryset):
         queryset.update(is_new=True)
+        response_cache.touch(Product)
         self.message_user(request, _('Selected products marked as new.'))
     mark_new.short_description = _('Mark as new')
     
     def mark_on_sale(self, request, queryset):
         queryset.update(is_on_sale=True)
+        response_cache.touch(Product)
         self.message_user(request, _('Selected products marked as on sale.'))
     mark_on_sale.short_description = _('Mark as on sale')
     
     def activate_products(self, request, queryset):
         queryset.update(is_active=True)
+        # update() skips the save signals that keep the search index in step
+        search.index_products(list(queryset.select_related('category', 'brand')))
+        response_cache.touch(Product)
         self.message_user(request, _('Selected products activated.'))
     activate_products.short_description = _('Activate products')
     
     def deactivate_products(self, request, queryset):
         queryset.update(is_active=False)
+        search.remove_products(list(queryset.values_list('id', flat=True)))
+        response_cache.touch(Product)
         self.message_user(request, _('Selected products deactivated.'))
     deactivate_products.short_description = _('Deactivate products')
 
@@ -213,8 +225,26 @@ class CartAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['user__username', 'user__email']
     readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ['user']
     inlines = [CartItemInline]
 
+    def get_queryset(self, request):
+        # Totals for the whole page come from one grouped query
+        totals = cart_summary.totals('items__')
+        return super().get_queryset(request).annotate(
+            _total_items=totals['total_items'], _total_price=totals['total_price'],
+        )
+
+    def total_items(self, obj):
+        return obj._total_items
+    total_items.short_description = _('Total Items')
+    total_items.admin_order_field = '_total_items'
+
+    def total_price(self, obj):
+        return obj._total_price
+    total_price.short_description = _('Total Price')
+    total_price.admin_order_field = '_total_price'
+
 class OrderItemInline(admin.TabularInline):
     """Inline admin for order items"""
     model = OrderItem
@@ -0,0 +1,82 @@
+"""Cached cart totals for the header badge, cart pages and cart API.
+
+A cart's item count and price are computed with one aggregate query,
+``SUM(quantity)`` and ``SUM(quantity * product.price)``, and kept in the
+Django cache per cart. The id of each user's cart is cached as well, so the
+header badge costs no queries on a warm cache.
+
+The signal handlers in ``digital_shop.signals`` drop a cart's entry when one
+of its items is saved or deleted, and drop the entries of every cart
+holding a product whose price changes.
+
+Settings:
+- ``CART_SUMMARY_CACHE_TIMEOUT``: seconds a summary stays cached (300)
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+EMPTY = {'total_items': 0, 'total_price': Decimal('0')}
+
+
+def _summary_key(cart_id):
+    return f'cart-summary:{cart_id}'
+
+
+def _cart_id_key(user_id):
+    return f'cart-summary:user:{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'CART_SUMMARY_CACHE_TIMEOUT', 300)
+
+
+def totals(prefix=''):
+    """Aggregate expressions for cart items, reached through ``prefix`` (e.g. ``'items__'`` from Cart)"""
+    return {
+        'total_items': Coalesce(Sum(f'{prefix}quantity'), 0),
+        'total_price': Coalesce(
+            Sum(F(f'{prefix}quantity') * F(f'{prefix}product__price')), Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    }
+
+
+def compute(cart_id):
+    from .models import CartItem
+
+    return CartItem.objects.filter(cart_id=cart_id).aggregate(**totals())
+
+
+def for_cart(cart_id):
+    """Return ``{'total_items', 'total_price'}`` for a cart, from the cache when possible"""
+    summary = cache.get(_summary_key(cart_id))
+    if summary is None:
+        summary = compute(cart_id)
+        cache.set(_summary_key(cart_id), summary, _timeout())
+    return summary
+
+
+def for_user(user):
+    """The summary of a user's cart, or ``EMPTY`` if they have none"""
+    if not user.is_authenticated:
+        return EMPTY
+    cart_id = cache.get(_cart_id_key(user.pk))
+    if cart_id is None:
+        from .models import Cart
+
+        cart_id = Cart.objects.filter(user=user).order_by('pk').values_list('pk', flat=True).first() or 0
+        cache.set(_cart_id_key(user.pk), cart_id, _timeout())
+    return for_cart(cart_id) if cart_id else EMPTY
+
+
+def invalidate(*cart_ids):
+    cache.delete_many([_summary_key(cart_id) for cart_id in cart_ids])
+
+
+def invalidate_user(user_id):
+    """Forget which cart a user has, after one is created or deleted"""
+    cache.delete(_cart_id_key(user_id))
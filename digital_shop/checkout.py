@@ -0,0 +1,134 @@
+"""Checkout for the digital shop.
+
+``place_order`` turns a list of ``(product_id, quantity)`` lines into an
+``Order`` inside one transaction and is used by the checkout page and both
+checkout APIs. Stock is reserved with a single conditional statement,
+``UPDATE ... SET stock_quantity = stock_quantity - n WHERE stock_quantity >= n``
+(one ``CASE`` per product), which also bumps ``sold_count``. If any product
+lacks stock the update matches fewer rows than ordered and the whole
+transaction rolls back, so two concurrent checkouts can never oversell the
+last items and no Python-side row locking is needed.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils.translation import gettext_lazy as _
+
+from core import response_cache
+
+from .models import CartItem, Order, OrderItem, Product
+
+
+class CheckoutError(Exception):
+    """Raised when an order cannot be placed; the message is safe to show the customer"""
+
+
+def cart_lines(cart):
+    """Return a cart's ``(product_id, quantity)`` lines in one query"""
+    return list(cart.items.values_list('product_id', 'quantity'))
+
+
+def _merge_lines(lines):
+    quantities = {}
+    for product_id, quantity in lines:
+        try:
+            product_id, quantity = int(product_id), int(quantity)
+        except (TypeError, ValueError):
+            raise CheckoutError(_('Invalid product or quantity.'))
+        if quantity <= 0:
+            raise CheckoutError(_('Quantity must be greater than 0.'))
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    if not quantities:
+        raise CheckoutError(_('Your cart is empty.'))
+    return quantities
+
+
+class _ShortStock(Exception):
+    pass
+
+
+def reserve_stock(quantities):
+    """Take ``{product_id: quantity}`` out of stock, raising ``CheckoutError`` if any is short.
+
+    The update runs in a savepoint: when some rows are short, the rows it
+    did decrement are restored before the shortage is looked up, so the
+    message names the product that was actually short.
+    """
+    needed = Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        output_field=PositiveIntegerField(),
+    )
+    try:
+        with transaction.atomic():
+            reserved = Product.objects.filter(
+                pk__in=quantities, is_active=True, stock_quantity__gte=needed,
+            ).update(stock_quantity=F('stock_quantity') - needed, sold_count=F('sold_count') + needed)
+            if reserved != len(quantities):
+                raise _ShortStock
+    except _ShortStock:
+        raise CheckoutError(_short_stock_message(quantities))
+    # Stock and sold counts are part of the cached product API responses
+    response_cache.touch(Product)
+
+
+def _short_stock_message(quantities):
+    available = Product.objects.filter(pk__in=quantities, is_active=True).in_bulk()
+    for pk, quantity in quantities.items():
+        product = available.get(pk)
+        if product is None:
+            return _('A product in your order is no longer available.')
+        if product.stock_quantity < quantity:
+            return _('Not enough stock available for %(product)s.') % {'product': product.name}
+    return _('Not enough stock available.')
+
+
+def place_order(user, lines, cart=None, **order_fields):
+    """Create an order for ``lines`` and reserve its stock atomically.
+
+    ``order_fields`` are the ``Order`` customer and shipping fields. When
+    ``cart`` is given its items are removed in the same transaction.
+    """
+    quantities = _merge_lines(lines)
+    with transaction.atomic():
+        reserve_stock(quantities)
+        # Prices and names are read after the reservation, inside the same transaction
+        products = Product.objects.in_bulk(list(quantities))
+        items = [
+            OrderItem(
+                product=products[pk],
+                product_name=products[pk].name,
+                product_sku=products[pk].sku,
+                quantity=quantity,
+                unit_price=products[pk].price,
+                total_price=products[pk].price * quantity,
+            )
+            for pk, quantity in quantities.items()
+        ]
+        subtotal = sum((item.total_price for item in items), Decimal('0.00'))
+        shipping_cost = tax_amount = discount_amount = Decimal('0.00')
+        order = Order.objects.create(
+            user=user,
+            subtotal=subtotal,
+            shipping_cost=shipping_cost,
+            tax_amount=tax_amount,
+            discount_amount=discount_amount,
+            total_amount=subtotal + shipping_cost + tax_amount - discount_amount,
+            status='pending_payment',
+            payment_status='pending',
+            **order_fields,
+        )
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+        if cart is not None:
+            CartItem.objects.filter(cart=cart).delete()
+    return order
+
+
+def mark_paid(order_id):
+    """Mark an order awaiting payment as paid; queued when one of its receipts is approved"""
+    order = Order.objects.filter(pk=order_id, status='pending_payment').first()
+    if order is not None:
+        order.status = 'paid'
+        order.save()
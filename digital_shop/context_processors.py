@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import cart_summary as cart_summary_module
+
+
+def cart_summary(request):
+    """Expose the user's cached cart totals as ``cart_summary``, computed only if a template uses them"""
+    return {'cart_summary': SimpleLazyObject(lambda: cart_summary_module.for_user(request.user))}
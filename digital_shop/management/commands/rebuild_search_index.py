@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from digital_shop import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the digital shop product search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Products indexed per batch')
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        self.stdout.write(f'Rebuilding product search index ({backend.__class__.__name__})...')
+        count = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products'))
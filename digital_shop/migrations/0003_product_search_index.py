@@ -0,0 +1,118 @@
+import re
+
+from django.db import migrations
+
+# The DDL, text normalization and backfill below are copies of digital_shop.search
+# as of this migration, so later changes to that module never change this migration.
+SQLITE_TABLE = 'digital_shop_product_fts'
+POSTGRES_TABLE = 'digital_shop_product_search'
+
+CHAR_MAP = str.maketrans({
+    'ي': 'ی',  # Arabic Yeh -> Persian Yeh
+    'ى': 'ی',  # Alef Maksura -> Persian Yeh
+    'ك': 'ک',  # Arabic Kaf -> Persian Keheh
+    'ة': 'ه',  # Teh Marbuta -> Heh
+    'أ': 'ا',  # Alef with Hamza above -> Alef
+    'إ': 'ا',  # Alef with Hamza below -> Alef
+    'آ': 'ا',  # Alef with Madda -> Alef
+    '\u200c': '',  # ZWNJ
+    '\u200d': '',  # ZWJ
+    '\u0640': '',  # Tatweel
+    **{chr(0x06f0 + i): str(i) for i in range(10)},  # Persian digits
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # Arabic-Indic digits
+})
+DIACRITICS_RE = re.compile('[\u064b-\u065f\u0670]')
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize_text(text):
+    if not text:
+        return ''
+    text = DIACRITICS_RE.sub('', str(text).translate(CHAR_MAP))
+    return ' '.join(TOKEN_RE.findall(text.lower()))
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} USING fts5("
+            "product_id UNINDEXED, name, sku, category, brand, body, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} ("
+            "product_id bigint PRIMARY KEY REFERENCES digital_shop_product (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {POSTGRES_TABLE}_document_idx "
+            f"ON {POSTGRES_TABLE} USING GIN (document)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SQLITE_TABLE}")
+    elif vendor == 'postgresql':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {POSTGRES_TABLE}")
+
+
+def populate_search_index(apps, schema_editor):
+    """Index the active products, 500 at a time"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        sql = (
+            f"INSERT INTO {SQLITE_TABLE} (product_id, name, sku, category, brand, body) "
+            "VALUES (%s, %s, %s, %s, %s, %s)"
+        )
+    elif vendor == 'postgresql':
+        sql = (
+            f"INSERT INTO {POSTGRES_TABLE} (product_id, document) VALUES (%s, "
+            "setweight(to_tsvector('simple', %s), 'A') || "
+            "setweight(to_tsvector('simple', %s), 'A') || "
+            "setweight(to_tsvector('simple', %s || ' ' || %s), 'B') || "
+            "setweight(to_tsvector('simple', %s), 'D')) "
+            "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document"
+        )
+    else:
+        return
+
+    Product = apps.get_model('digital_shop', 'Product')
+    products = (
+        Product.objects.using(schema_editor.connection.alias)
+        .filter(is_active=True).select_related('category', 'brand').order_by('id')
+    )
+    rows = []
+    with schema_editor.connection.cursor() as cursor:
+        for product in products.iterator(chunk_size=500):
+            rows.append((
+                product.id,
+                normalize_text(product.name),
+                normalize_text(product.sku),
+                normalize_text(product.category.name if product.category_id else ''),
+                normalize_text(product.brand.name if product.brand_id else ''),
+                normalize_text(' '.join(filter(None, [
+                    product.short_description, product.description, product.keywords,
+                ]))),
+            ))
+            if len(rows) >= 500:
+                cursor.executemany(sql, rows)
+                rows = []
+        if rows:
+            cursor.executemany(sql, rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('digital_shop', '0002_alter_order_status_paymentreceipt'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('digital_shop', '0004_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brand',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Logo Renditions'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Image Renditions'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Image Renditions'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('digital_shop', '0005_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentreceipt',
+            name='slip_details',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+# Index tables created by 0003_product_search_index
+SEARCH_TABLES = {
+    'sqlite': 'digital_shop_product_fts',
+    'postgresql': 'digital_shop_product_search',
+}
+
+
+def unindex_inactive_products(apps, schema_editor):
+    table = SEARCH_TABLES.get(schema_editor.connection.vendor)
+    if table is None:
+        return
+    schema_editor.execute(
+        f"DELETE FROM {table} WHERE product_id IN "
+        "(SELECT id FROM digital_shop_product WHERE is_active = %s)",
+        [False],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('digital_shop', '0006_receipt_slip_details'),
+    ]
+
+    operations = [
+        migrations.RunPython(unindex_inactive_products, migrations.RunPython.noop),
+    ]
@@ -5,12 +5,17 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 import uuid
 
+from core import counters, images
+from core.models import ScheduledQuerySet
+from jobs import queue as jobs
+
 class Category(models.Model):
     """Product categories for the digital shop"""
     name = models.CharField(_('Category Name'), max_length=100)
     slug = models.SlugField(_('Slug'), max_length=100, unique=True)
     description = models.TextField(_('Description'), blank=True)
     image = models.ImageField(_('Category Image'), upload_to='categories/', blank=True, null=True)
+    renditions = models.JSONField(_('Image Renditions'), default=dict, blank=True, editable=False)
     icon = models.CharField(_('Icon Class'), max_length=50, default='fas fa-box')
     color = models.CharField(_('Color Class'), max_length=20, default='primary')
     parent = models.ForeignKey('self', on_delete=models.CASCADE, blank=True, null=True, related_name='children')
@@ -19,6 +24,8 @@ class Category(models.Model):
     sort_order = models.PositiveIntegerField(_('Sort Order'), default=0)
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
     updated_at = models.DateTimeField(_('Updated At'), auto_now=True)
+
+    RENDITION_SOURCE_FIELD = 'image'
     
     class Meta:
         verbose_name = _('Category')
@@ -38,10 +45,13 @@ class Brand(models.Model):
     slug = models.SlugField(_('Slug'), max_length=100, unique=True)
     description = models.TextField(_('Description'), blank=True)
     logo = models.ImageField(_('Brand Logo'), upload_to='brands/', blank=True, null=True)
+    renditions = models.JSONField(_('Logo Renditions'), default=dict, blank=True, editable=False)
     website = models.URLField(_('Website'), blank=True)
     is_active = models.BooleanField(_('Active'), default=True)
     is_featured = models.BooleanField(_('Featured Brand'), default=False)
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+
+    RENDITION_SOURCE_FIELD = 'logo'
     
     class Meta:
         verbose_name = _('Brand')
@@ -108,6 +118,15 @@ class Product(models.Model):
         verbose_name = _('Product')
         verbose_name_plural = _('Products')
         ordering = ['-created_at']
+        indexes = [
+            # Storefront listings only ever show active products. SQLite can't
+            # seek an index on a bare "WHERE is_active", so these are partial
+            # indexes over the active rows rather than (is_active, ...) pairs.
+            models.Index(fields=['-created_at'], condition=models.Q(is_active=True), name='shop_product_active_created'),
+            models.Index(fields=['category', '-created_at'], condition=models.Q(is_active=True),
+                         name='shop_product_active_category'),
+            models.Index(fields=['price'], condition=models.Q(is_active=True), name='shop_product_active_price'),
+        ]
     
     def __str__(self):
         return self.name
@@ -127,17 +146,21 @@ class Product(models.Model):
         return 0 < self.stock_quantity <= self.low_stock_threshold
     
     def increment_view_count(self):
+        # Buffered and written in batches by core.counters
+        counters.increment(self, 'view_count')
         self.view_count += 1
-        self.save(update_fields=['view_count'])
 
 class ProductImage(models.Model):
     """Product images"""
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(_('Image'), upload_to='products/')
+    renditions = models.JSONField(_('Image Renditions'), default=dict, blank=True, editable=False)
     alt_text = models.CharField(_('Alt Text'), max_length=200, blank=True)
     is_primary = models.BooleanField(_('Primary Image'), default=False)
     sort_order = models.PositiveIntegerField(_('Sort Order'), default=0)
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+
+    RENDITION_SOURCE_FIELD = 'image'
     
     class Meta:
         verbose_name = _('Product Image')
@@ -197,13 +220,20 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart for {self.user.username}"
     
+    @property
+    def summary(self):
+        """Cached item count and price of the cart (see digital_shop/cart_summary.py)"""
+        from . import cart_summary
+
+        return cart_summary.for_cart(self.pk)
+
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.summary['total_items']
     
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        return self.summary['total_price']
 
 class CartItem(models.Model):
     """Items in shopping cart"""
@@ -284,6 +314,9 @@ class Order(models.Model):
         verbose_name = _('Order')
         verbose_name_plural = _('Orders')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='shop_order_user_created'),
+        ]
     
     def __str__(self):
         return f"Order {self.order_number}"
@@ -384,6 +417,8 @@ class Banner(models.Model):
     start_date = models.DateTimeField(_('Start Date'), default=timezone.now)
     end_date = models.DateTimeField(_('End Date'), blank=True, null=True)
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+
+    objects = ScheduledQuerySet.as_manager()
     
     class Meta:
         verbose_name = _('Banner')
@@ -404,6 +439,9 @@ class PaymentReceipt(models.Model):
     """Payment receipt for manual payments (Nobitex-style)"""
     order = models.ForeignKey('Order', on_delete=models.CASCADE, related_name='payment_receipts')
     receipt_image = models.ImageField(upload_to='payment_receipts/', verbose_name="تصویر رسید")
+    # Size and thumbnail of the normalized receipt image (see core/images.py)
+    slip_details = models.JSONField(default=dict, blank=True, editable=False)
+    SLIP_FIELD = 'receipt_image'
     transaction_id = models.CharField(max_length=100, verbose_name="شماره تراکنش", blank=True, null=True)
     depositor_name = models.CharField(max_length=100, verbose_name="نام واریزکننده", blank=True, null=True)
     deposit_date = models.DateTimeField(verbose_name="تاریخ واریز", blank=True, null=True)
@@ -424,13 +462,20 @@ class PaymentReceipt(models.Model):
         verbose_name = "رسید پرداخت"
         verbose_name_plural = "رسیدهای پرداخت"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='shop_receipt_status_created'),
+        ]
     
     def __str__(self):
         return f"رسید سفارش {self.order.id} - {self.get_status_display()}"
+
+    @property
+    def slip_thumbnail_url(self):
+        return images.slip_thumbnail_url(self)
     
     def save(self, *args, **kwargs):
-        # Auto-approve payment if receipt is approved
-        if self.status == 'approved' and self.order.status == 'pending_payment':
-            self.order.status = 'paid'
-            self.order.save()
         super().save(*args, **kwargs)
+        # Auto-approve payment if receipt is approved; saving the order refreshes
+        # the customer's totals, so it runs in a background job
+        if self.status == 'approved' and self.order.status == 'pending_payment':
+            jobs.enqueue('digital_shop.checkout.mark_paid', self.order_id, priority=5)
@@ -0,0 +1,308 @@
+"""Full-text product search for the digital shop.
+
+Products are indexed into a database-native full-text index (an FTS5 virtual
+table on SQLite, a ``tsvector`` column on PostgreSQL) which is kept in sync by
+the signal handlers in ``digital_shop.signals``. Text is normalized the same
+way on the way in and on the way out so Arabic/Persian letter variants, ZWNJ
+and Persian digits all match each other.
+
+Only active products are indexed; saving a product as inactive removes its
+row. Searches can be restricted to a product queryset with ``within`` so
+that filters apply before the ``MAX_RESULTS`` cap rather than after it.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+from django.utils.module_loading import import_string
+
+# Arabic letter variants that Persian keyboards and copy/paste produce
+_CHAR_MAP = str.maketrans({
+    'ي': 'ی',  # Arabic Yeh -> Persian Yeh
+    'ى': 'ی',  # Alef Maksura -> Persian Yeh
+    'ك': 'ک',  # Arabic Kaf -> Persian Keheh
+    'ة': 'ه',  # Teh Marbuta -> Heh
+    'أ': 'ا',  # Alef with Hamza above -> Alef
+    'إ': 'ا',  # Alef with Hamza below -> Alef
+    'آ': 'ا',  # Alef with Madda -> Alef
+    '\u200c': '',  # ZWNJ: users often type the word joined
+    '\u200d': '',  # ZWJ
+    '\u0640': '',  # Tatweel
+    **{chr(0x06f0 + i): str(i) for i in range(10)},  # Persian digits
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # Arabic-Indic digits
+})
+
+# Harakat (short vowel marks) are never typed in search queries
+_DIACRITICS_RE = re.compile('[\u064b-\u065f\u0670]')
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+MAX_RESULTS = 500
+
+
+def normalize_text(text):
+    """Normalize Persian/Arabic text for indexing and querying"""
+    if not text:
+        return ''
+    text = _DIACRITICS_RE.sub('', str(text).translate(_CHAR_MAP))
+    return ' '.join(_TOKEN_RE.findall(text.lower()))
+
+
+def tokenize_query(query):
+    """Split a search query into normalized tokens"""
+    return normalize_text(query).split()
+
+
+def product_document(product):
+    """Build the normalized text fields indexed for a product"""
+    return {
+        'name': normalize_text(product.name),
+        'sku': normalize_text(product.sku),
+        'category': normalize_text(product.category.name if product.category_id else ''),
+        'brand': normalize_text(product.brand.name if product.brand_id else ''),
+        'body': normalize_text(' '.join(filter(None, [
+            product.short_description, product.description, product.keywords,
+        ]))),
+    }
+
+
+class BaseSearchBackend:
+    """Interface implemented by the search backends"""
+
+    def install(self, schema_editor):
+        """Create the index storage"""
+
+    def uninstall(self, schema_editor):
+        """Drop the index storage"""
+
+    def index_products(self, products):
+        """Add or refresh the index rows of the given products"""
+
+    def remove_products(self, product_ids):
+        """Drop the index rows of the given product ids"""
+
+    def clear(self):
+        """Drop every index row"""
+
+    def search(self, query, limit=MAX_RESULTS, within=None):
+        """Return matching product ids, best match first, among the products in ``within``"""
+        raise NotImplementedError
+
+
+def _within_sql(within):
+    """``(sql, params)`` restricting ``product_id`` to the ids of the ``within`` queryset"""
+    if within is None:
+        return '', []
+    sql, params = within.order_by().values('id').query.sql_with_params()
+    return f' AND product_id IN ({sql})', list(params)
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """SQLite FTS5 index with bm25 ranking and prefix matching"""
+    table = 'digital_shop_product_fts'
+    # bm25 column weights, in table column order (product_id is unindexed)
+    weights = (0.0, 10.0, 8.0, 4.0, 4.0, 1.0)
+
+    def install(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            "product_id UNINDEXED, name, sku, category, brand, body, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    def uninstall(self, schema_editor):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index_products(self, products):
+        rows = []
+        for product in products:
+            doc = product_document(product)
+            rows.append((product.id, doc['name'], doc['sku'], doc['category'], doc['brand'], doc['body']))
+        if not rows:
+            return
+        self.remove_products([row[0] for row in rows])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.table} (product_id, name, sku, category, brand, body) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                rows,
+            )
+
+    def remove_products(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        with connection.cursor() as cursor:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(product_ids), 500):
+                chunk = product_ids[start:start + 500]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"DELETE FROM {self.table} WHERE product_id IN ({placeholders})", chunk)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+
+    def search(self, query, limit=MAX_RESULTS, within=None):
+        tokens = tokenize_query(query)
+        if not tokens:
+            return []
+        within_sql, within_params = _within_sql(within)
+        # Every token must match; each is a quoted prefix so partial words autocomplete
+        match = ' '.join('"%s"*' % token.replace('"', '""') for token in tokens)
+        weights = ', '.join(str(w) for w in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id FROM {self.table} WHERE {self.table} MATCH %s{within_sql} "
+                f"ORDER BY bm25({self.table}, {weights}) LIMIT %s",
+                [match, *within_params, limit],
+            )
+            return [int(row[0]) for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """PostgreSQL ``tsvector`` index with ts_rank ranking and prefix matching"""
+    table = 'digital_shop_product_search'
+
+    def install(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "product_id bigint PRIMARY KEY REFERENCES digital_shop_product (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_document_idx "
+            f"ON {self.table} USING GIN (document)"
+        )
+
+    def uninstall(self, schema_editor):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def index_products(self, products):
+        with connection.cursor() as cursor:
+            for product in products:
+                doc = product_document(product)
+                cursor.execute(
+                    f"INSERT INTO {self.table} (product_id, document) VALUES (%s, "
+                    "setweight(to_tsvector('simple', %s), 'A') || "
+                    "setweight(to_tsvector('simple', %s), 'A') || "
+                    "setweight(to_tsvector('simple', %s || ' ' || %s), 'B') || "
+                    "setweight(to_tsvector('simple', %s), 'D')) "
+                    "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                    [product.id, doc['name'], doc['sku'], doc['category'], doc['brand'], doc['body']],
+                )
+
+    def remove_products(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE product_id = ANY(%s)", [product_ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+
+    def search(self, query, limit=MAX_RESULTS, within=None):
+        tokens = tokenize_query(query)
+        if not tokens:
+            return []
+        within_sql, within_params = _within_sql(within)
+        tsquery = ' & '.join(f"{token}:*" for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id FROM {self.table} "
+                f"WHERE document @@ to_tsquery('simple', %s){within_sql} "
+                "ORDER BY ts_rank(document, to_tsquery('simple', %s)) DESC LIMIT %s",
+                [tsquery, *within_params, tsquery, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class BasicSearchBackend(BaseSearchBackend):
+    """Fallback for databases without a native full-text index"""
+
+    def search(self, query, limit=MAX_RESULTS, within=None):
+        from .models import Product
+
+        tokens = tokenize_query(query)
+        if not tokens:
+            return []
+        products = Product.objects.filter(is_active=True) if within is None else within
+        for token in tokens:
+            products = products.filter(
+                Q(name__icontains=token) |
+                Q(description__icontains=token) |
+                Q(short_description__icontains=token) |
+                Q(category__name__icontains=token) |
+                Q(brand__name__icontains=token) |
+                Q(sku__icontains=token)
+            )
+        return list(products.values_list('id', flat=True)[:limit])
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(vendor=None):
+    """Return the search backend for the database in use.
+
+    ``DIGITAL_SHOP_SEARCH_BACKEND`` may name a backend class to override the
+    choice made from the database vendor.
+    """
+    backend_path = getattr(settings, 'DIGITAL_SHOP_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    return BACKENDS.get(vendor or connection.vendor, BasicSearchBackend)()
+
+
+def search_product_ids(query, limit=MAX_RESULTS, within=None):
+    """Return ids of products matching ``query``, best match first.
+
+    ``within`` is an optional ``Product`` queryset the matches must belong to.
+    """
+    return get_backend().search(query, limit=limit, within=within)
+
+
+def rank_ordering(product_ids):
+    """Ordering expression that keeps products in search rank order"""
+    return Case(
+        *[When(id=product_id, then=position) for position, product_id in enumerate(product_ids)],
+        output_field=IntegerField(),
+    )
+
+
+def index_products(products):
+    """Index the active products and drop the inactive ones from the index"""
+    backend = get_backend()
+    backend.index_products([product for product in products if product.is_active])
+    backend.remove_products([product.id for product in products if not product.is_active])
+
+
+def remove_products(product_ids):
+    get_backend().remove_products(product_ids)
+
+
+def rebuild_index(batch_size=500):
+    """Re-index every active product, returning the number of products indexed"""
+    from .models import Product
+
+    backend = get_backend()
+    backend.clear()
+    products = Product.objects.filter(is_active=True).select_related('category', 'brand').order_by('id')
+    count = 0
+    batch = []
+    for product in products.iterator(chunk_size=batch_size):
+        batch.append(product)
+        if len(batch) >= batch_size:
+            backend.index_products(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        backend.index_products(batch)
+        count += len(batch)
+    return count
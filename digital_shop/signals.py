@@ -0,0 +1,89 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from core import images, response_cache
+
+from . import cart_summary, search
+from .models import (
+    Product, ProductImage, ProductAttribute, Category, Brand, Banner, Cart, CartItem, PaymentReceipt,
+)
+
+# Versions for the ETags of the product APIs and the shop home page cache
+response_cache.track(Product, ProductImage, ProductAttribute, Category, Brand, Banner)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """Keep the product's search index row in sync"""
+    if raw:
+        return
+    search.index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+def reindex_related_products(sender, instance, raw=False, **kwargs):
+    """Category and brand names are indexed with each product, so refresh them"""
+    if raw:
+        return
+    products = instance.products.select_related('category', 'brand')
+    search.index_products(list(products))
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def cart_item_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cart_summary.invalidate(instance.cart_id)
+
+
+@receiver(post_save, sender=Cart)
+def cart_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        cart_summary.invalidate_user(instance.user_id)
+
+
+@receiver(post_delete, sender=Cart)
+def cart_deleted(sender, instance, **kwargs):
+    cart_summary.invalidate_user(instance.user_id)
+    cart_summary.invalidate(instance.pk)
+
+
+@receiver(post_init, sender=Product)
+def remember_product_price(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred price isn't fetched just to remember it
+    instance._cart_summary_price = instance.__dict__.get('price')
+
+
+@receiver(post_save, sender=Product)
+def product_price_changed(sender, instance, raw=False, created=False, **kwargs):
+    """Carts holding a product are priced from it, so refresh them when the price moves"""
+    if raw or created or instance.price == getattr(instance, '_cart_summary_price', None):
+        return
+    instance._cart_summary_price = instance.price
+    cart_ids = CartItem.objects.filter(product=instance).values_list('cart_id', flat=True).distinct()
+    cart_summary.invalidate(*cart_ids)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+def image_saved(sender, instance, raw=False, **kwargs):
+    """Build resized renditions of new or replaced uploads in the background"""
+    if raw:
+        return
+    images.schedule(instance)
+
+
+@receiver(post_save, sender=PaymentReceipt)
+def receipt_saved(sender, instance, raw=False, **kwargs):
+    """Strip, downsize and thumbnail a newly uploaded receipt image in the background"""
+    if raw:
+        return
+    images.schedule_slip(instance)
@@ -0,0 +1,71 @@
+"""Cached context for the shop home page.
+
+``home_context()`` builds the product, category, brand and banner lists of
+``shop_home`` once, with related rows joined or prefetched so rendering
+them runs no further queries, and keeps the result in the Django cache.
+
+The entry is keyed on the change versions of ``Product``, ``ProductImage``,
+``Category``, ``Brand`` and ``Banner`` (see ``core/response_cache.py``), so
+any save, delete or ``touch()`` of those models, including the admin's bulk
+``update()`` actions, starts a new entry. Banners also go live and expire
+on their own, so an entry never outlives the next banner start or end date.
+
+Settings:
+- ``SHOP_HOME_CACHE_TIMEOUT``: seconds the home context stays cached (300)
+"""
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from core import response_cache
+
+from .models import Banner, Brand, Category, Product, ProductImage
+
+MODELS = (Product, ProductImage, Category, Brand, Banner)
+
+
+def _products():
+    # Images keep their Meta ordering, so the template's ``images.first`` reads the prefetch
+    return Product.objects.filter(is_active=True).select_related('category', 'brand').prefetch_related('images')
+
+
+def build():
+    """Query the home page lists; every value is a list so it can be cached as is"""
+    now = timezone.now()
+    return {
+        'featured_categories': list(
+            Category.objects.filter(is_active=True, is_featured=True)
+            .annotate(active_product_count=Count('products', filter=Q(products__is_active=True)))
+            .order_by('sort_order')[:6]
+        ),
+        'featured_products': list(_products().filter(is_featured=True).order_by('-created_at')[:8]),
+        'new_products': list(_products().filter(is_new=True).order_by('-created_at')[:8]),
+        'best_sellers': list(_products().filter(is_bestseller=True).order_by('-sold_count')[:8]),
+        'on_sale_products': list(_products().filter(is_on_sale=True).order_by('-created_at')[:8]),
+        'banners': list(Banner.objects.current(now)),
+        'brands': list(Brand.objects.filter(is_active=True, is_featured=True)[:8]),
+    }, Banner.objects.next_change(now)
+
+
+def _timeout(next_change):
+    timeout = getattr(settings, 'SHOP_HOME_CACHE_TIMEOUT', 300)
+    if next_change is not None:
+        # Rebuild just after the next banner starts or ends
+        timeout = min(timeout, math.ceil((next_change - timezone.now()).total_seconds()) + 1)
+    return max(timeout, 1)
+
+
+def cache_key():
+    return 'shop-home:context:' + ':'.join(str(version) for version in response_cache.versions(MODELS))
+
+
+def home_context():
+    key = cache_key()
+    context = cache.get(key)
+    if context is None:
+        context, next_change = build()
+        cache.set(key, context, _timeout(next_change))
+    return context
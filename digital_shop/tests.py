@@ -1,3 +1,379 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import cart_summary, checkout, search, storefront, views
+from .admin import ProductAdmin
+from .models import Banner, Brand, Cart, CartItem, Category, Order, Product, ProductImage
+
+
+class CheckoutTests(TestCase):
+    """Checkout creates orders in bulk and reserves stock atomically"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='customer', email='customer@example.com')
+        self.client.force_login(self.user)
+        self.category = Category.objects.create(name='Phones', slug='phones')
+        self.cart = Cart.objects.create(user=self.user)
+
+    def create_product(self, i, stock=10, price=100):
+        return Product.objects.create(
+            name=f'Phone {i}', slug=f'phone-{i}', sku=f'PH-{i}', category=self.category,
+            price=Decimal(price), stock_quantity=stock,
+        )
+
+    def fill_cart(self, count, quantity=2):
+        products = [self.create_product(i) for i in range(count)]
+        for product in products:
+            CartItem.objects.create(cart=self.cart, product=product, quantity=quantity)
+        return products
+
+    def post_checkout(self):
+        return self.client.post(reverse('digital_shop:checkout'), {
+            'customer_name': 'Customer', 'customer_email': 'customer@example.com', 'customer_phone': '0912',
+            'shipping_address': 'Street 1', 'shipping_city': 'Tehran', 'shipping_postal_code': '12345',
+        })
+
+    def test_checkout_places_order_and_reserves_stock(self):
+        products = self.fill_cart(3)
+        response = self.post_checkout()
+        order = Order.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('digital_shop:payment_page', args=[order.id]),
+                             fetch_redirect_response=False)
+        self.assertEqual(order.total_amount, Decimal('600'))
+        self.assertEqual(order.items.count(), 3)
+        self.assertFalse(self.cart.items.exists())
+        for product in products:
+            product.refresh_from_db()
+            self.assertEqual((product.stock_quantity, product.sold_count), (8, 2))
+
+    def test_query_count_does_not_grow_with_cart_lines(self):
+        self.fill_cart(2)
+        with CaptureQueriesContext(connection) as few:
+            self.post_checkout()
+        self.cart = Cart.objects.create(user=User.objects.create(username='other'))
+        self.client.force_login(self.cart.user)
+        for i in range(10, 20):
+            CartItem.objects.create(cart=self.cart, product=self.create_product(i), quantity=1)
+        with CaptureQueriesContext(connection) as many:
+            self.post_checkout()
+        self.assertEqual(len(few), len(many))
+
+    def test_short_stock_rolls_back_everything(self):
+        products = self.fill_cart(2)
+        Product.objects.filter(pk=products[1].pk).update(stock_quantity=1)
+        self.post_checkout()
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+        products[0].refresh_from_db()
+        self.assertEqual((products[0].stock_quantity, products[0].sold_count), (10, 0))
+
+    def test_short_stock_message_names_the_short_product(self):
+        alpha = self.create_product(1, stock=5)
+        beta = self.create_product(2, stock=1)
+        with self.assertRaisesMessage(checkout.CheckoutError, 'Not enough stock available for Phone 2.'):
+            checkout.place_order(self.user, [(alpha.pk, 3), (beta.pk, 10)], customer_name='A')
+        alpha.refresh_from_db()
+        self.assertEqual(alpha.stock_quantity, 5)
+
+    def test_reservations_never_oversell(self):
+        product = self.create_product(1, stock=3)
+        checkout.place_order(self.user, [(product.pk, 2)], customer_name='A')
+        with self.assertRaises(checkout.CheckoutError):
+            checkout.place_order(self.user, [(product.pk, 2)], customer_name='B')
+        product.refresh_from_db()
+        self.assertEqual((product.stock_quantity, product.sold_count), (1, 2))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_api_checkout_and_create_order(self):
+        self.fill_cart(1, quantity=1)
+        response = self.client.post(reverse('digital_shop:api_checkout'),
+                                    json.dumps({'phone': '0912', 'address': 'Street 1'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(Order.objects.filter(pk=response.json()['order_id'], customer_phone='0912').exists())
+
+        product = self.create_product(5, stock=1)
+        url = reverse('digital_shop:api_create_order')
+        response = self.client.post(url, json.dumps({'items': [{'product_id': product.pk, 'quantity': 2}]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, json.dumps({'items': [{'product_id': 999, 'quantity': 1}]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CartSummaryTests(TestCase):
+    """Cart totals come from one aggregate query and are cached until the cart changes"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create(username='customer', email='customer@example.com')
+        self.client.force_login(self.user)
+        category = Category.objects.create(name='Phones', slug='phones')
+        self.products = [
+            Product.objects.create(name=f'Phone {i}', slug=f'phone-{i}', sku=f'PH-{i}', category=category,
+                                   price=Decimal(100 * (i + 1)), stock_quantity=10)
+            for i in range(3)
+        ]
+        self.cart = Cart.objects.create(user=self.user)
+        for i, product in enumerate(self.products):
+            CartItem.objects.create(cart=self.cart, product=product, quantity=i + 1)
+
+    def test_totals_are_aggregated_and_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cart.total_items, 6)
+            self.assertEqual(self.cart.total_price, Decimal('1400'))
+
+        item = self.cart.items.get(product=self.products[0])
+        item.quantity = 5
+        item.save()
+        self.assertEqual(self.cart.summary, {'total_items': 10, 'total_price': Decimal('1800')})
+
+        self.products[2].price = Decimal('10')
+        self.products[2].save()
+        self.assertEqual(self.cart.total_price, Decimal('930'))
+
+        item.delete()
+        self.assertEqual(self.cart.total_items, 5)
+
+    def test_header_badge_uses_cached_summary(self):
+        url = reverse('digital_shop:wishlist')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertContains(response, 'id="cart-count"')
+        self.assertEqual(response.context['cart_summary']['total_items'], 6)
+        self.assertFalse([q for q in ctx.captured_queries if 'digital_shop_cart' in q['sql']])
+        self.assertEqual(cart_summary.for_user(User.objects.create(username='empty')), cart_summary.EMPTY)
+
+    def test_admin_changelist_annotates_totals(self):
+        admin_user = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin_user)
+        url = reverse('admin:digital_shop_cart_changelist')
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for i in range(5):
+            cart = Cart.objects.create(user=User.objects.create(username=f'shopper{i}'))
+            CartItem.objects.create(cart=cart, product=self.products[0], quantity=2)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(len(few), len(many))
+        totals = {cart.user.username: cart._total_price for cart in response.context['cl'].result_list}
+        self.assertEqual(totals['customer'], Decimal('1400'))
+        self.assertEqual(totals['shopper0'], Decimal('200'))
+
+
+class StorefrontTests(TestCase):
+    """The home page is built from SQL-filtered lists and served from cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.category = Category.objects.create(name='Phones', slug='phones', is_featured=True)
+        brand = Brand.objects.create(name='Acme', slug='acme', is_featured=True)
+        for i in range(3):
+            product = Product.objects.create(
+                name=f'Phone {i}', slug=f'phone-{i}', sku=f'PH-{i}', category=self.category, brand=brand,
+                price=Decimal(100), is_featured=True, is_new=True, is_bestseller=True, is_on_sale=True,
+                compare_price=Decimal(150),
+            )
+            ProductImage.objects.create(product=product, image=f'products/{i}.jpg')
+        now = timezone.now()
+        self.live = Banner.objects.create(title='Live', image='banners/a.jpg', start_date=now - timedelta(days=1))
+        Banner.objects.create(title='Expired', image='banners/b.jpg', start_date=now - timedelta(days=2),
+                              end_date=now - timedelta(days=1))
+        self.upcoming = Banner.objects.create(title='Upcoming', image='banners/c.jpg',
+                                              start_date=now + timedelta(seconds=90))
+
+    def test_home_is_served_from_cache(self):
+        url = reverse('digital_shop:home')
+        response = self.client.get(url)
+        self.assertEqual(response.context['banners'], [self.live])
+        self.assertEqual(response.context['featured_categories'][0].active_product_count, 3)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'products/0.jpg')
+
+    def test_changes_invalidate_the_cache(self):
+        url = reverse('digital_shop:home')
+        self.client.get(url)
+        Product.objects.create(name='Tablet', slug='tablet', sku='TB-1', category=self.category,
+                               price=Decimal(200), is_featured=True)
+        self.assertContains(self.client.get(url), 'Tablet')
+        self.live.delete()
+        self.assertEqual(self.client.get(url).context['banners'], [])
+
+    def test_bulk_updates_that_touch_the_model_invalidate_the_cache(self):
+        url = reverse('digital_shop:home')
+        self.client.get(url)
+        admin = ProductAdmin(Product, site)
+        request = RequestFactory().post('/')
+        request.user = User(is_staff=True)
+        with mock.patch.object(admin, 'message_user'):
+            admin.deactivate_products(request, Product.objects.all())
+        self.assertEqual(self.client.get(url).context['new_products'], [])
+
+    def test_cache_expires_when_next_banner_goes_live(self):
+        context, next_change = storefront.build()
+        self.assertEqual(next_change, self.upcoming.start_date)
+        self.assertLessEqual(storefront._timeout(next_change), 91)
+        self.assertEqual(list(Banner.objects.current(self.upcoming.start_date)), [self.live, self.upcoming])
+
+
+class ApiProductsTests(TestCase):
+    """The products API pages through active products with a keyset cursor"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        category = Category.objects.create(name='Phones', slug='phones')
+        self.products = [
+            Product.objects.create(name=f'Phone {i}', slug=f'phone-{i}', sku=f'PH-{i}', category=category,
+                                   price=Decimal(100))
+            for i in range(7)
+        ]
+        Product.objects.create(name='Hidden', slug='hidden', sku='HD-1', category=category,
+                               price=Decimal(100), is_active=False)
+        # Several rows sharing a created_at must still be paged exactly once
+        same_time = timezone.now() - timedelta(days=1)
+        Product.objects.filter(pk__in=[p.pk for p in self.products[:4]]).update(created_at=same_time)
+
+    def get(self, **params):
+        return self.client.get(reverse('digital_shop:api_products'), params)
+
+    def test_cursor_pages_through_every_active_product_once(self):
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 3, 'fields': 'id'}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.get(**params).json()
+            self.assertLessEqual(data['count'], 3)
+            seen.extend(product['id'] for product in data['products'])
+            if not data['has_more']:
+                self.assertIsNone(data['next_cursor'])
+                break
+            cursor = data['next_cursor']
+        expected = Product.objects.filter(is_active=True).order_by('-created_at', '-id')
+        self.assertEqual(seen, [product.pk for product in expected])
+
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ('not-a-cursor', 'bm90fGE='):
+            response = self.get(cursor=cursor)
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(response.json()['success'])
+
+    def test_limit_is_clamped(self):
+        self.assertEqual(self.get(limit=0).json()['count'], 1)
+        self.assertEqual(self.get(limit='many').json()['count'], 7)
+        with mock.patch.object(views, 'API_PRODUCTS_MAX_PAGE_SIZE', 5):
+            data = self.get(limit=1000).json()
+        self.assertEqual((data['count'], data['has_more']), (5, True))
+
+    def test_fields_limits_the_returned_keys(self):
+        data = self.get(fields='name,price,unknown').json()
+        self.assertEqual(set(data['products'][0]), {'id', 'name', 'price'})
+        self.assertEqual(set(self.get().json()['products'][0]), set(views.API_PRODUCT_DEFAULT_FIELDS))
+
+    def test_search_and_category_filter_on_the_server(self):
+        laptops = Category.objects.create(name='Laptops', slug='laptops')
+        laptop = Product.objects.create(name='Gaming laptop', slug='laptop', sku='LT-1', category=laptops,
+                                        price=Decimal(900))
+        data = self.get(category=laptops.pk).json()
+        self.assertEqual([product['id'] for product in data['products']], [laptop.pk])
+        self.assertEqual([category['name'] for category in data['categories']], ['Laptops', 'Phones'])
+
+        data = self.get(q='phone', limit=5, fields='id').json()
+        self.assertEqual((data['count'], data['has_more']), (5, True))
+        rest = self.get(q='phone', limit=5, fields='id', cursor=data['next_cursor']).json()
+        self.assertEqual(rest['count'], 2)
+        self.assertNotIn('categories', rest)
+        self.assertEqual(self.get(q='phone', category=laptops.pk).json()['count'], 0)
+
+
+class SearchTests(TestCase):
+    """Product search normalizes Persian text, ranks by field and indexes only active products"""
+
+    def setUp(self):
+        self.phones = Category.objects.create(name='Phones', slug='phones')
+        self.cases = Category.objects.create(name='Cases', slug='cases')
+
+    def create_product(self, name, category=None, **kwargs):
+        slug = f'product-{Product.objects.count()}'
+        return Product.objects.create(name=name, slug=slug, sku=slug.upper(), category=category or self.phones,
+                                      price=Decimal(100), **kwargs)
+
+    def test_normalize_text(self):
+        self.assertEqual(search.normalize_text('كيف‌ها'), 'کیفها')
+        self.assertEqual(search.normalize_text('آيفون ۱۳'), 'ایفون 13')
+        self.assertEqual(search.normalize_text('مُحَمَّد'), 'محمد')
+        self.assertEqual(search.normalize_text('Galaxy-S24, Ultra!'), 'galaxy s24 ultra')
+        self.assertEqual(search.normalize_text(None), '')
+
+    def test_name_matches_rank_above_description_matches(self):
+        in_body = self.create_product('Cover', description='Fits the galaxy phone')
+        in_name = self.create_product('Galaxy S24')
+        self.assertEqual(search.search_product_ids('galaxy'), [in_name.id, in_body.id])
+
+    def test_prefix_and_persian_variants_match(self):
+        product = self.create_product('گوشی آیفون ۱۳')
+        self.assertEqual(search.search_product_ids('گوش'), [product.id])
+        self.assertEqual(search.search_product_ids('ايفون 13'), [product.id])
+        self.assertEqual(search.search_product_ids('ایفون 14'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        product = self.create_product('Galaxy S24')
+        product.name = 'Pixel 8'
+        product.save()
+        self.assertEqual(search.search_product_ids('galaxy'), [])
+        self.assertEqual(search.search_product_ids('pixel'), [product.id])
+        self.phones.name = 'Smartphones'
+        self.phones.save()
+        self.assertEqual(search.search_product_ids('smartphones'), [product.id])
+        product.is_active = False
+        product.save()
+        self.assertEqual(search.search_product_ids('pixel'), [])
+        product.is_active = True
+        product.save()
+        self.assertEqual(search.search_product_ids('pixel'), [product.id])
+        product.delete()
+        self.assertEqual(search.search_product_ids('pixel'), [])
+
+    def test_bulk_admin_actions_update_the_index(self):
+        products = [self.create_product(f'Galaxy S{i}', is_active=False) for i in range(2)]
+        admin = ProductAdmin(Product, site)
+        request = RequestFactory().post('/')
+        request.user = User(is_staff=True)
+        queryset = Product.objects.filter(pk__in=[product.pk for product in products])
+        with mock.patch.object(admin, 'message_user'):
+            admin.activate_products(request, queryset)
+            self.assertEqual(sorted(search.search_product_ids('galaxy')), [product.pk for product in products])
+            admin.deactivate_products(request, queryset)
+        self.assertEqual(search.search_product_ids('galaxy'), [])
+
+    def test_filters_apply_before_the_result_limit(self):
+        self.create_product('Galaxy S24')
+        case = self.create_product('Galaxy case', category=self.cases)
+        within = Product.objects.filter(category=self.cases)
+        self.assertEqual(search.search_product_ids('galaxy', limit=1, within=within), [case.id])
+        response = self.client.get(reverse('digital_shop:product_list'), {'q': 'galaxy', 'category': self.cases.id})
+        self.assertEqual(list(response.context['page_obj']), [case])
+
+    def test_ajax_search_fills_results_with_active_products(self):
+        for i in range(10):
+            self.create_product(f'Galaxy old {i}', is_active=False)
+        active = self.create_product('Galaxy S24')
+        response = self.client.get(reverse('digital_shop:search_products'), {'q': 'galaxy'})
+        self.assertEqual([result['id'] for result in response.json()['results']], [active.id])
@@ -4,64 +4,31 @@ from django.contrib import messages
 from django.http import JsonResponse, HttpResponseRedirect
 from django.urls import reverse
 from django.core.paginator import Paginator
-from django.db.models import Q, Avg, Count, Min, Max
+from django.db.models import Q, Avg, Count, Min, Max, Prefetch
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
+from asgiref.sync import sync_to_async
 from decimal import Decimal
-from datetime import timedelta
+from datetime import datetime, timedelta
 from .models import (
     Category, Brand, Product, ProductImage, ProductAttribute, ProductReview,
-    Cart, CartItem, Order, OrderItem, Wishlist, Coupon, Banner, PaymentReceipt
+    Cart, CartItem, Order, Wishlist, Coupon, Banner, PaymentReceipt
 )
+from . import checkout as checkout_service, search, storefront
+from core import counters
+from core.async_views import aget_object_or_404, async_csrf_exempt
+from core.response_cache import cached_response
+from core.images import srcset
 from print_service.models import PaymentSettings
+import base64
+import binascii
 import json
 
 def shop_home(request):
     """Main shop homepage with featured products and categories"""
-    # Get featured categories
-    featured_categories = Category.objects.filter(
-        is_active=True, is_featured=True
-    ).order_by('sort_order')[:6]
-    
-    # Get featured products
-    featured_products = Product.objects.filter(
-        is_active=True, is_featured=True
-    ).order_by('-created_at')[:8]
-    
-    # Get new products
-    new_products = Product.objects.filter(
-        is_active=True, is_new=True
-    ).order_by('-created_at')[:8]
-    
-    # Get best sellers
-    best_sellers = Product.objects.filter(
-        is_active=True, is_bestseller=True
-    ).order_by('-sold_count')[:8]
-    
-    # Get on-sale products
-    on_sale_products = Product.objects.filter(
-        is_active=True, is_on_sale=True
-    ).order_by('-created_at')[:8]
-    
-    # Get active banners
-    banners = [b for b in Banner.objects.filter(is_active=True) if b.is_current]
-    
-    # Get brands
-    brands = Brand.objects.filter(is_active=True, is_featured=True)[:8]
-    
-    context = {
-        'featured_categories': featured_categories,
-        'featured_products': featured_products,
-        'new_products': new_products,
-        'best_sellers': best_sellers,
-        'on_sale_products': on_sale_products,
-        'banners': banners,
-        'brands': brands,
-    }
-    
-    return render(request, 'digital_shop/home.html', context)
+    return render(request, 'digital_shop/home.html', storefront.home_context())
 
 def product_list(request):
     """Product listing page with search and filters"""
@@ -72,22 +39,11 @@ def product_list(request):
     min_price = request.GET.get('min_price')
     max_price = request.GET.get('max_price')
     condition = request.GET.get('condition')
-    sort_by = request.GET.get('sort', '-created_at')
+    sort_by = request.GET.get('sort', 'relevance' if query else '-created_at')
     
     # Start with all active products
     products = Product.objects.filter(is_active=True)
     
-    # Apply search filter
-    if query:
-        products = products.filter(
-            Q(name__icontains=query) | 
-            Q(description__icontains=query) |
-            Q(short_description__icontains=query) |
-            Q(category__name__icontains=query) |
-            Q(brand__name__icontains=query) |
-            Q(sku__icontains=query)
-        )
-    
     # Apply category filter
     if category_id:
         products = products.filter(category_id=category_id)
@@ -106,6 +62,12 @@ def product_list(request):
     if condition:
         products = products.filter(condition=condition)
     
+    # Apply search filter last so the result cap counts only products that pass the filters
+    matched_ids = None
+    if query:
+        matched_ids = search.search_product_ids(query, within=products)
+        products = products.filter(id__in=matched_ids)
+    
     # Apply sorting
     if sort_by == 'price_low':
         products = products.order_by('price')
@@ -114,9 +76,12 @@ def product_list(request):
     elif sort_by == 'name':
         products = products.order_by('name')
     elif sort_by == 'popular':
+        counters.refresh_for_sort(Product)
         products = products.order_by('-view_count')
     elif sort_by == 'bestseller':
         products = products.order_by('-sold_count')
+    elif sort_by == 'relevance' and matched_ids:
+        products = products.order_by(search.rank_ordering(matched_ids))
     else:
         products = products.order_by('-created_at')
     
@@ -286,7 +251,7 @@ def cart_view(request):
     
     context = {
         'cart': cart,
-        'cart_items': cart.items.all(),
+        'cart_items': cart.items.select_related('product'),
     }
     
     return render(request, 'digital_shop/cart.html', context)
@@ -343,62 +308,30 @@ def checkout(request):
         return redirect('digital_shop:cart')
     
     if request.method == 'POST':
-        # Process checkout
-        customer_name = request.POST.get('customer_name')
-        customer_email = request.POST.get('customer_email')
-        customer_phone = request.POST.get('customer_phone')
-        shipping_address = request.POST.get('shipping_address')
-        shipping_city = request.POST.get('shipping_city')
-        shipping_postal_code = request.POST.get('shipping_postal_code')
-        customer_notes = request.POST.get('customer_notes', '')
-        
-        # Calculate totals
-        subtotal = cart.total_price
-        shipping_cost = Decimal('0.00')  # You can implement shipping calculation
-        tax_amount = Decimal('0.00')  # You can implement tax calculation
-        discount_amount = Decimal('0.00')  # You can implement coupon system
-        total_amount = subtotal + shipping_cost + tax_amount - discount_amount
-        
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            customer_name=customer_name,
-            customer_email=customer_email,
-            customer_phone=customer_phone,
-            shipping_address=shipping_address,
-            shipping_city=shipping_city,
-            shipping_postal_code=shipping_postal_code,
-            customer_notes=customer_notes,
-            subtotal=subtotal,
-            shipping_cost=shipping_cost,
-            tax_amount=tax_amount,
-            discount_amount=discount_amount,
-            total_amount=total_amount,
-            status='pending_payment',
-            payment_status='pending',
-        )
-        
-        # Create order items
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                product_name=cart_item.product.name,
-                product_sku=cart_item.product.sku,
-                quantity=cart_item.quantity,
-                unit_price=cart_item.product.price,
-                total_price=cart_item.total_price,
+        # Totals, stock and the order items are handled by the checkout service
+        try:
+            order = checkout_service.place_order(
+                request.user,
+                checkout_service.cart_lines(cart),
+                cart=cart,
+                customer_name=request.POST.get('customer_name'),
+                customer_email=request.POST.get('customer_email'),
+                customer_phone=request.POST.get('customer_phone'),
+                shipping_address=request.POST.get('shipping_address'),
+                shipping_city=request.POST.get('shipping_city'),
+                shipping_postal_code=request.POST.get('shipping_postal_code'),
+                customer_notes=request.POST.get('customer_notes', ''),
             )
-        
-        # Clear cart
-        cart.items.all().delete()
+        except checkout_service.CheckoutError as e:
+            messages.error(request, str(e))
+            return redirect('digital_shop:cart')
         
         messages.success(request, _('Order placed successfully! Please complete your payment.'))
         return redirect('digital_shop:payment_page', order_id=order.id)
     
     context = {
         'cart': cart,
-        'cart_items': cart.items.all(),
+        'cart_items': cart.items.select_related('product'),
     }
     
     return render(request, 'digital_shop/checkout.html', context)
@@ -514,12 +447,15 @@ def search_products(request):
     """AJAX product search"""
     query = request.GET.get('q', '')
     if query:
+        product_ids = search.search_product_ids(query, limit=10, within=Product.objects.filter(is_active=True))
+        if not product_ids:
+            return JsonResponse({'results': []})
         products = Product.objects.filter(
-            Q(name__icontains=query) | 
-            Q(description__icontains=query) |
-            Q(category__name__icontains=query),
+            id__in=product_ids,
             is_active=True
-        )[:10]
+        ).order_by(search.rank_ordering(product_ids)).prefetch_related(
+            Prefetch('images', queryset=ProductImage.objects.filter(is_primary=True), to_attr='primary_images')
+        )
         
         results = []
         for product in products:
@@ -527,7 +463,8 @@ def search_products(request):
                 'id': product.id,
                 'name': product.name,
                 'price': str(product.price),
-                'image': product.images.filter(is_primary=True).first().image.url if product.images.filter(is_primary=True).exists() else '',
+                'image': product.primary_images[0].image.url if product.primary_images else '',
+                'srcset': srcset(product.primary_images[0]) if product.primary_images else [],
                 'url': reverse('digital_shop:product_detail', args=[product.slug])
             })
         
@@ -643,8 +580,8 @@ def payment_page(request, order_id):
         return redirect('digital_shop:order_detail', order_id=order.id)
     
     # Get payment settings
-    payment_settings = PaymentSettings.objects.filter(is_active=True).first()
-    if not payment_settings:
+    payment_settings = PaymentSettings.load()
+    if not payment_settings or not payment_settings.is_active:
         messages.error(request, 'تنظیمات پرداخت در دسترس نیست.')
         return redirect('digital_shop:order_detail', order_id=order.id)
     
@@ -704,52 +641,157 @@ def order_detail(request, order_id):
     return render(request, 'digital_shop/order_detail.html', context)
 
 # API Endpoints for React Frontend
-@csrf_exempt
-def api_products(request):
-    """API endpoint to get products list"""
+API_PRODUCTS_PAGE_SIZE = 24
+API_PRODUCTS_MAX_PAGE_SIZE = 100
+
+# Serializers for each field of the products feed, so ``fields=`` can pick a subset
+API_PRODUCT_FIELDS = {
+    'id': lambda product: product.id,
+    'name': lambda product: product.name,
+    'description': lambda product: product.description or product.short_description or '',
+    'short_description': lambda product: product.short_description or '',
+    'price': lambda product: float(product.price),
+    'compare_price': lambda product: float(product.compare_price) if product.compare_price else None,
+    'category': lambda product: {
+        'id': product.category.id,
+        'name': product.category.name,
+    } if product.category else None,
+    'brand': lambda product: {
+        'id': product.brand.id,
+        'name': product.brand.name,
+    } if product.brand else None,
+    'images': lambda product: [{
+        'id': img.id,
+        'image': img.image.url if img.image else '',
+        'srcset': srcset(img),
+    } for img in product.images.all()],
+    'in_stock': lambda product: product.stock_quantity > 0,
+    'stock_quantity': lambda product: product.stock_quantity,
+    'sku': lambda product: product.sku,
+    'is_featured': lambda product: product.is_featured,
+    'is_new': lambda product: product.is_new,
+    'is_on_sale': lambda product: product.is_on_sale,
+    'is_active': lambda product: product.is_active,
+    'created_at': lambda product: product.created_at.isoformat(),
+}
+
+# Fields returned when the client does not ask for a subset
+API_PRODUCT_DEFAULT_FIELDS = [
+    'id', 'name', 'description', 'price', 'compare_price', 'category', 'brand',
+    'images', 'in_stock', 'stock_quantity', 'sku', 'is_featured', 'is_new',
+    'is_on_sale', 'is_active',
+]
+
+
+def _encode_product_cursor(product):
+    """Encode the (created_at, id) keyset position of a product as an opaque cursor"""
+    raw = f"{product.created_at.isoformat()}|{product.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_product_cursor(cursor):
+    """Decode a cursor produced by _encode_product_cursor, raising ValueError if invalid"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, product_id = raw.rsplit('|', 1)
+        created_at = datetime.fromisoformat(created_at)
+        product_id = int(product_id)
+    except (TypeError, ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValueError('invalid cursor')
+    if timezone.is_naive(created_at):
+        created_at = timezone.make_aware(created_at)
+    return created_at, product_id
+
+
+@async_csrf_exempt
+@cached_response(Product, ProductImage, Category, Brand)
+async def api_products(request):
+    """API endpoint to get products list
+
+    Pages through active products newest first using a keyset cursor on
+    (created_at, id). Query parameters:
+    - limit: page size (default 24, max 100)
+    - cursor: value of ``next_cursor`` from the previous page
+    - fields: comma separated subset of product fields to return
+    - q: full-text search; matches keep the newest-first order
+    - category: id of the category to list
+
+    The first page (no cursor) also lists the active categories, so the
+    client can offer the category filter without loading the catalog.
+    """
     if request.method == 'GET':
         try:
-            # Get all active products
-            products = Product.objects.filter(is_active=True).order_by('-created_at')
-            
-            products_data = []
-            for product in products:
-                # Get first image
-                first_image = product.images.first()
-                
-                product_data = {
-                    'id': product.id,
-                    'name': product.name,
-                    'description': product.description or product.short_description or '',
-                    'price': float(product.price),
-                    'compare_price': float(product.compare_price) if product.compare_price else None,
-                    'category': {
-                        'id': product.category.id,
-                        'name': product.category.name,
-                    } if product.category else None,
-                    'brand': {
-                        'id': product.brand.id,
-                        'name': product.brand.name,
-                    } if product.brand else None,
-                    'images': [{
-                        'id': img.id,
-                        'image': img.image.url if img.image else '',
-                    } for img in product.images.all()],
-                    'in_stock': product.stock_quantity > 0,
-                    'stock_quantity': product.stock_quantity,
-                    'sku': product.sku,
-                    'is_featured': product.is_featured,
-                    'is_new': product.is_new,
-                    'is_on_sale': product.is_on_sale,
-                    'is_active': product.is_active,  # Add this missing field
-                }
-                products_data.append(product_data)
-            
-            return JsonResponse({
+            try:
+                limit = int(request.GET.get('limit', API_PRODUCTS_PAGE_SIZE))
+            except ValueError:
+                limit = API_PRODUCTS_PAGE_SIZE
+            limit = max(1, min(limit, API_PRODUCTS_MAX_PAGE_SIZE))
+
+            fields_param = request.GET.get('fields', '')
+            if fields_param:
+                fields = [f.strip() for f in fields_param.split(',') if f.strip() in API_PRODUCT_FIELDS]
+                if 'id' not in fields:
+                    fields.insert(0, 'id')
+            else:
+                fields = API_PRODUCT_DEFAULT_FIELDS
+
+            products = Product.objects.filter(is_active=True).order_by('-created_at', '-id')
+            category = request.GET.get('category', '')
+            if category.isdigit():
+                products = products.filter(category_id=category)
+            query = request.GET.get('q', '').strip()
+            if query:
+                matched_ids = await sync_to_async(search.search_product_ids)(query, within=products)
+                products = products.filter(id__in=matched_ids)
+
+            cursor = request.GET.get('cursor')
+            if cursor:
+                try:
+                    cursor_created_at, cursor_id = _decode_product_cursor(cursor)
+                except ValueError:
+                    return JsonResponse({
+                        'success': False,
+                        'message': 'مکان‌نمای صفحه نامعتبر است'
+                    }, status=400)
+                products = products.filter(
+                    Q(created_at__lt=cursor_created_at) |
+                    Q(created_at=cursor_created_at, id__lt=cursor_id)
+                )
+
+            # Only join/prefetch the relations the requested fields actually use
+            related = [name for name in ('category', 'brand') if name in fields]
+            if related:
+                products = products.select_related(*related)
+            if 'images' in fields:
+                products = products.prefetch_related(
+                    Prefetch('images', queryset=ProductImage.objects.order_by('sort_order', 'id'))
+                )
+            if 'description' not in fields:
+                products = products.defer('description')
+
+            # Fetch one extra row to know whether another page exists
+            page = [product async for product in products[:limit + 1]]
+            has_more = len(page) > limit
+            page = page[:limit]
+
+            products_data = [
+                {field: API_PRODUCT_FIELDS[field](product) for field in fields}
+                for product in page
+            ]
+
+            data = {
                 'success': True,
                 'products': products_data,
-                'count': len(products_data)
-            })
+                'count': len(products_data),
+                'has_more': has_more,
+                'next_cursor': _encode_product_cursor(page[-1]) if has_more else None,
+            }
+            if not cursor:
+                data['categories'] = [
+                    category async for category in
+                    Category.objects.filter(is_active=True).order_by('name').values('id', 'name')
+                ]
+            return JsonResponse(data)
             
         except Exception as e:
             return JsonResponse({
@@ -759,12 +801,17 @@ def api_products(request):
     
     return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
 
-@csrf_exempt
-def api_product_detail(request, product_id):
+@async_csrf_exempt
+# view_count changes without a save, so the cached detail is refreshed every minute
+@cached_response(Product, ProductImage, ProductAttribute, Category, Brand, refresh=60)
+async def api_product_detail(request, product_id):
     """API endpoint to get product details"""
     if request.method == 'GET':
         try:
-            product = get_object_or_404(Product, id=product_id, is_active=True)
+            product = await aget_object_or_404(
+                Product.objects.select_related('category', 'brand').prefetch_related('images', 'attributes'),
+                id=product_id, is_active=True,
+            )
             
             product_data = {
                 'id': product.id,
@@ -784,6 +831,7 @@ def api_product_detail(request, product_id):
                 'images': [{
                     'id': img.id,
                     'image': img.image.url if img.image else '',
+                    'srcset': srcset(img),
                 } for img in product.images.all()],
                 'attributes': [{
                     'name': attr.name,
@@ -792,7 +840,7 @@ def api_product_detail(request, product_id):
                 'in_stock': product.stock_quantity > 0,
                 'stock_quantity': product.stock_quantity,
                 'sku': product.sku,
-                'view_count': product.view_count,
+                'view_count': product.view_count + counters.pending(product),
                 'sold_count': product.sold_count,
             }
             
@@ -818,8 +866,10 @@ def api_cart(request):
             cart, created = Cart.objects.get_or_create(user=request.user)
             
             cart_items = []
-            for item in cart.items.all():
-                first_image = item.product.images.first()
+            items = cart.items.select_related('product').prefetch_related('product__images')
+            for item in items:
+                images = item.product.images.all()
+                first_image = images[0] if images else None
                 
                 item_data = {
                     'id': item.id,
@@ -828,18 +878,20 @@ def api_cart(request):
                         'name': item.product.name,
                         'price': float(item.product.price),
                         'image': first_image.image.url if first_image and first_image.image else '',
+                        'srcset': srcset(first_image) if first_image else [],
                     },
                     'quantity': item.quantity,
                     'total_price': float(item.total_price),
                 }
                 cart_items.append(item_data)
             
+            summary = cart.summary
             return JsonResponse({
                 'success': True,
                 'cart': {
                     'items': cart_items,
-                    'total_items': cart.total_items,
-                    'total_price': float(cart.total_price),
+                    'total_items': summary['total_items'],
+                    'total_price': float(summary['total_price']),
                 }
             })
             
@@ -999,30 +1051,19 @@ def api_checkout(request):
             
             data = json.loads(request.body)
             
-            # Create order
-            order = Order.objects.create(
-                user=request.user,
-                email=request.user.email,
-                phone=data.get('phone', ''),
-                address=data.get('address', ''),
-                notes=data.get('notes', ''),
-                total_amount=cart.total_price,
-                status='pending_payment'
+            order = checkout_service.place_order(
+                request.user,
+                checkout_service.cart_lines(cart),
+                cart=cart,
+                customer_name=data.get('name') or request.user.get_full_name() or request.user.username,
+                customer_email=request.user.email,
+                customer_phone=data.get('phone', ''),
+                shipping_address=data.get('address', ''),
+                shipping_city=data.get('city', ''),
+                shipping_postal_code=data.get('postal_code', ''),
+                customer_notes=data.get('notes', ''),
             )
             
-            # Create order items
-            for cart_item in cart.items.all():
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.price,
-                    total_price=cart_item.total_price
-                )
-            
-            # Clear cart
-            cart.items.all().delete()
-            
             return JsonResponse({
                 'success': True,
                 'message': 'سفارش با موفقیت ثبت شد',
@@ -1035,6 +1076,11 @@ def api_checkout(request):
                 'success': False,
                 'message': 'داده‌های ارسالی نامعتبر است'
             }, status=400)
+        except checkout_service.CheckoutError as e:
+            return JsonResponse({
+                'success': False,
+                'message': str(e)
+            }, status=400)
         except Exception as e:
             return JsonResponse({
                 'success': False,
@@ -1120,28 +1166,9 @@ def api_create_order(request):
         if not isinstance(items, list) or len(items) == 0:
             return JsonResponse({'success': False, 'message': 'هیچ آیتمی ارسال نشده است'}, status=400)
 
-        # Calculate totals and validate items
-        subtotal = Decimal('0.00')
-        order_items_payload = []
-        for row in items:
-            product_id = int(row.get('product_id'))
-            quantity = int(row.get('quantity', 1))
-            if quantity <= 0:
-                return JsonResponse({'success': False, 'message': 'تعداد نامعتبر است'}, status=400)
-            product = get_object_or_404(Product, id=product_id, is_active=True)
-            if product.stock_quantity < quantity:
-                return JsonResponse({'success': False, 'message': f'موجودی کافی برای {product.name} نیست'}, status=400)
-            line_total = Decimal(str(product.price)) * quantity
-            subtotal += line_total
-            order_items_payload.append((product, quantity, Decimal(str(product.price)), line_total))
-
-        shipping_cost = Decimal('0.00')
-        tax_amount = Decimal('0.00')
-        discount_amount = Decimal('0.00')
-        total_amount = subtotal + shipping_cost + tax_amount - discount_amount
-
-        order = Order.objects.create(
-            user=request.user,
+        order = checkout_service.place_order(
+            request.user,
+            [(row.get('product_id'), row.get('quantity', 1)) for row in items],
             customer_name=data.get('customer_name', ''),
             customer_email=request.user.email,
             customer_phone=data.get('customer_phone', ''),
@@ -1149,32 +1176,16 @@ def api_create_order(request):
             shipping_city='',
             shipping_postal_code='',
             customer_notes=data.get('customer_notes', ''),
-            subtotal=subtotal,
-            shipping_cost=shipping_cost,
-            tax_amount=tax_amount,
-            discount_amount=discount_amount,
-            total_amount=total_amount,
-            status='pending_payment',
-            payment_status='pending',
         )
 
-        for product, quantity, unit_price, line_total in order_items_payload:
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                product_name=product.name,
-                product_sku=product.sku,
-                quantity=quantity,
-                unit_price=unit_price,
-                total_price=line_total,
-            )
-
         return JsonResponse({
             'success': True,
             'order_id': order.id,
             'order_number': order.order_number,
             'total_amount': float(order.total_amount),
         })
+    except checkout_service.CheckoutError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'message': f'خطا در ایجاد سفارش: {str(e)}'}, status=500)
 
@@ -1250,6 +1261,7 @@ def api_admin_products(request):
                     'images': [{
                         'id': img.id,
                         'image': img.image.url if img.image else '',
+                        'srcset': srcset(img),
                     } for img in product.images.all()],
                     'is_active': product.is_active,
                     'is_featured': product.is_featured,
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('government_services', '0002_digitalservice_digitalservicecategory_lifeevent_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userservicerequest',
+            index=models.Index(fields=['user', 'status'], name='gov_request_user_status'),
+        ),
+    ]
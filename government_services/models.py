@@ -5,6 +5,9 @@ from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 import uuid
 
+from core import counters
+from core.models import ScheduledQuerySet
+
 class DigitalServiceCategory(models.Model):
     """Enhanced categories for digital services with visual appeal"""
     name = models.CharField(_('Category Name'), max_length=100)
@@ -102,8 +105,9 @@ class DigitalService(models.Model):
         return self.name
     
     def increment_view_count(self):
+        # Buffered and written in batches by core.counters
+        counters.increment(self, 'view_count')
         self.view_count += 1
-        self.save(update_fields=['view_count'])
 
 class LifeEvent(models.Model):
     """Life events that trigger service recommendations"""
@@ -183,6 +187,9 @@ class UserServiceRequest(models.Model):
         verbose_name = _('User Service Request')
         verbose_name_plural = _('User Service Requests')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'status'], name='gov_request_user_status'),
+        ]
     
     def __str__(self):
         return f"{self.request_id} - {self.user.username} - {self.service.name}"
@@ -304,6 +311,8 @@ class ServiceNotification(models.Model):
     start_date = models.DateTimeField(_('Start Date'))
     end_date = models.DateTimeField(_('End Date'), blank=True, null=True)
     created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+
+    objects = ScheduledQuerySet.as_manager()
     
     class Meta:
         verbose_name = _('Service Notification')
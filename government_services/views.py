@@ -21,6 +21,8 @@ from .forms import (
     ServiceRequestForm, ServiceReviewForm, ServiceSearchForm,
     ServiceFilterForm, ContactForm, ServiceFeedbackForm
 )
+from core import counters
+from core.async_views import async_csrf_exempt
 
 def digital_life_dashboard(request):
     """Main Digital Life Assistant dashboard"""
@@ -50,7 +52,7 @@ def digital_life_dashboard(request):
         life_events = LifeEvent.objects.filter(is_active=True).order_by('sort_order')[:4]
         
         # Get notifications
-        notifications = [n for n in ServiceNotification.objects.filter(is_active=True) if n.is_current][:3]
+        notifications = ServiceNotification.objects.current()[:3]
         
         # Calculate user stats
         total_requests = UserServiceRequest.objects.filter(user=request.user).count()
@@ -104,6 +106,8 @@ def get_recommended_services(user):
         user=user, status='completed'
     ).values_list('service__category_id', flat=True)
     
+    counters.refresh_for_sort(DigitalService)
+    
     # Find services in categories user has used before
     if completed_services:
         recommended = DigitalService.objects.filter(
@@ -178,6 +182,8 @@ def service_list(request):
             services = services.filter(has_express_lane=True)
         
         if sort_by:
+            if sort_by == '-view_count':
+                counters.refresh_for_sort(DigitalService)
             services = services.order_by(sort_by)
         else:
             services = services.order_by('sort_order', 'name')
@@ -225,7 +231,7 @@ def service_detail(request, service_id):
     # Get related data
     steps = service.steps.filter(is_active=True).order_by('step_number')
     reviews = service.reviews.filter(is_verified=True).order_by('-created_at')[:5]
-    notifications = [n for n in service.notifications.filter(is_active=True) if n.is_current]
+    notifications = service.notifications.current()
     
     # Calculate average rating
     avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0
@@ -521,6 +527,7 @@ def service_statistics(request):
     total_reviews = ServiceReview.objects.count()
     
     # Most popular services
+    counters.refresh_for_sort(DigitalService)
     popular_services = DigitalService.objects.filter(
         status='active'
     ).order_by('-view_count')[:10]
@@ -560,8 +567,8 @@ def service_statistics(request):
     
     return render(request, 'government_services/statistics.html', context)
 
-@csrf_exempt
-def service_search_api(request):
+@async_csrf_exempt
+async def service_search_api(request):
     """Enhanced API endpoint for service search"""
     if request.method == 'GET':
         query = request.GET.get('q', '')
@@ -571,10 +578,10 @@ def service_search_api(request):
                 Q(description__icontains=query) |
                 Q(short_description__icontains=query),
                 status='active'
-            )[:10]
+            ).select_related('category')[:10]
             
             results = []
-            for service in services:
+            async for service in services:
                 results.append({
                     'id': service.id,
                     'name': service.name,
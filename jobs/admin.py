@@ -0,0 +1,23 @@
+from django.contrib import admin
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'task', 'status', 'priority', 'attempts', 'run_at', 'created_at', 'finished_at']
+    list_filter = ['status', 'task']
+    search_fields = ['task', 'last_error']
+    readonly_fields = [
+        'task', 'args', 'kwargs', 'attempts', 'locked_by', 'locked_at', 'last_error', 'created_at', 'finished_at'
+    ]
+    actions = ['retry_jobs']
+
+    def retry_jobs(self, request, queryset):
+        count = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, run_at=timezone.now(), attempts=0, finished_at=None,
+        )
+        self.message_user(request, _('%(count)d jobs queued again.') % {'count': count})
+    retry_jobs.short_description = _('Queue again')
@@ -0,0 +1,65 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs import queue
+
+
+def run_threads(threads):
+    """Run ``threads`` workers in this process until SIGTERM or SIGINT"""
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        # Let running jobs finish, then exit
+        signal.signal(signum, lambda *args: stop.set())
+    workers = [threading.Thread(target=queue.work, args=(stop,), daemon=True) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    # Wake up periodically so signals are handled while waiting
+    while any(worker.is_alive() for worker in workers):
+        for worker in workers:
+            worker.join(timeout=1)
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers (see jobs/queue.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=getattr(settings, 'JOB_WORKER_PROCESSES', 1),
+                            help='Worker processes')
+        parser.add_argument('--threads', type=int, default=getattr(settings, 'JOB_WORKER_THREADS', 4),
+                            help='Worker threads per process')
+        parser.add_argument('--once', action='store_true',
+                            help='Run the jobs that are due in this thread, then exit')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            count = queue.run_pending()
+            self.stdout.write(self.style.SUCCESS(f'Ran {count} jobs'))
+            return
+
+        processes, threads = max(options['processes'], 1), max(options['threads'], 1)
+        self.stdout.write(f'Starting {processes} worker processes with {threads} threads each')
+        if processes == 1:
+            run_threads(threads)
+            return
+
+        # Forked children must open their own database connections
+        connections.close_all()
+        children = [multiprocessing.Process(target=run_threads, args=(threads,)) for _ in range(processes)]
+        for child in children:
+            child.start()
+
+        def forward(signum, frame):
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for child in children:
+            child.join()
+        self.stdout.write(self.style.SUCCESS('Workers stopped'))
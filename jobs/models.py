@@ -0,0 +1,43 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class Job(models.Model):
+    """A function call queued for the ``run_workers`` command (see ``jobs/queue.py``)"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, _('Queued')),
+        (RUNNING, _('Running')),
+        (DONE, _('Done')),
+        (FAILED, _('Failed')),
+    ]
+
+    task = models.CharField(_('Task'), max_length=255, help_text=_('Dotted path of the function to call'))
+    args = models.JSONField(_('Arguments'), default=list, blank=True)
+    kwargs = models.JSONField(_('Keyword Arguments'), default=dict, blank=True)
+    status = models.CharField(_('Status'), max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    priority = models.SmallIntegerField(_('Priority'), default=0, help_text=_('Higher runs first'))
+    run_at = models.DateTimeField(_('Run At'), default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(_('Attempts'), default=0)
+    max_attempts = models.PositiveSmallIntegerField(_('Max Attempts'), default=5)
+    locked_by = models.CharField(_('Locked By'), max_length=100, blank=True)
+    locked_at = models.DateTimeField(_('Locked At'), blank=True, null=True)
+    last_error = models.TextField(_('Last Error'), blank=True)
+    created_at = models.DateTimeField(_('Created At'), auto_now_add=True)
+    finished_at = models.DateTimeField(_('Finished At'), blank=True, null=True)
+
+    class Meta:
+        ordering = ['-priority', 'run_at', 'id']
+        verbose_name = _('Job')
+        verbose_name_plural = _('Jobs')
+        indexes = [
+            # Claiming scans due jobs in priority order
+            models.Index(fields=['status', '-priority', 'run_at', 'id'], name='jobs_job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
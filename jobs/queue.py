@@ -0,0 +1,202 @@
+"""Durable background jobs kept in the database.
+
+``enqueue(func, *args, **kwargs)`` stores a call to a module-level
+function as a ``Job`` row; arguments must be JSON serializable. The row is
+written in the caller's transaction, so a job is only seen by the workers
+once the data it refers to has been committed, and it survives restarts.
+
+``manage.py run_workers`` runs a pool of worker processes and threads.
+Each worker claims the highest-priority due job:
+
+- with ``SELECT ... FOR UPDATE SKIP LOCKED`` on databases that support it
+  (PostgreSQL, MySQL 8, Oracle), so workers never wait on each other
+- on SQLite, which locks the whole database for writes, with a conditional
+  ``UPDATE ... WHERE status = 'queued'`` that only one worker can win
+
+A job that raises is retried with exponential backoff until it has run
+``max_attempts`` times, then marked failed with its traceback. Jobs left
+running by a worker that died are queued again after ``JOB_LOCK_TIMEOUT``.
+A worker that hits a database error (e.g. ``database is locked`` on
+SQLite) logs it and retries after a growing pause instead of exiting.
+
+Settings:
+- ``JOB_QUEUE_ASYNC``: leave jobs to the workers (True); when False,
+  ``enqueue()`` runs the job inline in the calling thread
+- ``JOB_MAX_ATTEMPTS``: runs before a job is marked failed (5)
+- ``JOB_RETRY_BACKOFF``: seconds before the first retry, doubled for each
+  further attempt (10)
+- ``JOB_RETRY_MAX_DELAY``: longest wait between attempts in seconds (3600)
+- ``JOB_LOCK_TIMEOUT``: seconds before a running job is considered lost (600)
+- ``JOB_KEEP_DONE``: seconds finished jobs are kept (7 days)
+- ``JOB_POLL_INTERVAL``: seconds an idle worker waits between polls (1.0)
+- ``JOB_WORKER_PROCESSES`` / ``JOB_WORKER_THREADS``: ``run_workers`` pool (1 / 4)
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_INTERVAL = 60  # seconds between stale-job and cleanup passes of a worker
+MAX_ERROR_BACKOFF = 60  # longest pause of a worker after repeated database errors
+
+
+def task_path(func):
+    """The dotted path a job stores for ``func``"""
+    if isinstance(func, str):
+        return func
+    path = f'{func.__module__}.{func.__qualname__}'
+    if '<' in path or '.' in func.__qualname__:
+        raise ValueError(f'{path} is not a module-level function and cannot be queued')
+    return path
+
+
+def runs_inline():
+    """Whether ``enqueue()`` runs jobs in the calling thread (``JOB_QUEUE_ASYNC = False``)"""
+    return not getattr(settings, 'JOB_QUEUE_ASYNC', True)
+
+
+def enqueue(func, *args, priority=0, delay=0, max_attempts=None, **kwargs):
+    """Queue ``func(*args, **kwargs)`` and return the ``Job``.
+
+    Higher ``priority`` runs first; ``delay`` postpones the first run by
+    that many seconds.
+    """
+    job = Job.objects.create(
+        task=task_path(func),
+        args=list(args),
+        kwargs=kwargs,
+        priority=priority,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 5),
+    )
+    if runs_inline() and not delay:
+        if _claim(Job.objects.filter(pk=job.pk), 'inline', timezone.now()):
+            job.refresh_from_db()
+            execute(job)
+    return job
+
+
+def _claim(candidates, worker, now):
+    """Mark one queued job as running for ``worker``; False if another worker got it first"""
+    return candidates.filter(status=Job.QUEUED).update(
+        status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+    ) == 1
+
+
+def claim(worker, limit=1):
+    """Claim up to ``limit`` due jobs for ``worker``, highest priority first"""
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('-priority', 'run_at', 'id')
+    if connections[due.db].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=due.db):
+            pks = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            _claim(Job.objects.filter(pk__in=pks), worker, now)
+    else:
+        pks = []
+        # Look past the first rows: other workers may win some of them
+        for pk in due.values_list('pk', flat=True)[:limit * 4]:
+            if _claim(Job.objects.filter(pk=pk), worker, now):
+                pks.append(pk)
+                if len(pks) == limit:
+                    break
+    return list(Job.objects.filter(pk__in=pks).order_by('-priority', 'run_at', 'id'))
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that has failed ``attempts`` times"""
+    delay = getattr(settings, 'JOB_RETRY_BACKOFF', 10) * 2 ** max(attempts - 1, 0)
+    return min(delay, getattr(settings, 'JOB_RETRY_MAX_DELAY', 3600))
+
+
+def execute(job):
+    """Run a claimed job and record the outcome; returns True if it succeeded"""
+    try:
+        import_string(job.task)(*job.args, **job.kwargs)
+    except Exception:
+        logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.task, job.attempts)
+        now = timezone.now()
+        unlocked = Job.objects.filter(pk=job.pk, status=Job.RUNNING)
+        if job.attempts < job.max_attempts:
+            unlocked.update(status=Job.QUEUED, run_at=now + timedelta(seconds=backoff(job.attempts)),
+                            last_error=traceback.format_exc(), locked_by='', locked_at=None)
+        else:
+            unlocked.update(status=Job.FAILED, finished_at=now, last_error=traceback.format_exc(),
+                            locked_by='', locked_at=None)
+        return False
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(
+        status=Job.DONE, finished_at=timezone.now(), locked_by='', locked_at=None,
+    )
+    return True
+
+
+def maintain():
+    """Queue jobs whose worker died again and delete old finished jobs"""
+    now = timezone.now()
+    lost = Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 600)),
+    ).update(status=Job.QUEUED, run_at=now, locked_by='', locked_at=None)
+    if lost:
+        logger.warning('Requeued %s jobs left running by a lost worker', lost)
+    Job.objects.filter(
+        status=Job.DONE, finished_at__lt=now - timedelta(seconds=getattr(settings, 'JOB_KEEP_DONE', 7 * 24 * 3600)),
+    ).delete()
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'[:100]
+
+
+def work(stop, once=False):
+    """Run jobs until ``stop`` (a ``threading.Event``) is set, or the queue is empty with ``once``.
+
+    Returns the number of jobs run.
+    """
+    worker = worker_name()
+    poll = getattr(settings, 'JOB_POLL_INTERVAL', 1.0)
+    last_maintenance = None
+    done = 0
+    errors = 0
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            if last_maintenance is None or time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                maintain()
+                last_maintenance = time.monotonic()
+            jobs = claim(worker)
+            errors = 0
+            if not jobs:
+                if once:
+                    break
+                stop.wait(poll)
+                continue
+            for job in jobs:
+                execute(job)
+                done += 1
+        except DatabaseError:
+            if once:
+                raise
+            # A job whose outcome could not be recorded is requeued by maintain() after JOB_LOCK_TIMEOUT
+            errors += 1
+            delay = min(poll * 2 ** errors, MAX_ERROR_BACKOFF)
+            logger.exception('Worker %s hit a database error, retrying in %.1fs', worker, delay)
+            stop.wait(delay)
+    close_old_connections()
+    return done
+
+
+def run_pending():
+    """Run every due job in the calling thread, e.g. from cron or tests; returns the count"""
+    return work(threading.Event(), once=True)
@@ -0,0 +1,139 @@
+import io
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from digital_shop.models import Order, PaymentReceipt
+from . import queue
+from .models import Job
+
+calls = []
+
+
+def record(value, suffix=''):
+    calls.append(f'{value}{suffix}')
+
+
+def explode():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    """Jobs are claimed by priority, retried with backoff and survive lost workers"""
+
+    def setUp(self):
+        calls.clear()
+        self.addCleanup(calls.clear)
+
+    def test_jobs_run_by_priority(self):
+        queue.enqueue(record, 'low')
+        queue.enqueue(record, 'high', priority=10)
+        queue.enqueue(record, 'later', delay=60)
+        queue.enqueue('jobs.tests.record', 'kw', suffix='!')
+        self.assertEqual(queue.run_pending(), 3)
+        self.assertEqual(calls, ['high', 'low', 'kw!'])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 3)
+        self.assertEqual(Job.objects.get(status=Job.QUEUED).args, ['later'])
+
+    def test_a_job_is_claimed_once(self):
+        job = queue.enqueue(record, 'once')
+        self.assertEqual(queue.claim('first'), [Job.objects.get(pk=job.pk)])
+        self.assertEqual(queue.claim('second'), [])
+        claimed = Job.objects.get(pk=job.pk)
+        self.assertEqual((claimed.status, claimed.locked_by, claimed.attempts), (Job.RUNNING, 'first', 1))
+
+    @override_settings(JOB_RETRY_BACKOFF=10)
+    def test_failures_are_retried_with_backoff_then_failed(self):
+        job = queue.enqueue(explode, max_attempts=2)
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertEqual(queue.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=5))
+        self.assertEqual(queue.backoff(3), 40)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            queue.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_lost_jobs_are_requeued(self):
+        job = queue.enqueue(record, 'lost')
+        queue.claim('dead-worker')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            self.assertEqual(queue.run_pending(), 1)
+        self.assertEqual(calls, ['lost'])
+
+    @override_settings(JOB_POLL_INTERVAL=0.001)
+    def test_database_errors_do_not_stop_a_worker(self):
+        queue.enqueue(record, 'after-error')
+        stop = threading.Event()
+        claim = queue.claim
+        failures = iter([OperationalError('database is locked')] * 2)
+
+        def flaky_claim(worker):
+            error = next(failures, None)
+            if error:
+                raise error
+            jobs = claim(worker)
+            if not jobs:
+                stop.set()
+            return jobs
+
+        with mock.patch.object(queue, 'claim', flaky_claim), self.assertLogs('jobs.queue', 'ERROR') as logs:
+            self.assertEqual(queue.work(stop), 1)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(calls, ['after-error'])
+
+    def test_only_module_level_functions_can_be_queued(self):
+        with self.assertRaises(ValueError):
+            queue.enqueue(lambda: None)
+
+    @override_settings(JOB_QUEUE_ASYNC=False)
+    def test_inline_mode(self):
+        job = queue.enqueue(record, 'inline')
+        self.assertEqual(calls, ['inline'])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+
+    def test_run_workers_once(self):
+        queue.enqueue(record, 'command')
+        out = io.StringIO()
+        call_command('run_workers', '--once', stdout=out)
+        self.assertEqual(calls, ['command'])
+        self.assertIn('Ran 1 jobs', out.getvalue())
+
+
+class QueuedSideEffectTests(TestCase):
+    """Emails and order updates run in jobs instead of the request"""
+
+    def test_password_reset_email_is_queued(self):
+        User.objects.create_user('reader', 'reader@example.com', 'pw')
+        response = self.client.post(reverse('accounts:password_reset'), {'email': 'reader@example.com'})
+        self.assertRedirects(response, reverse('accounts:password_reset_done'), fetch_redirect_response=False)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(queue.run_pending(), 1)
+        self.assertEqual(mail.outbox[0].to, ['reader@example.com'])
+
+    def test_approved_receipt_marks_order_paid(self):
+        user = User.objects.create_user('buyer')
+        order = Order.objects.create(user=user, customer_name='Buyer', customer_email='buyer@example.com',
+                                     subtotal=100, total_amount=100, status='pending_payment')
+        receipt = PaymentReceipt.objects.create(order=order, receipt_image='payment_receipts/slip.jpg', amount_paid=100)
+        receipt.status = 'approved'
+        receipt.save()
+        self.assertTrue(Job.objects.filter(task='digital_shop.checkout.mark_paid', status=Job.QUEUED).exists())
+        queue.run_pending()
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'paid')
@@ -0,0 +1,61 @@
+"""Cached catalog of active accessories and package deals.
+
+The order pages, their forms and the accessory APIs of both services used
+to query ``Accessory`` and regroup the rows by category on every request.
+The catalog is built once: active accessories in display order, grouped
+by category for each service, and active package deals with their
+accessories prefetched. It is kept in the Django cache under the change
+versions of ``Accessory`` and ``PackageDeal`` (see ``core/response_cache.py``),
+so any save, delete or ``touch()`` of either model starts a new entry.
+
+Settings:
+- ``ACCESSORY_CATALOG_CACHE_TIMEOUT``: seconds a catalog stays cached (3600)
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from core import response_cache
+
+from .models import Accessory, PackageDeal
+
+SERVICE_TYPES = ('print', 'typing')
+
+
+def build():
+    """Query the catalog; every value is a list or dict so it can be cached as is"""
+    accessories = list(Accessory.objects.filter(is_active=True).order_by('category', 'sort_order', 'name'))
+    deals = list(PackageDeal.objects.filter(is_active=True).prefetch_related('accessories'))
+    catalog = {'accessories': accessories, 'by_category': {}, 'deals': {}}
+    for service_type in SERVICE_TYPES:
+        grouped = {}
+        for accessory in accessories:
+            if accessory.service_type in (service_type, 'both'):
+                grouped.setdefault(accessory.category, []).append(accessory)
+        catalog['by_category'][service_type] = grouped
+        catalog['deals'][service_type] = [deal for deal in deals if deal.service_type in (service_type, 'both')]
+    return catalog
+
+
+def get():
+    versions = response_cache.versions([Accessory, PackageDeal])
+    key = 'accessory-catalog:' + ':'.join(str(version) for version in versions)
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = build()
+        cache.set(key, catalog, getattr(settings, 'ACCESSORY_CATALOG_CACHE_TIMEOUT', 3600))
+    return catalog
+
+
+def accessories():
+    """Every active accessory, ordered by category and sort order"""
+    return get()['accessories']
+
+
+def by_category(service_type):
+    """``{category: [accessory, ...]}`` of the active accessories offered with a service"""
+    return get()['by_category'][service_type]
+
+
+def package_deals(service_type):
+    """Active package deals for a service, with ``accessories`` prefetched"""
+    return get()['deals'][service_type]
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import PrintOrder, UploadedFile, PaymentSettings, Accessory, PackageDeal, PrintOrderAccessory, PrintPriceSettings
+from .models import PrintOrder, UploadedFile, PaymentSettings, Accessory, PackageDeal, PrintOrderAccessory, PrintPriceSettings, DocumentAnalysis
 
 class PrintOrderAccessoryInline(admin.TabularInline):
     model = PrintOrderAccessory
@@ -10,11 +10,12 @@ class PrintOrderAccessoryInline(admin.TabularInline):
 
 @admin.register(PrintOrder)
 class PrintOrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'name', 'email', 'status', 'created_at', 'get_total_price']
+    list_display = ['id', 'name', 'email', 'status', 'total_pages', 'created_at', 'get_total_price']
     list_filter = ['status', 'created_at']
     search_fields = ['name', 'email']
+    raw_id_fields = ['user']
     inlines = [PrintOrderAccessoryInline]
-    readonly_fields = ['get_total_price', 'get_accessories_total']
+    readonly_fields = ['total_pages', 'get_total_price', 'get_accessories_total']
     
     def get_total_price(self, obj):
         return f"{obj.get_total_price()} تومان"
@@ -26,7 +27,14 @@ class PrintOrderAdmin(admin.ModelAdmin):
 
 @admin.register(UploadedFile)
 class UploadedFileAdmin(admin.ModelAdmin):
-    list_display = ['order', 'file', 'uploaded_at']
+    list_display = ['order', 'file', 'page_count', 'uploaded_at']
+    readonly_fields = ['content_hash', 'page_count']
+
+@admin.register(DocumentAnalysis)
+class DocumentAnalysisAdmin(admin.ModelAdmin):
+    list_display = ['content_hash', 'file_type', 'page_count', 'error', 'analyzed_at']
+    list_filter = ['file_type']
+    search_fields = ['content_hash']
 
 @admin.register(PaymentSettings)
 class PaymentSettingsAdmin(admin.ModelAdmin):
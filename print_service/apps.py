@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PrintServiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'print_service'
+
+    def ready(self):
+        from . import signals  # noqa: F401
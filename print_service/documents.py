@@ -0,0 +1,167 @@
+"""Page counting for uploaded print and typing documents.
+
+Uploaded files are analyzed off the request thread: the signal handlers
+queue ``analyze_uploaded_file`` / ``analyze_typing_order`` as durable jobs
+(see ``jobs/queue.py``), which run inline when ``JOB_QUEUE_ASYNC`` is False.
+Results are cached in ``DocumentAnalysis`` by the SHA-256 of the file
+content, so the same document uploaded twice (or re-analyzed by the
+``analyze_documents`` command) is only parsed once. Detected page counts are
+written to ``UploadedFile.page_count`` / ``PrintOrder.total_pages`` and
+``TypingOrder.detected_page_count``, which the pricing functions use.
+
+Supported formats:
+- PDF: via ``pypdf`` when installed, otherwise by counting page objects
+- DOCX: the page count Word stores in ``docProps/app.xml``
+- Images: one page per frame (multi-page TIFFs count every frame)
+"""
+import hashlib
+import os
+import re
+import zipfile
+
+from django.db.models import Sum
+
+try:
+    import pypdf
+except ImportError:  # pragma: no cover - optional dependency
+    pypdf = None
+
+READ_SIZE = 64 * 1024
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.webp')
+
+# "/Type /Page" but not "/Type /Pages"
+_PDF_PAGE_RE = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+_DOCX_PAGES_RE = re.compile(rb'<Pages>(\d+)</Pages>')
+
+
+class UnsupportedDocument(Exception):
+    """Raised for file types whose pages cannot be counted"""
+
+
+def file_type(name):
+    ext = os.path.splitext(name or '')[1].lower()
+    if ext == '.pdf':
+        return 'pdf'
+    if ext == '.docx':
+        return 'docx'
+    if ext in IMAGE_EXTENSIONS:
+        return 'image'
+    return ext.lstrip('.') or 'unknown'
+
+
+def _count_pdf_pages(fh):
+    if pypdf is not None:
+        return len(pypdf.PdfReader(fh).pages)
+    # Fallback: count page objects. Matches starting in the last few bytes of
+    # a read are left for the next window so a split marker is counted once
+    count = 0
+    tail = b''
+    for data in iter(lambda: fh.read(READ_SIZE), b''):
+        window = tail + data
+        cutoff = max(len(window) - 32, 0)
+        count += sum(1 for match in _PDF_PAGE_RE.finditer(window) if match.start() < cutoff)
+        tail = window[cutoff:]
+    count += len(_PDF_PAGE_RE.findall(tail))
+    if not count:
+        # Page objects hidden in compressed object streams need a real parser
+        raise UnsupportedDocument('Could not find PDF page objects; install pypdf')
+    return count
+
+
+def _count_docx_pages(fh):
+    with zipfile.ZipFile(fh) as archive:
+        try:
+            match = _DOCX_PAGES_RE.search(archive.read('docProps/app.xml'))
+        except KeyError:
+            match = None
+    if not match:
+        raise UnsupportedDocument('DOCX file has no stored page count')
+    return int(match.group(1))
+
+
+def _count_image_pages(fh):
+    from PIL import Image
+
+    with Image.open(fh) as image:
+        return getattr(image, 'n_frames', 1)
+
+
+COUNTERS = {
+    'pdf': _count_pdf_pages,
+    'docx': _count_docx_pages,
+    'image': _count_image_pages,
+}
+
+
+def count_pages(fh, name):
+    """Return the number of pages in the open binary file ``fh`` named ``name``"""
+    counter = COUNTERS.get(file_type(name))
+    if counter is None:
+        raise UnsupportedDocument(f'Cannot count pages of {name}')
+    fh.seek(0)
+    return counter(fh)
+
+
+def content_hash(field_file):
+    digest = hashlib.sha256()
+    with field_file.open('rb') as fh:
+        for data in iter(lambda: fh.read(READ_SIZE), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def analyze(field_file):
+    """Return the ``DocumentAnalysis`` for a stored file, parsing it only on a cache miss"""
+    from .models import DocumentAnalysis
+
+    digest = content_hash(field_file)
+    analysis = DocumentAnalysis.objects.filter(content_hash=digest).first()
+    if analysis is not None:
+        return analysis
+
+    kind = file_type(field_file.name)
+    page_count, error = None, ''
+    try:
+        with field_file.open('rb') as fh:
+            page_count = count_pages(fh, field_file.name)
+    except Exception as e:
+        # Corrupt or unsupported files are cached too so they aren't re-parsed
+        error = str(e)[:255] or e.__class__.__name__
+    analysis, _ = DocumentAnalysis.objects.get_or_create(
+        content_hash=digest,
+        defaults={'file_type': kind, 'page_count': page_count, 'error': error},
+    )
+    return analysis
+
+
+def analyze_uploaded_file(uploaded_file_id):
+    """Count the pages of a print upload and refresh its order's page total"""
+    from .models import PrintOrder, UploadedFile
+
+    uploaded = UploadedFile.objects.filter(pk=uploaded_file_id).first()
+    if uploaded is None or not uploaded.file:
+        return None
+    analysis = analyze(uploaded.file)
+    UploadedFile.objects.filter(pk=uploaded.pk).update(
+        content_hash=analysis.content_hash, page_count=analysis.page_count,
+    )
+    total = UploadedFile.objects.filter(order_id=uploaded.order_id).aggregate(total=Sum('page_count'))['total']
+    order = PrintOrder.objects.filter(pk=uploaded.order_id).first()
+    if order is not None and order.total_pages != total:
+        order.total_pages = total
+        # A regular save so price-dependent listeners (order summaries) see the change
+        order.save(update_fields=['total_pages', 'updated_at'])
+    return analysis
+
+
+def analyze_typing_order(order_id):
+    """Count the pages of a typing order's document"""
+    from typing_service.models import TypingOrder
+
+    order = TypingOrder.objects.filter(pk=order_id).first()
+    if order is None or not order.document_file:
+        return None
+    analysis = analyze(order.document_file)
+    TypingOrder.objects.filter(pk=order.pk).update(detected_page_count=analysis.page_count)
+    return analysis
+
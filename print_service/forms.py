@@ -1,8 +1,9 @@
 # ✅ forms.py (کامل، شامل فرم‌های قبلی + فرم جدید مدیریت)
 
 from django import forms
-from .models import PrintOrder, UploadedFile, Accessory, PackageDeal
+from .models import PrintOrder, UploadedFile, Accessory
 from .models import PaymentSettings
+from . import accessory_catalog
 
 class PrintOrderForm(forms.ModelForm):
     # Accessories selection fields
@@ -45,13 +46,7 @@ class PrintOrderForm(forms.ModelForm):
     
     def get_accessories_by_category(self):
         """Group accessories by category for template rendering"""
-        accessories = self.fields['accessories'].queryset
-        categories = {}
-        for accessory in accessories:
-            if accessory.category not in categories:
-                categories[accessory.category] = []
-            categories[accessory.category].append(accessory)
-        return categories
+        return accessory_catalog.by_category('print')
 
 class AccessorySelectionForm(forms.Form):
     """Form for selecting accessories with quantity and pricing"""
@@ -59,21 +54,8 @@ class AccessorySelectionForm(forms.Form):
     def __init__(self, service_type='print', *args, **kwargs):
         super().__init__(*args, **kwargs)
         
-        # Get accessories for the service type
-        accessories = Accessory.objects.filter(
-            service_type__in=[service_type, 'both'], 
-            is_active=True
-        ).order_by('category', 'sort_order')
-        
-        # Group accessories by category
-        categories = {}
-        for accessory in accessories:
-            if accessory.category not in categories:
-                categories[accessory.category] = []
-            categories[accessory.category].append(accessory)
-        
         # Create form fields for each accessory
-        for category, category_accessories in categories.items():
+        for category, category_accessories in accessory_catalog.by_category(service_type).items():
             for accessory in category_accessories:
                 field_name = f'accessory_{accessory.id}'
                 quantity_field_name = f'quantity_{accessory.id}'
@@ -111,13 +93,7 @@ class PackageDealForm(forms.Form):
     def __init__(self, service_type='print', *args, **kwargs):
         super().__init__(*args, **kwargs)
         
-        # Get package deals for the service type
-        package_deals = PackageDeal.objects.filter(
-            service_type__in=[service_type, 'both'], 
-            is_active=True
-        )
-        
-        for deal in package_deals:
+        for deal in accessory_catalog.package_deals(service_type):
             field_name = f'package_{deal.id}'
             self.fields[field_name] = forms.BooleanField(
                 required=False,
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from print_service import documents
+from print_service.models import UploadedFile
+from typing_service.models import TypingOrder
+
+
+class Command(BaseCommand):
+    help = 'Count pages of print uploads and typing documents that have not been analyzed yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-check every file, not only unanalyzed ones')
+
+    def handle(self, *args, **options):
+        uploads = UploadedFile.objects.exclude(file='').order_by('id')
+        typing_orders = TypingOrder.objects.exclude(document_file='').exclude(document_file__isnull=True).order_by('id')
+        if not options['all']:
+            uploads = uploads.filter(page_count__isnull=True)
+            typing_orders = typing_orders.filter(detected_page_count__isnull=True)
+
+        # Results are cached by content hash, so repeated documents are parsed once
+        counted = failed = 0
+        for task, ids in (
+            (documents.analyze_uploaded_file, uploads.values_list('id', flat=True)),
+            (documents.analyze_typing_order, typing_orders.values_list('id', flat=True)),
+        ):
+            for pk in ids.iterator():
+                try:
+                    analysis = task(pk)
+                except OSError as e:
+                    self.stdout.write(self.style.WARNING(f'  {task.__name__}({pk}): {e}'))
+                    failed += 1
+                    continue
+                if analysis is not None and analysis.page_count is not None:
+                    counted += 1
+                else:
+                    failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Counted pages for {counted} files ({failed} could not be counted)'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from print_service import staging
+
+
+class Command(BaseCommand):
+    help = 'Delete staged order uploads that were never attached to an order'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int, default=None,
+            help='Age in seconds after which a staged upload is removed (default: UPLOAD_STAGING_MAX_AGE)',
+        )
+
+    def handle(self, *args, **options):
+        removed = staging.cleanup(options['max_age'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} staged uploads'))
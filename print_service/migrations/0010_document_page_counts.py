@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('print_service', '0009_alter_paymentsettings_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('file_type', models.CharField(blank=True, max_length=10)),
+                ('page_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('analyzed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Document Analysis',
+                'verbose_name_plural': 'Document Analyses',
+            },
+        ),
+        migrations.AddField(
+            model_name='printorder',
+            name='total_pages',
+            field=models.PositiveIntegerField(blank=True, help_text='Pages detected in the uploaded files', null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('print_service', '0010_document_page_counts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='printorder',
+            index=models.Index(fields=['email', '-created_at'], name='print_order_email_created'),
+        ),
+        migrations.AddIndex(
+            model_name='printorder',
+            index=models.Index(fields=['payment_status', '-created_at'], name='print_order_payment_created'),
+        ),
+        migrations.AddIndex(
+            model_name='printorder',
+            index=models.Index(condition=models.Q(('payment_slip__isnull', False), models.Q(('payment_slip', ''), _negated=True)), fields=['-created_at'], name='print_order_slip_created'),
+        ),
+    ]
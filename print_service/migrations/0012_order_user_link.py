@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('print_service', '0011_order_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='printorder',
+            name='print_order_email_created',
+        ),
+        migrations.AddField(
+            model_name='printorder',
+            name='email_normalized',
+            field=models.CharField(blank=True, default='', editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='printorder',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='print_orders', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='printorder',
+            index=models.Index(fields=['user', '-created_at'], name='print_order_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='printorder',
+            index=models.Index(fields=['email_normalized', '-created_at'], name='print_order_email_created'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('print_service', '0012_order_user_link'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accessory',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
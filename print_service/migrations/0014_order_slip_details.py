@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('print_service', '0013_accessory_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='printorder',
+            name='slip_details',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
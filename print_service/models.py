@@ -1,5 +1,9 @@
+from django.conf import settings
 from django.db import models
 
+from core import customers, images
+from core.singletons import CachedSingletonMixin
+
 # Create your models here.
 
 class PrintOrder(models.Model):
@@ -7,6 +11,12 @@ class PrintOrder(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField(blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name='print_orders'
+    )
+    # Lower-cased copy of ``email`` for indexed guest lookups; set on save
+    email_normalized = models.CharField(max_length=254, blank=True, default='', editable=False)
+    EMAIL_FIELD = 'email'
 
     # Print options
     COLOR_CHOICES = [
@@ -29,6 +39,7 @@ class PrintOrder(models.Model):
     ]
     paper_size = models.CharField(max_length=10, choices=PAPER_SIZE_CHOICES)
     num_copies = models.PositiveIntegerField(default=1)
+    total_pages = models.PositiveIntegerField(blank=True, null=True, help_text="Pages detected in the uploaded files")
 
     # Order status
     STATUS_CHOICES = [
@@ -66,15 +77,39 @@ class PrintOrder(models.Model):
         ('rejected', 'Rejected'),
     ]
     payment_slip = models.ImageField(upload_to='payment_slips/', blank=True, null=True)
+    # Size and thumbnail of the normalized slip (see core/images.py)
+    slip_details = models.JSONField(default=dict, blank=True, editable=False)
+    SLIP_FIELD = 'payment_slip'
     payment_status = models.CharField(max_length=10, choices=PAYMENT_STATUS_CHOICES, default='pending')
     payment_note = models.TextField(blank=True, null=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # "My orders" by user or email and the dashboard queue, newest first
+            models.Index(fields=['user', '-created_at'], name='print_order_user_created'),
+            models.Index(fields=['email_normalized', '-created_at'], name='print_order_email_created'),
+            models.Index(fields=['payment_status', '-created_at'], name='print_order_payment_created'),
+            # Partial, so counting the dashboard queue never reads orders without a slip
+            models.Index(
+                fields=['-created_at'], name='print_order_slip_created',
+                condition=models.Q(payment_slip__isnull=False) & ~models.Q(payment_slip=''),
+            ),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} - {self.name} ({self.status})"
-    
+
+    def save(self, *args, **kwargs):
+        customers.prepare_order(self, kwargs)
+        super().save(*args, **kwargs)
+
+    @property
+    def slip_thumbnail_url(self):
+        return images.slip_thumbnail_url(self)
+
     def get_total_price(self):
         """Get total price including accessories"""
         base_price = self.calculate_base_price()
@@ -84,7 +119,7 @@ class PrintOrder(models.Model):
     def calculate_base_price(self):
         """Calculate base price based on print settings"""
         try:
-            settings = PrintPriceSettings.objects.first()
+            settings = PrintPriceSettings.load()
             if not settings:
                 return 50000  # Default price
             
@@ -98,8 +133,8 @@ class PrintOrder(models.Model):
             if self.side_type == 'double':
                 base_price = int(base_price * settings.double_sided_discount)
             
-            # Multiply by number of copies
-            return base_price * self.num_copies
+            # Multiply by pages (once detected from the uploaded files) and copies
+            return base_price * (self.total_pages or 1) * self.num_copies
             
         except Exception:
             return 50000  # Fallback price
@@ -124,13 +159,31 @@ class UploadedFile(models.Model):
     order = models.ForeignKey(PrintOrder, related_name='files', on_delete=models.CASCADE)
     file = models.FileField(upload_to='print_uploads/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    page_count = models.PositiveIntegerField(blank=True, null=True)
 
     def __str__(self):
         return f"File for Order #{self.order.id}: {self.file.name}"
 
 
 
-class PaymentSettings(models.Model):
+class DocumentAnalysis(models.Model):
+    """Page count of a document, cached by the SHA-256 of its content"""
+    content_hash = models.CharField(max_length=64, unique=True)
+    file_type = models.CharField(max_length=10, blank=True)
+    page_count = models.PositiveIntegerField(blank=True, null=True)
+    error = models.CharField(max_length=255, blank=True)
+    analyzed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Document Analysis"
+        verbose_name_plural = "Document Analyses"
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.file_type}): {self.page_count} pages"
+
+
+class PaymentSettings(CachedSingletonMixin, models.Model):
     bank_name = models.CharField(max_length=100, verbose_name="نام بانک")
     account_number = models.CharField(max_length=30, verbose_name="شماره حساب")
     card_number = models.CharField(max_length=30, verbose_name="شماره کارت")
@@ -150,7 +203,7 @@ class PaymentSettings(models.Model):
         verbose_name_plural = "تنظیمات پرداخت"
 
 
-class PrintPriceSettings(models.Model):
+class PrintPriceSettings(CachedSingletonMixin, models.Model):
     """Pricing settings for print services"""
     base_price_per_page = models.PositiveIntegerField(
         default=50000,
@@ -198,6 +251,7 @@ class Accessory(models.Model):
     description = models.TextField()
     base_price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to='accessories/', blank=True, null=True, help_text="تصویر لوازم جانبی")
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
     category = models.CharField(max_length=50, choices=[
         ('binding', 'گزینه‌های صحافی'),
         ('finishing', 'گزینه‌های تکمیل'),
@@ -216,6 +270,8 @@ class Accessory(models.Model):
     icon = models.CharField(max_length=50, default='fas fa-tag')
     sort_order = models.PositiveIntegerField(default=0)
     color = models.CharField(max_length=7, default='#007bff', help_text="رنگ نمایش (کد هگز)")
+
+    RENDITION_SOURCE_FIELD = 'image'
     
     class Meta:
         ordering = ['category', 'sort_order', 'name']
@@ -0,0 +1,62 @@
+"""Accessory lines of print and typing orders.
+
+The order forms and the typing order API send the chosen accessories as a
+list of ``{"id": ..., "quantity": ...}`` objects. ``add_accessories`` turns
+that list into ``PrintOrderAccessory``/``TypingOrderAccessory`` rows with
+two queries however many accessories were picked: one ``in_bulk`` lookup
+restricted to the active accessories offered with the service, and one
+``bulk_create``. Unknown, inactive or other-service accessories and
+malformed entries are skipped, repeated ids are merged, and each line is
+priced from the accessory's current ``base_price``.
+
+``bulk_create`` sends no ``post_save``, so ``lines_created`` is sent once
+per order instead (the customer order summaries listen to it).
+"""
+from django.dispatch import Signal
+
+from .models import Accessory
+
+# Sent with sender=<line model>, order=<order>, lines=<created lines>
+lines_created = Signal()
+
+
+def parse(items):
+    """``{accessory_id: quantity}`` from the submitted list, skipping malformed entries"""
+    quantities = {}
+    if not isinstance(items, list):
+        return quantities
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            accessory_id = int(item.get('id'))
+            quantity = int(item.get('quantity', 1))
+        except (TypeError, ValueError):
+            continue
+        if quantity > 0:
+            quantities[accessory_id] = quantities.get(accessory_id, 0) + quantity
+    return quantities
+
+
+def add_accessories(order, items, service_type):
+    """Create ``order``'s accessory lines for the submitted ``items`` and return them"""
+    quantities = parse(items)
+    if not quantities:
+        return []
+    accessories = Accessory.objects.filter(
+        is_active=True, service_type__in=[service_type, 'both'],
+    ).in_bulk(list(quantities))
+    line_model = order.accessories.model
+    lines = line_model.objects.bulk_create([
+        line_model(
+            order=order,
+            accessory=accessories[accessory_id],
+            quantity=quantity,
+            price=accessories[accessory_id].base_price * quantity,
+        )
+        for accessory_id, quantity in quantities.items()
+        if accessory_id in accessories
+    ])
+    if lines:
+        lines_created.send(sender=line_model, order=order, lines=lines)
+    return lines
@@ -0,0 +1,42 @@
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from core import images, response_cache
+from jobs import queue as jobs
+
+from . import documents
+from .models import Accessory, PackageDeal, PrintOrder, PrintPriceSettings, UploadedFile
+
+# Versions for the ETags of the accessory and pricing APIs and the accessory catalog
+response_cache.track(Accessory, PackageDeal, PrintPriceSettings)
+
+
+@receiver(post_save, sender=UploadedFile)
+def uploaded_file_saved(sender, instance, created, raw=False, **kwargs):
+    """Count the pages of new uploads in the background"""
+    if raw or not instance.file:
+        return
+    if created or not instance.content_hash:
+        jobs.enqueue(documents.analyze_uploaded_file, instance.pk)
+
+
+@receiver(post_save, sender=Accessory)
+def accessory_saved(sender, instance, raw=False, **kwargs):
+    """Build resized renditions of new or replaced accessory images in the background"""
+    if raw:
+        return
+    images.schedule(instance)
+
+
+@receiver(m2m_changed, sender=PackageDeal.accessories.through)
+def package_deal_accessories_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        response_cache.touch(PackageDeal)
+
+
+@receiver(post_save, sender=PrintOrder)
+def print_slip_saved(sender, instance, raw=False, **kwargs):
+    """Strip, downsize and thumbnail a newly uploaded payment slip in the background"""
+    if raw:
+        return
+    images.schedule_slip(instance)
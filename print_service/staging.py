@@ -0,0 +1,342 @@
+"""Disk staging area for print and typing order uploads.
+
+Uploaded files are written in chunks to ``UPLOAD_STAGING_ROOT/<token>/`` and
+only the upload token is kept in the session, so file bytes are never
+pickled into the session store. When the order is confirmed the staged file
+is streamed into storage as an ``UploadedFile`` (or a typing order's
+``document_file``) inside the transaction that creates the order.
+
+Files arrive either as a regular multipart upload (``stage_file``) or as a
+resumable upload: ``create`` declares the total size, ``append_chunk`` writes
+each chunk at its offset after verifying its checksum, and ``finalize``
+marks the file complete once every byte has arrived.
+
+Each staging directory holds:
+- ``data``: the file content
+- ``meta.json``: original name, content type, size, offset and owner
+
+The owner is a random id kept in the session data rather than the session
+key, which Django rotates on login, so files a guest staged before signing
+in still belong to them afterwards.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import time
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.db import transaction
+
+SESSION_KEY = 'order_file_tokens'
+OWNER_SESSION_KEY = 'upload_owner'
+DATA_NAME = 'data'
+META_NAME = 'meta.json'
+
+ALLOWED_EXTENSIONS = ['.pdf', '.jpg', '.jpeg', '.png', '.doc', '.docx']
+CHECKSUM_ALGORITHMS = ('sha256', 'sha1', 'md5')
+LOCK_TIMEOUT = 60  # seconds after which a chunk lock left by a dead worker is broken
+READ_SIZE = 64 * 1024
+
+_TOKEN_RE = re.compile(r'^[A-Za-z0-9_-]{20,64}$')
+
+
+class StagingError(Exception):
+    """Raised for unknown, expired or foreign upload tokens"""
+
+
+class UploadConflict(StagingError):
+    """Raised when a chunk does not start at the current offset, or another chunk is in flight"""
+
+
+class ChecksumMismatch(StagingError):
+    """Raised when a chunk or a finished file does not match its declared checksum"""
+
+
+class UploadTooLarge(StagingError):
+    """Raised when an upload or a chunk exceeds the configured limits"""
+
+
+def max_upload_size():
+    return getattr(settings, 'UPLOAD_MAX_SIZE', 200 * 1024 * 1024)
+
+
+def max_chunk_size():
+    return getattr(settings, 'UPLOAD_CHUNK_MAX_SIZE', 8 * 1024 * 1024)
+
+
+def staging_root():
+    return str(getattr(settings, 'UPLOAD_STAGING_ROOT', os.path.join(settings.BASE_DIR, 'upload_staging')))
+
+
+def _token_dir(token):
+    if not token or not _TOKEN_RE.match(token):
+        raise StagingError('Invalid upload token')
+    return os.path.join(staging_root(), token)
+
+
+def new_token():
+    return secrets.token_urlsafe(24)
+
+
+def create(original_name, content_type='', owner=None, size=None, checksum=None, **extra):
+    """Create an empty staging entry and return its token.
+
+    ``size`` is the declared total length of a resumable upload and
+    ``checksum`` an optional ``"<algorithm> <base64 digest>"`` of the whole file.
+    """
+    name = os.path.basename(original_name or 'upload')
+    if os.path.splitext(name)[1].lower() not in ALLOWED_EXTENSIONS:
+        raise StagingError('Unsupported file format')
+    if size is not None and not 0 < size <= max_upload_size():
+        raise UploadTooLarge('Upload size is out of range')
+    if checksum:
+        parse_checksum(checksum)
+    token = new_token()
+    directory = _token_dir(token)
+    os.makedirs(directory, mode=0o700)
+    open(os.path.join(directory, DATA_NAME), 'wb').close()
+    write_meta(token, {
+        'name': name,
+        'content_type': content_type or '',
+        'size': size,
+        'offset': 0,
+        'checksum': checksum or '',
+        'complete': False,
+        'owner': owner,
+        'created': time.time(),
+        **extra,
+    })
+    return token
+
+
+def stage_file(uploaded_file, owner=None, **extra):
+    """Stage a Django ``UploadedFile`` on disk without reading it into memory"""
+    token = create(uploaded_file.name, getattr(uploaded_file, 'content_type', ''), owner=owner, **extra)
+    path = data_path(token)
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        # Large uploads are already on disk; move rather than copy them
+        file_move_safe(uploaded_file.temporary_file_path(), path, allow_overwrite=True)
+    else:
+        with open(path, 'wb') as destination:
+            for chunk in uploaded_file.chunks():
+                destination.write(chunk)
+    meta = read_meta(token)
+    meta['size'] = meta['offset'] = os.path.getsize(path)
+    meta['complete'] = True
+    write_meta(token, meta)
+    return token
+
+
+def parse_checksum(value):
+    """Parse a tus-style ``"<algorithm> <base64 digest>"`` checksum header"""
+    try:
+        algorithm, digest = value.strip().split(' ', 1)
+        digest = base64.b64decode(digest.strip(), validate=True)
+    except (ValueError, TypeError):
+        raise StagingError('Malformed checksum')
+    algorithm = algorithm.lower()
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise StagingError(f'Unsupported checksum algorithm {algorithm}')
+    return algorithm, digest
+
+
+def _lock(token):
+    """Take the per-upload chunk lock so two chunks never write at once"""
+    path = os.path.join(_token_dir(token), 'lock')
+    try:
+        if time.time() - os.path.getmtime(path) > LOCK_TIMEOUT:
+            os.unlink(path)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        raise UploadConflict('Another chunk is being written')
+    return path
+
+
+def append_chunk(token, offset, stream, length, checksum=None, owner=None):
+    """Write ``length`` bytes from ``stream`` at ``offset`` and return the new offset.
+
+    The chunk is streamed to disk in small reads; the upload's offset only
+    advances once the whole chunk has arrived and matched ``checksum``, so a
+    dropped connection or corrupted chunk is simply retried from the same
+    offset.
+    """
+    meta = read_meta(token, owner=owner)
+    if meta['complete']:
+        raise UploadConflict('Upload is already complete')
+    if length > max_chunk_size() or offset + length > meta['size']:
+        raise UploadTooLarge('Chunk is too large')
+    expected = parse_checksum(checksum) if checksum else None
+    lock_path = _lock(token)
+    try:
+        meta = read_meta(token, owner=owner)
+        if offset != meta['offset']:
+            raise UploadConflict('Chunk offset does not match upload offset')
+        digest = hashlib.new(expected[0]) if expected else None
+        received = 0
+        with open(data_path(token), 'r+b') as fh:
+            fh.seek(offset)
+            while received < length:
+                data = stream.read(min(READ_SIZE, length - received))
+                if not data:
+                    break
+                fh.write(data)
+                received += len(data)
+                if digest:
+                    digest.update(data)
+            if received != length or (digest and digest.digest() != expected[1]):
+                # Drop the partial or corrupted chunk; the client resends from ``offset``
+                fh.truncate(offset)
+                if received != length:
+                    raise StagingError('Chunk was cut short')
+                raise ChecksumMismatch('Chunk checksum does not match')
+            fh.truncate(offset + length)
+            fh.flush()
+            os.fsync(fh.fileno())
+        meta['offset'] = offset + length
+        write_meta(token, meta)
+        return meta['offset']
+    finally:
+        os.unlink(lock_path)
+
+
+def finalize(token, owner=None):
+    """Mark a fully received upload complete, verifying the whole-file checksum"""
+    meta = read_meta(token, owner=owner)
+    if meta['complete']:
+        return meta
+    if meta['offset'] != meta['size']:
+        raise UploadConflict('Upload is not finished yet')
+    if meta['checksum']:
+        algorithm, expected = parse_checksum(meta['checksum'])
+        digest = hashlib.new(algorithm)
+        with open(data_path(token), 'rb') as fh:
+            for data in iter(lambda: fh.read(READ_SIZE), b''):
+                digest.update(data)
+        if digest.digest() != expected:
+            raise ChecksumMismatch('File checksum does not match')
+    meta['complete'] = True
+    write_meta(token, meta)
+    return meta
+
+
+def data_path(token):
+    return os.path.join(_token_dir(token), DATA_NAME)
+
+
+def read_meta(token, owner=None):
+    """Return a staged file's metadata, checking it belongs to ``owner`` if given"""
+    try:
+        with open(os.path.join(_token_dir(token), META_NAME)) as fh:
+            meta = json.load(fh)
+    except (OSError, ValueError):
+        raise StagingError('Unknown or expired upload token')
+    if owner is not None and meta.get('owner') != owner:
+        raise StagingError('Upload token belongs to another session')
+    return meta
+
+
+def write_meta(token, meta):
+    path = os.path.join(_token_dir(token), META_NAME)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump(meta, fh)
+    os.replace(tmp_path, path)
+
+
+def read_complete(token, owner=None):
+    """Return the metadata of a finished upload, raising if it is still in progress"""
+    meta = read_meta(token, owner=owner)
+    if not meta.get('complete'):
+        raise StagingError('Upload is not finished yet')
+    return meta
+
+
+def save_to(token, field_file, owner=None):
+    """Stream a staged file into ``field_file``'s storage and discard it once the transaction commits"""
+    meta = read_complete(token, owner=owner)
+    with open(data_path(token), 'rb') as fh:
+        field_file.save(meta['name'], File(fh, name=meta['name']), save=False)
+    # Kept if the order is rolled back, so the customer can submit it again
+    transaction.on_commit(lambda: discard(token))
+    return field_file
+
+
+def attach_to_order(order, tokens, owner=None):
+    """Stream staged files into a print order's ``UploadedFile`` rows; call it in the order's transaction"""
+    from .models import UploadedFile
+    for token in tokens:
+        uploaded_file = UploadedFile(order=order)
+        save_to(token, uploaded_file.file, owner=owner)
+        uploaded_file.save()
+
+
+def discard(token):
+    try:
+        shutil.rmtree(_token_dir(token))
+    except (OSError, StagingError):
+        pass
+
+
+def cleanup(max_age=None):
+    """Remove staging entries older than ``max_age`` seconds, returning the count"""
+    if max_age is None:
+        max_age = getattr(settings, 'UPLOAD_STAGING_MAX_AGE', 24 * 60 * 60)
+    root = staging_root()
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for token in os.listdir(root):
+        directory = os.path.join(root, token)
+        try:
+            if os.path.getmtime(directory) < cutoff:
+                shutil.rmtree(directory)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+# Session helpers
+
+def session_owner(request):
+    """The id owning the session's staged files; unlike the session key it survives login"""
+    owner = request.session.get(OWNER_SESSION_KEY)
+    if owner is None:
+        owner = request.session[OWNER_SESSION_KEY] = new_token()
+    return owner
+
+
+def add_to_session(request, tokens):
+    current = request.session.get(SESSION_KEY, [])
+    request.session[SESSION_KEY] = current + [token for token in tokens if token not in current]
+
+
+def session_files(request):
+    """Return (token, meta) pairs for the session's staged files, dropping stale tokens"""
+    owner = session_owner(request)
+    files = []
+    for token in request.session.get(SESSION_KEY, []):
+        try:
+            files.append((token, read_complete(token, owner=owner)))
+        except StagingError:
+            continue
+    if len(files) != len(request.session.get(SESSION_KEY, [])):
+        request.session[SESSION_KEY] = [token for token, _ in files]
+    return files
+
+
+def clear_session(request, discard_files=True):
+    tokens = request.session.pop(SESSION_KEY, [])
+    if discard_files:
+        for token in tokens:
+            discard(token)
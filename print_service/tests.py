@@ -1,3 +1,334 @@
-from django.test import TestCase
+import base64
+import hashlib
+import io
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from accounts.models import UserOrderSummary
+from typing_service.models import TypingOrder
+from . import accessory_catalog, documents, order_lines, staging
+from .forms import AccessorySelectionForm, PackageDealForm
+from .models import Accessory, DocumentAnalysis, PackageDeal, PrintOrder, PrintPriceSettings, UploadedFile
+
+ORDER_DATA = {
+    'name': 'Customer', 'email': 'customer@example.com', 'color_mode': 'bw', 'side_type': 'single',
+    'paper_size': 'A4', 'num_copies': 1, 'delivery_method': 'pickup', 'payment_method': 'cod',
+}
+
+
+class StagingTestCase(TestCase):
+    """Runs with throwaway staging and media directories and a logged-in customer"""
+
+    def setUp(self):
+        self.staging_root = tempfile.mkdtemp()
+        self.media_root = tempfile.mkdtemp()
+        overrides = override_settings(UPLOAD_STAGING_ROOT=self.staging_root, MEDIA_ROOT=self.media_root,
+                                      JOB_QUEUE_ASYNC=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(shutil.rmtree, self.staging_root, True)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        self.client.force_login(User.objects.create(username='customer', email='customer@example.com'))
+
+
+class StagedUploadTests(StagingTestCase):
+    """Order files are staged on disk and only their tokens live in the session"""
+
+    def stage(self, name, content):
+        response = self.client.post(reverse('print_service:stage_upload'), {
+            'files': SimpleUploadedFile(name, content, content_type='application/pdf'),
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.json()['files']
+
+    def test_summary_moves_staged_files_into_order(self):
+        files = self.stage('doc.pdf', b'%PDF-1.4 first')
+        self.assertEqual(files[0]['name'], 'doc.pdf')
+        self.assertEqual(files[0]['size'], len(b'%PDF-1.4 first'))
+
+        session = self.client.session
+        session['order_data'] = ORDER_DATA
+        session.save()
+        self.assertEqual(session[staging.SESSION_KEY], [files[0]['token']])
+
+        response = self.client.get(reverse('print_service:order_summary'))
+        self.assertEqual(response.context['file_names'], ['doc.pdf'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('print_service:order_summary'))
+        order = PrintOrder.objects.get()
+        self.assertRedirects(response, reverse('print_service:order_detail', args=[order.id]), fetch_redirect_response=False)
+        uploaded = order.files.get()
+        with uploaded.file.open('rb') as fh:
+            self.assertEqual(fh.read(), b'%PDF-1.4 first')
+        with self.assertRaises(staging.StagingError):
+            staging.read_meta(files[0]['token'])
+        self.assertNotIn(staging.SESSION_KEY, self.client.session)
+
+    def test_guest_uploads_survive_login(self):
+        self.client.logout()
+        token = self.stage('doc.pdf', b'data')[0]['token']
+        self.client.force_login(User.objects.get(username='customer'))
+        files = self.client.get(reverse('print_service:stage_upload')).json()['files']
+        self.assertEqual([f['token'] for f in files], [token])
+
+    def test_failed_order_keeps_the_staged_files(self):
+        token = self.stage('doc.pdf', b'data')[0]['token']
+        data = {**ORDER_DATA, 'upload_token': token}
+        with mock.patch.object(UploadedFile, 'save', side_effect=DatabaseError('disk full')):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse('print_service:order_create'), data)
+        self.assertFalse(PrintOrder.objects.exists())
+        self.assertEqual(staging.read_complete(token)['name'], 'doc.pdf')
+
+    def test_upload_endpoints_require_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(User.objects.get(username='customer'))
+        url = reverse('print_service:api_upload_create')
+        body = {'filename': 'scan.pdf', 'size': 10}
+        self.assertEqual(client.post(url, body, content_type='application/json').status_code, 403)
+        csrf_token = client.get(reverse('accounts:api_csrf')).json()['csrf_token']
+        response = client.post(url, body, content_type='application/json', headers={'X-CSRFToken': csrf_token})
+        self.assertEqual(response.status_code, 201)
+
+    def test_tokens_are_scoped_to_the_session(self):
+        token = self.stage('doc.pdf', b'data')[0]['token']
+        self.client.logout()
+        response = self.client.delete(reverse('print_service:stage_upload') + f'?token={token}')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(staging.read_meta(token)['name'], 'doc.pdf')
+        with self.assertRaises(staging.StagingError):
+            staging.read_meta('../../etc')
+
+
+def checksum(data):
+    return 'sha256 ' + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+class ResumableUploadTests(StagingTestCase):
+    """Chunked uploads resume from the server offset and verify every chunk"""
+    content = b'%PDF-1.4 ' + bytes(range(256)) * 40
+
+    def create_upload(self, **extra):
+        response = self.client.post(reverse('print_service:api_upload_create'), {
+            'filename': 'scan.pdf', 'size': len(self.content), 'checksum': checksum(self.content), **extra,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['token']
+
+    def patch(self, token, offset, chunk, digest=None):
+        return self.client.patch(
+            reverse('print_service:api_upload_detail', args=[token]), chunk,
+            content_type='application/offset+octet-stream',
+            headers={'Upload-Offset': str(offset), 'Upload-Checksum': digest or checksum(chunk)},
+        )
+
+    def offset(self, token):
+        response = self.client.head(reverse('print_service:api_upload_detail', args=[token]))
+        self.assertEqual(response.status_code, 200)
+        return int(response['Upload-Offset'])
+
+    def test_chunks_resume_and_finalize_into_print_order(self):
+        token = self.create_upload()
+        first, rest = self.content[:4000], self.content[4000:]
+        self.assertEqual(self.patch(token, 0, first).status_code, 204)
+
+        # A corrupted chunk is rejected and the offset does not move
+        response = self.patch(token, 4000, rest, digest=checksum(b'other'))
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(self.offset(token), 4000)
+        # A chunk at the wrong offset conflicts and reports the real one
+        response = self.patch(token, 0, first)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '4000')
+        # Finalizing early is refused
+        finalize_url = reverse('print_service:api_upload_finalize', args=[token])
+        self.assertEqual(self.client.post(finalize_url).status_code, 409)
+
+        self.assertEqual(self.patch(token, 4000, rest).status_code, 204)
+        self.assertEqual(self.offset(token), len(self.content))
+        self.assertTrue(self.client.post(finalize_url).json()['complete'])
+
+        self.client.post(reverse('print_service:order_create'), {
+            'name': 'Customer', 'color_mode': 'bw', 'side_type': 'single', 'paper_size': 'A4',
+            'num_copies': 1, 'delivery_method': 'pickup', 'payment_method': 'cod', 'upload_token': token,
+        })
+        uploaded = PrintOrder.objects.get().files.get()
+        with uploaded.file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.content)
+
+    def test_typing_order_accepts_upload_token(self):
+        token = self.create_upload(purpose='typing')
+        self.assertEqual(self.patch(token, 0, self.content).status_code, 204)
+        self.client.post(reverse('print_service:api_upload_finalize', args=[token]))
+        self.client.post(reverse('typing_service:order_create'), {
+            'user_name': 'Customer', 'user_phone': '09120000000', 'description': 'Type this', 'upload_token': token,
+        })
+        order = TypingOrder.objects.get()
+        with order.document_file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.content)
+
+    def test_rejects_oversized_and_unsupported_uploads(self):
+        url = reverse('print_service:api_upload_create')
+        with self.settings(UPLOAD_MAX_SIZE=10):
+            response = self.client.post(url, {'filename': 'a.pdf', 'size': 11}, content_type='application/json')
+        self.assertEqual(response.status_code, 413)
+        response = self.client.post(url, {'filename': 'a.exe', 'size': 5}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+def make_pdf(pages):
+    buffer = io.BytesIO()
+    images = [Image.new('RGB', (20, 20), 'white') for _ in range(pages)]
+    images[0].save(buffer, 'PDF', save_all=True, append_images=images[1:])
+    return buffer.getvalue()
+
+
+def make_docx(pages):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('docProps/app.xml', f'<Properties><Pages>{pages}</Pages></Properties>')
+    return buffer.getvalue()
+
+
+class DocumentAnalysisTests(StagingTestCase):
+    """Uploads are page-counted once per distinct content and priced by page"""
+
+    def create_order(self, *contents):
+        order = PrintOrder.objects.create(**ORDER_DATA)
+        for name, content in contents:
+            UploadedFile.objects.create(order=order, file=ContentFile(content, name=name))
+        order.refresh_from_db()
+        return order
+
+    def test_counts_pdf_docx_and_image_pages(self):
+        self.assertEqual(documents.count_pages(io.BytesIO(make_pdf(3)), 'a.pdf'), 3)
+        self.assertEqual(documents.count_pages(io.BytesIO(make_docx(7)), 'a.docx'), 7)
+        png = io.BytesIO()
+        Image.new('RGB', (5, 5)).save(png, 'PNG')
+        self.assertEqual(documents.count_pages(png, 'a.png'), 1)
+        with self.assertRaises(documents.UnsupportedDocument):
+            documents.count_pages(io.BytesIO(b'x'), 'a.doc')
+
+    def test_order_pages_feed_pricing_and_results_are_cached(self):
+        PrintPriceSettings.objects.create(base_price_per_page=1000)
+        pdf = make_pdf(2)
+        order = self.create_order(('one.pdf', pdf), ('two.docx', make_docx(3)))
+        self.assertEqual(order.total_pages, 5)
+        self.assertEqual(order.calculate_base_price(), 5 * 1000)
+
+        # The same content uploaded again reuses the cached analysis
+        again = self.create_order(('copy.pdf', pdf))
+        self.assertEqual(again.total_pages, 2)
+        self.assertEqual(DocumentAnalysis.objects.count(), 2)
+
+    def test_unreadable_files_leave_pages_unknown(self):
+        order = self.create_order(('broken.pdf', b'not a pdf'))
+        self.assertIsNone(order.total_pages)
+        self.assertTrue(DocumentAnalysis.objects.get().error)
+
+    def test_typing_document_is_counted(self):
+        order = TypingOrder.objects.create(
+            user_name='Customer', document_file=ContentFile(make_docx(4), name='doc.docx'), page_count=1,
+        )
+        order.refresh_from_db()
+        self.assertEqual(order.detected_page_count, 4)
+        self.assertEqual(order.quoted_page_count, 4)
+
+
+class AccessoryCatalogTests(TestCase):
+    """Accessories and package deals are grouped once and cached until either changes"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.binding = Accessory.objects.create(name='Spiral', description='', base_price=5000,
+                                                category='binding', service_type='both', sort_order=2)
+        self.cover = Accessory.objects.create(name='Cover', description='', base_price=2000,
+                                              category='binding', service_type='print', sort_order=1)
+        self.express = Accessory.objects.create(name='Express', description='', base_price=9000,
+                                                category='priority', service_type='typing')
+        Accessory.objects.create(name='Retired', description='', base_price=1, category='binding',
+                                 service_type='both', is_active=False)
+        self.deal = PackageDeal.objects.create(name='Thesis', discount_price=6000, original_price=7000,
+                                               description='', service_type='print')
+        self.deal.accessories.add(self.binding, self.cover)
+
+    def test_grouped_by_service_and_category(self):
+        self.assertEqual(accessory_catalog.by_category('print'), {'binding': [self.cover, self.binding]})
+        self.assertEqual(accessory_catalog.by_category('typing'),
+                         {'binding': [self.binding], 'priority': [self.express]})
+        self.assertEqual(accessory_catalog.package_deals('typing'), [])
+
+    def test_forms_read_the_cached_catalog(self):
+        accessory_catalog.get()
+        with self.assertNumQueries(0):
+            form = AccessorySelectionForm('print')
+            deals = PackageDealForm('print')
+            self.assertIn(f'accessory_{self.cover.id}', form.fields)
+            widget = deals.fields[f'package_{self.deal.id}'].widget
+            self.assertEqual(set(widget.attrs['data-accessories'].split(',')), {str(self.binding.id), str(self.cover.id)})
+
+    def test_changes_rebuild_the_catalog(self):
+        accessory_catalog.get()
+        self.cover.is_active = False
+        self.cover.save()
+        self.assertEqual(accessory_catalog.by_category('print'), {'binding': [self.binding]})
+        self.deal.accessories.remove(self.cover)
+        self.assertEqual(list(accessory_catalog.package_deals('print')[0].accessories.all()), [self.binding])
+
+
+class OrderLinesTests(TestCase):
+    """Accessory lines are resolved and inserted with a fixed number of queries"""
+
+    def setUp(self):
+        self.accessories = [
+            Accessory.objects.create(name=f'Option {i}', description='', base_price=1000 * (i + 1),
+                                     category='binding', service_type='both')
+            for i in range(5)
+        ]
+        self.typing_only = Accessory.objects.create(name='Express typing', description='', base_price=9000,
+                                                    category='priority', service_type='typing')
+        self.order = PrintOrder.objects.create(name='Customer', color_mode='bw', side_type='single',
+                                               paper_size='A4', delivery_method='pickup', payment_method='cod')
+
+    def test_lines_are_created_in_two_queries(self):
+        items = [{'id': accessory.id, 'quantity': 2} for accessory in self.accessories]
+        with self.assertNumQueries(2):
+            lines = order_lines.add_accessories(self.order, items, 'print')
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(
+            sorted(self.order.accessories.values_list('price', flat=True)),
+            [2000, 4000, 6000, 8000, 10000],
+        )
+
+    def test_invalid_entries_are_skipped_and_repeats_merged(self):
+        first = self.accessories[0]
+        first_inactive = self.accessories[1]
+        first_inactive.is_active = False
+        first_inactive.save()
+        items = [
+            {'id': first.id}, {'id': str(first.id), 'quantity': '2'}, {'id': first_inactive.id},
+            {'id': self.typing_only.id}, {'id': 'x'}, {'id': first.id, 'quantity': 0}, 'junk', {},
+        ]
+        lines = order_lines.add_accessories(self.order, items, 'print')
+        self.assertEqual([(line.accessory_id, line.quantity, line.price) for line in lines], [(first.id, 3, 3000)])
+
+    def test_customer_summary_is_refreshed(self):
+        user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.order.user = user
+        self.order.save()
+        spent = UserOrderSummary.objects.get(user=user).print_total_spent
+        order_lines.add_accessories(self.order, [{'id': self.accessories[0].id, 'quantity': 1}], 'print')
+        self.assertEqual(UserOrderSummary.objects.get(user=user).print_total_spent, spent + 1000)
@@ -10,6 +10,7 @@ urlpatterns = [
     path('orders/', views.order_list, name='order_list'),
     path('order/<int:order_id>/', views.order_detail, name='order_detail'),
     path('order/summary/', views.order_summary, name='order_summary'),
+    path('order/uploads/', views.stage_upload, name='stage_upload'),
     path('order/<int:order_id>/submitted/', views.order_submitted, name='order_submitted'),
     path('debug-orders/', views.order_debug_list, name='order_debug_list'),
     path('track-order/', views.unified_order_track, name='unified_order_track'),
@@ -42,4 +43,9 @@ urlpatterns = [
     # API endpoints for React frontend
     path('api/create/', views.api_create_order, name='api_create_order'),
     path('api/my-orders/', views.api_my_orders, name='api_my_orders'),
+
+    # Resumable chunked uploads (shared with typing_service)
+    path('api/uploads/', views.api_upload_create, name='api_upload_create'),
+    path('api/uploads/<str:token>/', views.api_upload_detail, name='api_upload_detail'),
+    path('api/uploads/<str:token>/finalize/', views.api_upload_finalize, name='api_upload_finalize'),
 ]
\ No newline at end of file
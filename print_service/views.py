@@ -1,13 +1,18 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.core.paginator import Paginator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import user_passes_test, login_required
 from django.utils import timezone
+from django.db import transaction
+from asgiref.sync import sync_to_async
 from .forms import PrintOrderForm, UploadedFileForm
 from .models import PrintOrder, UploadedFile
+from . import accessory_catalog, order_lines, staging
+from core import customers
+from core.response_cache import cached_response
 from django.urls import reverse
 import os
 import json
@@ -15,7 +20,7 @@ from django.contrib.admin.views.decorators import staff_member_required
 from typing_service.models import TypingOrder
 from .models import PaymentSettings
 from .forms import PaymentSettingsForm
-from .models import PrintPriceSettings
+from .models import Accessory, PrintPriceSettings
 
 # -------------------------
 # سفارش جدید و آپلود فایل
@@ -25,57 +30,52 @@ def order_create(request):
     if request.method == 'POST':
         order_form = PrintOrderForm(request.POST)
         file_form = UploadedFileForm(request.POST, request.FILES)
-        if order_form.is_valid() and file_form.is_valid():
-            order = order_form.save(commit=False)
-            # Set email from authenticated user
-            if request.user.is_authenticated:
-                order.email = request.user.email
-            order.save()
-            
-            uploaded_file = file_form.save(commit=False)
-            uploaded_file.order = order
-            uploaded_file.save()
-            
-            # Handle selected accessories
-            import json
-            selected_accessories = request.POST.get('selected_accessories')
-            if selected_accessories:
-                try:
-                    accessories_data = json.loads(selected_accessories)
-                    from .models import Accessory, PrintOrderAccessory
-                    for acc_data in accessories_data:
-                        accessory_id = acc_data.get('id')
-                        quantity = acc_data.get('quantity', 1)
-                        try:
-                            accessory = Accessory.objects.get(id=accessory_id)
-                            PrintOrderAccessory.objects.create(
-                                order=order,
-                                accessory=accessory,
-                                quantity=quantity,
-                                price=accessory.base_price * quantity
-                            )
-                        except Accessory.DoesNotExist:
-                            continue
-                except (json.JSONDecodeError, ValueError):
-                    pass
+        # Files sent through the resumable upload API arrive as tokens instead of multipart data
+        upload_tokens = request.POST.getlist('upload_token')
+        owner = staging.session_owner(request)
+        tokens_valid = True
+        for token in upload_tokens:
+            try:
+                staging.read_complete(token, owner=owner)
+            except staging.StagingError:
+                tokens_valid = False
+                file_form.add_error(None, 'فایل آپلود شده یافت نشد یا هنوز کامل نشده است')
+                break
+        files_valid = tokens_valid if upload_tokens else file_form.is_valid()
+        if order_form.is_valid() and files_valid:
+            # The order is only created together with its files
+            with transaction.atomic():
+                order = order_form.save(commit=False)
+                # Set email from authenticated user
+                if request.user.is_authenticated:
+                    order.email = request.user.email
+                order.save()
+
+                if upload_tokens:
+                    staging.attach_to_order(order, upload_tokens, owner=owner)
+                else:
+                    uploaded_file = file_form.save(commit=False)
+                    uploaded_file.order = order
+                    uploaded_file.save()
+
+                # Handle selected accessories
+                selected_accessories = request.POST.get('selected_accessories')
+                if selected_accessories:
+                    try:
+                        order_lines.add_accessories(order, json.loads(selected_accessories), 'print')
+                    except ValueError:
+                        pass
             
             return redirect('print_service:order_submitted', order_id=order.id)
     else:
         order_form = PrintOrderForm()
         file_form = UploadedFileForm()
     
-    # Get accessories grouped by category
-    from .models import Accessory, PrintPriceSettings
-    accessories = Accessory.objects.filter(is_active=True, service_type__in=['print', 'both'])
-    accessories_by_category = {}
-    for accessory in accessories:
-        if accessory.category not in accessories_by_category:
-            accessories_by_category[accessory.category] = []
-        accessories_by_category[accessory.category].append(accessory)
+    accessories_by_category = accessory_catalog.by_category('print')
     
     # Get base price from settings
     try:
-        price_settings = PrintPriceSettings.objects.first()
+        price_settings = PrintPriceSettings.load()
         base_price = price_settings.base_price_per_page if price_settings else 50000
     except:
         base_price = 50000
@@ -93,35 +93,176 @@ def order_submitted(request, order_id):
 
 def order_summary(request):
     order_data = request.session.get('order_data')
-    file_names = request.session.get('order_files', [])
     if not order_data:
         return redirect('print_service:order_create')
+    # The session holds only upload tokens; the files themselves are staged on disk
+    staged_files = staging.session_files(request)
     if request.method == 'POST':
-        # Save order and files to DB
-        order = PrintOrder.objects.create(**order_data)
-        files_data = request.session.get('order_files_data', [])
-        content_types = request.session.get('order_files_content_type', [])
-        original_names = request.session.get('order_files_original_names', [])
-        for idx, file_content in enumerate(files_data):
-            from django.core.files.base import ContentFile
-            UploadedFile.objects.create(
-                order=order,
-                file=ContentFile(file_content, name=original_names[idx])
-            )
-        # Clean up session
-        for key in ['order_data', 'order_files', 'order_files_data', 'order_files_content_type', 'order_files_original_names']:
-            if key in request.session:
-                del request.session[key]
+        owner = staging.session_owner(request)
+        # The order is only created together with its files
+        try:
+            with transaction.atomic():
+                order = PrintOrder(**order_data)
+                if request.user.is_authenticated:
+                    order.user = request.user
+                order.save()
+                staging.attach_to_order(order, [token for token, meta in staged_files], owner=owner)
+        except staging.StagingError:
+            messages.error(request, 'An uploaded file has expired; please upload it again.')
+            return redirect('print_service:order_summary')
+        # Clean up session; the staged files were discarded on commit
+        request.session.pop('order_data', None)
+        staging.clear_session(request, discard_files=False)
         messages.success(request, f'Order #{order.id} created successfully!')
         if order.payment_method == 'online':
-            return redirect('print_service:payment_slip_upload', order_id=order.id)
+            return redirect('print_service:payment_page', order_id=order.id)
         else:
             return redirect('print_service:order_detail', order_id=order.id)
     return render(request, 'print_service/order_summary.html', {
         'order_data': order_data,
-        'file_names': file_names,
+        'file_names': [meta['name'] for token, meta in staged_files],
+    })
+
+@require_http_methods(["GET", "POST", "DELETE"])
+def stage_upload(request):
+    """Stage order files on disk and remember their tokens in the session.
+
+    POST streams ``files`` to the staging area, GET lists the staged files and
+    DELETE with ``?token=`` drops one of them.
+    """
+    owner = staging.session_owner(request)
+    if request.method == 'POST':
+        uploads = request.FILES.getlist('files')
+        if not uploads:
+            return JsonResponse({'success': False, 'message': 'فایلی ارسال نشده است'}, status=400)
+        try:
+            tokens = [staging.stage_file(upload, owner=owner) for upload in uploads]
+        except staging.StagingError:
+            return JsonResponse({'success': False, 'message': 'فرمت فایل پشتیبانی نمی‌شود'}, status=400)
+        staging.add_to_session(request, tokens)
+    elif request.method == 'DELETE':
+        token = request.GET.get('token', '')
+        try:
+            staging.read_meta(token, owner=owner)
+        except staging.StagingError:
+            return JsonResponse({'success': False, 'message': 'فایل یافت نشد'}, status=404)
+        staging.discard(token)
+        request.session[staging.SESSION_KEY] = [
+            t for t in request.session.get(staging.SESSION_KEY, []) if t != token
+        ]
+    return JsonResponse({
+        'success': True,
+        'files': [
+            {'token': token, 'name': meta['name'], 'size': meta['size']}
+            for token, meta in staging.session_files(request)
+        ],
     })
 
+# -------------------------
+# آپلود چند‌تکه و قابل ادامه (برای سرویس چاپ و تایپ)
+# -------------------------
+UPLOAD_CHECKSUM_MISMATCH = 460  # tus "Checksum Mismatch"
+
+def _upload_status(token, meta):
+    return {
+        'success': True,
+        'token': token,
+        'name': meta['name'],
+        'size': meta['size'],
+        'offset': meta['offset'],
+        'complete': meta['complete'],
+        'chunk_size': staging.max_chunk_size(),
+        'location': reverse('print_service:api_upload_detail', args=[token]),
+    }
+
+def _upload_headers(response, meta):
+    response['Upload-Offset'] = str(meta['offset'])
+    response['Upload-Length'] = str(meta['size'])
+    response['Cache-Control'] = 'no-store'
+    return response
+
+@require_http_methods(["POST"])
+def api_upload_create(request):
+    """Start a resumable upload: JSON {filename, size, content_type?, checksum?, purpose?}"""
+    try:
+        data = json.loads(request.body)
+        size = int(data.get('size'))
+        token = staging.create(
+            data.get('filename', ''),
+            content_type=data.get('content_type', ''),
+            owner=staging.session_owner(request),
+            size=size,
+            checksum=data.get('checksum') or None,
+            purpose=data.get('purpose') if data.get('purpose') in ('print', 'typing') else 'print',
+        )
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return JsonResponse({'success': False, 'message': 'داده‌های ارسالی نامعتبر است'}, status=400)
+    except staging.UploadTooLarge:
+        return JsonResponse({'success': False, 'message': 'حجم فایل بیش از حد مجاز است'}, status=413)
+    except staging.StagingError as e:
+        return JsonResponse({'success': False, 'message': f'فایل نامعتبر است: {e}'}, status=400)
+    meta = staging.read_meta(token)
+    response = _upload_headers(JsonResponse(_upload_status(token, meta), status=201), meta)
+    response['Location'] = reverse('print_service:api_upload_detail', args=[token])
+    return response
+
+@require_http_methods(["GET", "HEAD", "PATCH", "DELETE"])
+def api_upload_detail(request, token):
+    """HEAD/GET report progress, PATCH appends a chunk at ``Upload-Offset``, DELETE cancels"""
+    owner = staging.session_owner(request)
+    try:
+        meta = staging.read_meta(token, owner=owner)
+    except staging.StagingError:
+        return JsonResponse({'success': False, 'message': 'آپلود یافت نشد'}, status=404)
+
+    if request.method == 'HEAD':
+        return _upload_headers(HttpResponse(status=200), meta)
+    if request.method == 'GET':
+        return _upload_headers(JsonResponse(_upload_status(token, meta)), meta)
+    if request.method == 'DELETE':
+        staging.discard(token)
+        return HttpResponse(status=204)
+
+    # PATCH: the body is the raw chunk; it is read from the stream, never buffered whole
+    try:
+        offset = int(request.headers['Upload-Offset'])
+        length = int(request.headers['Content-Length'])
+    except (KeyError, ValueError):
+        return JsonResponse({'success': False, 'message': 'هدر Upload-Offset یا Content-Length نامعتبر است'}, status=400)
+    try:
+        staging.append_chunk(
+            token, offset, request, length,
+            checksum=request.headers.get('Upload-Checksum'), owner=owner,
+        )
+    except staging.UploadConflict as e:
+        response = JsonResponse({'success': False, 'message': f'تداخل در آپلود: {e}'}, status=409)
+        return _upload_headers(response, staging.read_meta(token))
+    except staging.UploadTooLarge:
+        return JsonResponse({'success': False, 'message': 'حجم بخش ارسالی بیش از حد مجاز است'}, status=413)
+    except staging.ChecksumMismatch:
+        response = JsonResponse({'success': False, 'message': 'checksum بخش ارسالی مطابقت ندارد'}, status=UPLOAD_CHECKSUM_MISMATCH)
+        return _upload_headers(response, staging.read_meta(token))
+    except staging.StagingError as e:
+        return JsonResponse({'success': False, 'message': f'خطا در آپلود: {e}'}, status=400)
+    return _upload_headers(HttpResponse(status=204), staging.read_meta(token))
+
+@require_http_methods(["POST"])
+def api_upload_finalize(request, token):
+    """Complete a resumable upload once every byte has arrived"""
+    owner = staging.session_owner(request)
+    try:
+        meta = staging.finalize(token, owner=owner)
+    except staging.ChecksumMismatch:
+        return JsonResponse({'success': False, 'message': 'checksum فایل مطابقت ندارد'}, status=UPLOAD_CHECKSUM_MISMATCH)
+    except staging.UploadConflict:
+        return JsonResponse({'success': False, 'message': 'آپلود هنوز کامل نشده است'}, status=409)
+    except staging.StagingError:
+        return JsonResponse({'success': False, 'message': 'آپلود یافت نشد'}, status=404)
+    if meta.get('purpose') == 'print':
+        # Picked up by order_summary together with files staged through stage_upload
+        staging.add_to_session(request, [token])
+    return JsonResponse(_upload_status(token, meta))
+
 # -------------------------
 # جزئیات و پیگیری سفارش
 # -------------------------
@@ -145,7 +286,7 @@ def order_track(request):
     # Find the order
     if order_id and email:
         try:
-            order = PrintOrder.objects.get(id=order_id, email__iexact=email)
+            order = PrintOrder.objects.get(id=order_id, email_normalized=email)
         except PrintOrder.DoesNotExist:
             error = "No order found with this ID and email."
     elif order_id:
@@ -154,7 +295,7 @@ def order_track(request):
         except PrintOrder.DoesNotExist:
             error = "No order found with this ID."
     elif email:
-        orders = PrintOrder.objects.filter(email__iexact=email).order_by('-created_at')
+        orders = PrintOrder.objects.filter(email_normalized=email).order_by('-created_at')
         if orders.exists():
             order = orders.first()
             if orders.count() > 1:
@@ -179,7 +320,7 @@ def order_track(request):
 
     # --- Get bank info ---
     from .models import PaymentSettings
-    bank_info = PaymentSettings.objects.first()
+    bank_info = PaymentSettings.load()
     print(f"[DEBUG] Bank info: {bank_info}")
     if bank_info:
         print(f"[DEBUG] Bank name: {bank_info.bank_name}")
@@ -225,13 +366,13 @@ def unified_order_track(request):
     # Try to find in PrintOrder
     if order_id and email:
         try:
-            order = PrintOrder.objects.get(id=order_id, email__iexact=email)
+            order = PrintOrder.objects.get(id=order_id, email_normalized=email)
             order_type = 'print'
         except PrintOrder.DoesNotExist:
             pass
         if not order:
             try:
-                order = TypingOrder.objects.get(id=order_id, user_email__iexact=email)
+                order = TypingOrder.objects.get(id=order_id, email_normalized=email)
                 order_type = 'typing'
             except TypingOrder.DoesNotExist:
                 error = "No order found with this ID and email."
@@ -246,8 +387,8 @@ def unified_order_track(request):
             except TypingOrder.DoesNotExist:
                 error = "No order found with this ID."
     elif email:
-        print_orders = PrintOrder.objects.filter(email__iexact=email).order_by('-created_at')
-        typing_orders = TypingOrder.objects.filter(user_email__iexact=email).order_by('-created_at')
+        print_orders = PrintOrder.objects.filter(email_normalized=email).order_by('-created_at')
+        typing_orders = TypingOrder.objects.filter(email_normalized=email).order_by('-created_at')
         if print_orders.exists():
             order = print_orders.first()
             order_type = 'print'
@@ -303,7 +444,7 @@ def my_orders(request):
     """My Orders page for authenticated users"""
     user_email = request.user.email
     
-    orders = PrintOrder.objects.filter(email=user_email).order_by('-created_at')
+    orders = PrintOrder.objects.filter(user=request.user).order_by('-created_at')
     
     # Pagination
     paginator = Paginator(orders, 10)
@@ -440,13 +581,14 @@ def bank_settings_view(request):
     }
     return render(request, 'print_service/bank_settings.html', context)
 
-def pricing_api(request):
+@cached_response(PrintPriceSettings)
+async def pricing_api(request):
     """API endpoint for pricing data"""
     try:
-        settings = PrintPriceSettings.objects.first()
+        settings = await sync_to_async(PrintPriceSettings.load)()
         if not settings:
             # Create default settings if none exist
-            settings = PrintPriceSettings.objects.create()
+            settings = await PrintPriceSettings.objects.acreate()
         
         data = {
             'base_price_per_page': settings.base_price_per_page,
@@ -466,27 +608,19 @@ def pricing_api(request):
 
 def store_order(request):
     """Store-like order interface"""
-    from .models import Accessory
-    accessories = Accessory.objects.filter(is_active=True).order_by('category', 'sort_order')
-    
     context = {
-        'accessories': accessories,
+        'accessories': accessory_catalog.accessories(),
     }
     return render(request, 'print_service/store_order.html', context)
 
 
-def accessories_api(request):
-    """API endpoint for accessories data"""
-    from .models import Accessory
+async def _accessories_response(service_type):
+    """Active accessories for a service, grouped by category"""
     try:
-        accessories = Accessory.objects.filter(is_active=True, service_type__in=['print', 'both']).order_by('category', 'sort_order')
-        
-        # Group accessories by category
+        catalog = await sync_to_async(accessory_catalog.by_category)(service_type)
         accessories_by_category = {}
-        for accessory in accessories:
-            if accessory.category not in accessories_by_category:
-                accessories_by_category[accessory.category] = []
-            accessories_by_category[accessory.category].append({
+        for category, accessories in catalog.items():
+            accessories_by_category[category] = [{
                 'id': accessory.id,
                 'name': accessory.name,
                 'description': accessory.description,
@@ -497,7 +631,7 @@ def accessories_api(request):
                 'is_featured': accessory.is_featured,
                 'icon': accessory.icon,
                 'color': accessory.color,
-            })
+            } for accessory in accessories]
         
         return JsonResponse({
             'accessories_by_category': accessories_by_category,
@@ -507,36 +641,16 @@ def accessories_api(request):
         return JsonResponse({'error': str(e), 'success': False}, status=500)
 
 
-def typing_accessories_api(request):
+@cached_response(Accessory)
+async def accessories_api(request):
+    """API endpoint for accessories data"""
+    return await _accessories_response('print')
+
+
+@cached_response(Accessory)
+async def typing_accessories_api(request):
     """API endpoint for typing accessories data"""
-    from .models import Accessory
-    try:
-        accessories = Accessory.objects.filter(is_active=True, service_type__in=['typing', 'both']).order_by('category', 'sort_order')
-        
-        # Group accessories by category
-        accessories_by_category = {}
-        for accessory in accessories:
-            if accessory.category not in accessories_by_category:
-                accessories_by_category[accessory.category] = []
-            accessories_by_category[accessory.category].append({
-                'id': accessory.id,
-                'name': accessory.name,
-                'description': accessory.description,
-                'base_price': float(accessory.base_price),
-                'category': accessory.category,
-                'service_type': accessory.service_type,
-                'is_active': accessory.is_active,
-                'is_featured': accessory.is_featured,
-                'icon': accessory.icon,
-                'color': accessory.color,
-            })
-        
-        return JsonResponse({
-            'accessories_by_category': accessories_by_category,
-            'success': True
-        })
-    except Exception as e:
-        return JsonResponse({'error': str(e), 'success': False}, status=500)
+    return await _accessories_response('typing')
 
 # API Endpoints for React Frontend
 @csrf_exempt
@@ -571,7 +685,8 @@ def api_create_order(request):
                 num_copies=copies,
                 delivery_method='pickup',
                 payment_method='online',
-                status='pending'
+                status='pending',
+                user=request.user if request.user.is_authenticated else None,
             )
             
             return JsonResponse({
@@ -612,17 +727,17 @@ def api_my_orders(request):
     """API endpoint to get user's print orders"""
     if request.method == 'GET':
         try:
-            email = request.GET.get('email')
-            if not email and request.user.is_authenticated:
-                email = request.user.email
-            
-            if not email:
+            email = customers.normalize_email(request.GET.get('email'))
+            if email:
+                orders = PrintOrder.objects.filter(email_normalized=email)
+            elif request.user.is_authenticated:
+                orders = PrintOrder.objects.filter(user=request.user)
+            else:
                 return JsonResponse({
                     'success': False,
                     'message': 'ایمیل مورد نیاز است'
                 }, status=400)
-            
-            orders = PrintOrder.objects.filter(email__iexact=email).order_by('-created_at')
+            orders = orders.order_by('-created_at')
             
             orders_data = []
             for order in orders:
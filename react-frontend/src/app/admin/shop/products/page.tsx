@@ -45,17 +45,25 @@ export default function ShopProducts() {
   const [saving, setSaving] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [success, setSuccess] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchProducts();
   }, []);
 
-  const fetchProducts = async () => {
+  // Loads the first page, or the page after `cursor` when given
+  const fetchProducts = async (cursor?: string) => {
     try {
-      setLoading(true);
-      const response = await adminAPI.getAdminProducts();
+      if (cursor) {
+        setLoadingMore(true);
+      } else {
+        setLoading(true);
+      }
+      const response = await adminAPI.getAdminProducts({ cursor });
       if (response.success) {
-        setProducts(response.products);
+        setProducts(previous => (cursor ? [...previous, ...response.products] : response.products));
+        setNextCursor(response.has_more ? response.next_cursor : null);
       } else {
         setError('خطا در دریافت محصولات');
       }
@@ -64,6 +72,7 @@ export default function ShopProducts() {
       setError('خطا در ارتباط با سرور');
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -540,6 +549,17 @@ export default function ShopProducts() {
                 </tbody>
               </table>
             </div>
+            {nextCursor && (
+              <div className="flex justify-center py-4 border-t border-gray-200">
+                <button
+                  onClick={() => fetchProducts(nextCursor)}
+                  disabled={loadingMore}
+                  className="px-4 py-2 text-sm text-indigo-600 hover:text-indigo-900 disabled:opacity-50"
+                >
+                  {loadingMore ? 'در حال بارگذاری...' : 'نمایش محصولات بیشتر'}
+                </button>
+              </div>
+            )}
           </div>
         </div>
       </AdminDashboardLayout>
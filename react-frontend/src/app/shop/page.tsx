@@ -1,6 +1,6 @@
 'use client';
 
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { useAuth } from '@/contexts/AuthContext';
 import { digitalShopAPI } from '@/lib/api';
 import { GlowCard } from '@/components/ui/spotlight-card';
@@ -58,103 +58,107 @@ function ShopContent() {
   const [selectedCategory, setSelectedCategory] = useState<string>('all');
   const [addingToCart, setAddingToCart] = useState<number | null>(null);
   const [cartCount, setCartCount] = useState(0);
+  const [categories, setCategories] = useState<Array<{ id: number; name: string }>>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const latestRequest = useRef(0);
 
-  useEffect(() => {
-    const fetchProducts = async () => {
-      try {
-        setLoading(true);
-        console.log('Starting API call to fetch products...');
-        console.log('API base URL:', process.env.NEXT_PUBLIC_API_URL || 'http://127.0.0.1:8000');
-        
-        const response = await digitalShopAPI.getProducts();
-        console.log('Raw API Response:', response);
-        console.log('Response type:', typeof response);
-        console.log('Response keys:', Object.keys(response || {}));
-        
-        // Handle the API response structure
-        if (response && response.success && response.products) {
-          console.log('Success! Products found:', response.products.length);
-          console.log('First product sample:', response.products[0]);
-          setProducts(response.products);
-        } else if (Array.isArray(response)) {
-          console.log('Response is array, products found:', response.length);
-          console.log('First product sample:', response[0]);
-          setProducts(response);
-        } else {
-          console.error('Unexpected API response format:', response);
-          console.log('Response structure:', JSON.stringify(response, null, 2));
-          setProducts([]);
+  // Loads the first page for the current search and category, or the page after `cursor`
+  const fetchProducts = async (cursor?: string) => {
+    const request = ++latestRequest.current;
+    try {
+      if (cursor) setLoadingMore(true);
+      const response = await digitalShopAPI.getProducts({
+        cursor,
+        q: searchTerm.trim() || undefined,
+        category: selectedCategory === 'all' ? undefined : Number(selectedCategory),
+      });
+      // A newer search or filter has replaced this request
+      if (request !== latestRequest.current) return;
+
+      if (response && response.success && response.products) {
+        setProducts(previous => (cursor ? [...previous, ...response.products] : response.products));
+        setNextCursor(response.has_more ? response.next_cursor : null);
+        if (response.categories) setCategories(response.categories);
+      } else {
+        console.error('Unexpected API response format:', response);
+        if (!cursor) setProducts([]);
+        setNextCursor(null);
+      }
+    } catch (error: any) {
+      console.error('Error fetching products:', error);
+      if (request !== latestRequest.current || cursor) return;
+
+      // Use mock data if API fails
+      console.log('Using fallback mock data...');
+      setNextCursor(null);
+      setProducts([
+        {
+          id: 1,
+          name: 'لپ‌تاپ ایسوس ROG Strix',
+          description: 'لپ‌تاپ گیمینگ قدرتمند با پردازنده Intel Core i7 و کارت گرافیک RTX 3070',
+          price: 45000000,
+          compare_price: 50000000,
+          category: { id: 1, name: 'کامپیوتر' },
+          brand: { id: 1, name: 'ایسوس' },
+          images: [],
+          in_stock: true,
+          stock_quantity: 10,
+          sku: 'LAPTOP-001',
+          is_featured: true,
+          is_new: true,
+          is_on_sale: true,
+          is_active: true
+        },
+        {
+          id: 2,
+          name: 'هدفون سونی WH-1000XM4',
+          description: 'هدفون بی‌سیم با تکنولوژی حذف نویز و کیفیت صوتی فوق‌العاده',
+          price: 8500000,
+          compare_price: 9500000,
+          category: { id: 2, name: 'صوتی' },
+          brand: { id: 2, name: 'سونی' },
+          images: [],
+          in_stock: true,
+          stock_quantity: 25,
+          sku: 'HEADPHONE-001',
+          is_featured: true,
+          is_new: false,
+          is_on_sale: true,
+          is_active: true
+        },
+        {
+          id: 3,
+          name: 'کیبورد مکانیکی لاجیتک',
+          description: 'کیبورد مکانیکی گیمینگ با نورپردازی RGB و سویچ‌های آبی',
+          price: 2500000,
+          category: { id: 3, name: 'لوازم جانبی' },
+          brand: { id: 3, name: 'لاجیتک' },
+          images: [],
+          in_stock: true,
+          stock_quantity: 15,
+          sku: 'KEYBOARD-001',
+          is_featured: false,
+          is_new: true,
+          is_on_sale: false,
+          is_active: true
         }
-      } catch (error: any) {
-        console.error('Error fetching products:', error);
-        console.error('Error details:', {
-          message: error.message,
-          stack: error.stack,
-          response: error.response
-        });
-        
-        // Use mock data if API fails
-        console.log('Using fallback mock data...');
-        setProducts([
-          {
-            id: 1,
-            name: 'لپ‌تاپ ایسوس ROG Strix',
-            description: 'لپ‌تاپ گیمینگ قدرتمند با پردازنده Intel Core i7 و کارت گرافیک RTX 3070',
-            price: 45000000,
-            compare_price: 50000000,
-            category: { id: 1, name: 'کامپیوتر' },
-            brand: { id: 1, name: 'ایسوس' },
-            images: [],
-            in_stock: true,
-            stock_quantity: 10,
-            sku: 'LAPTOP-001',
-            is_featured: true,
-            is_new: true,
-            is_on_sale: true,
-            is_active: true
-          },
-          {
-            id: 2,
-            name: 'هدفون سونی WH-1000XM4',
-            description: 'هدفون بی‌سیم با تکنولوژی حذف نویز و کیفیت صوتی فوق‌العاده',
-            price: 8500000,
-            compare_price: 9500000,
-            category: { id: 2, name: 'صوتی' },
-            brand: { id: 2, name: 'سونی' },
-            images: [],
-            in_stock: true,
-            stock_quantity: 25,
-            sku: 'HEADPHONE-001',
-            is_featured: true,
-            is_new: false,
-            is_on_sale: true,
-            is_active: true
-          },
-          {
-            id: 3,
-            name: 'کیبورد مکانیکی لاجیتک',
-            description: 'کیبورد مکانیکی گیمینگ با نورپردازی RGB و سویچ‌های آبی',
-            price: 2500000,
-            category: { id: 3, name: 'لوازم جانبی' },
-            brand: { id: 3, name: 'لاجیتک' },
-            images: [],
-            in_stock: true,
-            stock_quantity: 15,
-            sku: 'KEYBOARD-001',
-            is_featured: false,
-            is_new: true,
-            is_on_sale: false,
-            is_active: true
-          }
-        ]);
-      } finally {
+      ]);
+    } finally {
+      if (request === latestRequest.current) {
         setLoading(false);
-        console.log('Loading finished. Products count:', products.length);
+        setLoadingMore(false);
       }
-    };
+    }
+  };
 
-    fetchProducts();
-    
+  useEffect(() => {
+    // Search once typing pauses instead of on every keystroke
+    const timer = setTimeout(() => fetchProducts(), searchTerm ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [searchTerm, selectedCategory]);
+
+  useEffect(() => {
     // Load cart count from localStorage
     const savedCartCount = localStorage.getItem('cartCount');
     if (savedCartCount) {
@@ -162,65 +166,6 @@ function ShopContent() {
     }
   }, []);
 
-  const filteredProducts = products.filter(product => {
-    // Debug logging
-    console.log('Filtering product:', {
-      id: product.id,
-      name: product.name,
-      is_active: product.is_active,
-      category: product.category,
-      selectedCategory: selectedCategory
-    });
-    
-    // Check if product is active (default to true if not specified)
-    if (product.is_active === false) {
-      console.log('Product filtered out - not active:', product.name);
-      return false;
-    }
-    
-    const description = product.description || product.short_description || '';
-    const matchesSearch = product.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                         description.toLowerCase().includes(searchTerm.toLowerCase());
-    
-    // Fix category filtering - handle both string and object category formats
-    let matchesCategory = true;
-    if (selectedCategory !== 'all') {
-      if (typeof product.category === 'string') {
-        matchesCategory = product.category === selectedCategory;
-      } else if (product.category && typeof product.category === 'object') {
-        matchesCategory = product.category.name === selectedCategory;
-      } else {
-        matchesCategory = false;
-      }
-    }
-    
-    const result = matchesSearch && matchesCategory;
-    if (!result) {
-      console.log('Product filtered out:', product.name, {
-        matchesSearch,
-        matchesCategory,
-        searchTerm,
-        selectedCategory
-      });
-    }
-    
-    return result;
-  });
-
-  // Fix categories extraction
-  const categories = ['all'];
-  products.forEach(product => {
-    let categoryName = '';
-    if (typeof product.category === 'string') {
-      categoryName = product.category;
-    } else if (product.category && typeof product.category === 'object') {
-      categoryName = product.category.name;
-    }
-    if (categoryName && !categories.includes(categoryName)) {
-      categories.push(categoryName);
-    }
-  });
-
   const handleAddToCart = async (productId: number) => {
     console.log('=== ADD TO CART DEBUG START ===');
     console.log('handleAddToCart called with productId:', productId);
@@ -404,18 +349,18 @@ function ShopContent() {
                 </div>
               </div>
               <div className="flex gap-2">
-                {categories.map((category) => (
+                {[{ id: 'all', name: 'همه' }, ...categories].map((category) => (
                   <Button
-                    key={category}
-                    variant={selectedCategory === category ? "default" : "outline"}
-                    onClick={() => setSelectedCategory(category)}
+                    key={category.id}
+                    variant={selectedCategory === String(category.id) ? "default" : "outline"}
+                    onClick={() => setSelectedCategory(String(category.id))}
                     className={
-                      selectedCategory === category 
+                      selectedCategory === String(category.id) 
                         ? "bg-orange-600 hover:bg-orange-700 text-white" 
                         : "border-white/20 text-white hover:bg-white/10"
                     }
                   >
-                    {category === 'all' ? 'همه' : category}
+                    {category.name}
                   </Button>
                 ))}
               </div>
@@ -525,7 +470,7 @@ function ShopContent() {
               {/* Debug Information */}
               <div className="mt-2 text-xs text-gray-500">
                 <div>Raw products count: {products.length}</div>
-                <div>Filtered products count: {filteredProducts.length}</div>
+                <div>More pages: {nextCursor ? 'yes' : 'no'}</div>
                 <div>Search term: "{searchTerm}"</div>
                 <div>Selected category: "{selectedCategory}"</div>
               </div>
@@ -536,7 +481,7 @@ function ShopContent() {
 
       {/* Products Grid */}
       <div className="max-w-7xl mx-auto">
-        {filteredProducts.length === 0 ? (
+        {products.length === 0 ? (
           <Card className="bg-white/10 border-white/20">
             <CardContent className="p-12 text-center">
               <Package className="h-16 w-16 text-gray-400 mx-auto mb-4" />
@@ -546,7 +491,7 @@ function ShopContent() {
           </Card>
         ) : (
           <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6">
-            {filteredProducts.map((product) => {
+            {products.map((product) => {
               console.log('Rendering product:', {
                 id: product.id,
                 name: product.name,
@@ -660,6 +605,18 @@ function ShopContent() {
             })}
           </div>
         )}
+        {nextCursor && (
+          <div className="flex justify-center mt-8">
+            <Button
+              variant="outline"
+              className="border-white/20 text-white hover:bg-white/10"
+              disabled={loadingMore}
+              onClick={() => fetchProducts(nextCursor)}
+            >
+              {loadingMore ? 'در حال بارگذاری...' : 'نمایش محصولات بیشتر'}
+            </Button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -10,12 +10,28 @@ const api = axios.create({
   timeout: 10000, // 10 second timeout
 });
 
+// CSRF token for endpoints that keep Django's CSRF protection (the upload API).
+// Django rotates it on login and logout, so those calls reset it.
+let csrfToken: string | null = null;
+const SAFE_METHODS = ['get', 'head', 'options'];
+
+const getCsrfToken = async () => {
+  if (!csrfToken) {
+    const response = await api.get('/accounts/api/csrf/');
+    csrfToken = response.data.csrf_token as string;
+  }
+  return csrfToken;
+};
+
 // Request interceptor to add auth token
-api.interceptors.request.use((config) => {
+api.interceptors.request.use(async (config) => {
   const token = localStorage.getItem('authToken');
   if (token) {
     config.headers.Authorization = `Bearer ${token}`;
   }
+  if (!SAFE_METHODS.includes((config.method || 'get').toLowerCase())) {
+    config.headers['X-CSRFToken'] = await getCsrfToken();
+  }
   return config;
 });
 
@@ -43,6 +59,7 @@ api.interceptors.response.use(
 export const authAPI = {
   login: async (email: string, password: string) => {
     const response = await api.post('/accounts/api/login/', { email, password });
+    csrfToken = null;
     return response.data;
   },
   
@@ -53,11 +70,13 @@ export const authAPI = {
     last_name: string;
   }) => {
     const response = await api.post('/accounts/api/register/', userData);
+    csrfToken = null;
     return response.data;
   },
   
   logout: async () => {
     const response = await api.post('/accounts/api/logout/');
+    csrfToken = null;
     return response.data;
   },
   
@@ -126,10 +145,97 @@ export const typingServiceAPI = {
   },
 };
 
+// Resumable chunked uploads for print and typing documents
+const toBase64 = (buffer: ArrayBuffer) => {
+  let binary = '';
+  new Uint8Array(buffer).forEach((byte) => { binary += String.fromCharCode(byte); });
+  return btoa(binary);
+};
+
+const sha256Header = async (data: ArrayBuffer) =>
+  `sha256 ${toBase64(await crypto.subtle.digest('SHA-256', data))}`;
+
+export const uploadAPI = {
+  create: async (file: File, purpose: 'print' | 'typing') => {
+    const response = await api.post('/print/api/uploads/', {
+      filename: file.name,
+      size: file.size,
+      content_type: file.type,
+      purpose,
+    });
+    return response.data;
+  },
+
+  getOffset: async (token: string) => {
+    const response = await api.head(`/print/api/uploads/${token}/`);
+    return Number(response.headers['upload-offset'] || 0);
+  },
+
+  // Upload ``file`` in chunks, resuming from the server's offset when ``token`` is given.
+  // Returns the token to submit as ``upload_token`` with the order form.
+  upload: async (
+    file: File,
+    purpose: 'print' | 'typing',
+    options: { token?: string; onProgress?: (sent: number, total: number) => void } = {}
+  ) => {
+    let token = options.token;
+    let chunkSize = 4 * 1024 * 1024;
+    let offset = 0;
+    if (token) {
+      offset = await uploadAPI.getOffset(token);
+    } else {
+      const created = await uploadAPI.create(file, purpose);
+      token = created.token as string;
+      chunkSize = Math.min(chunkSize, created.chunk_size);
+    }
+    let retries = 0;
+    while (offset < file.size) {
+      const chunk = await file.slice(offset, offset + chunkSize).arrayBuffer();
+      try {
+        const response = await api.patch(`/print/api/uploads/${token}/`, chunk, {
+          headers: {
+            'Content-Type': 'application/offset+octet-stream',
+            'Upload-Offset': String(offset),
+            'Upload-Checksum': await sha256Header(chunk),
+          },
+          timeout: 0,
+        });
+        offset = Number(response.headers['upload-offset']);
+        retries = 0;
+      } catch (error: any) {
+        // 409: the server already has more (or less) than we thought; 460: corrupted chunk
+        const status = error.response?.status;
+        if ((status === 409 || status === 460) && retries++ < 5) {
+          offset = Number(error.response.headers['upload-offset'] ?? offset);
+          continue;
+        }
+        throw error;
+      }
+      options.onProgress?.(offset, file.size);
+    }
+    await api.post(`/print/api/uploads/${token}/finalize/`);
+    return token;
+  },
+
+  cancel: async (token: string) => {
+    await api.delete(`/print/api/uploads/${token}/`);
+  },
+};
+
+export interface ProductListParams {
+  limit?: number;
+  cursor?: string;
+  fields?: string;
+  q?: string;
+  category?: number;
+}
+
 // Digital Shop API
 export const digitalShopAPI = {
-  getProducts: async () => {
-    const response = await api.get('/shop/api/products/');
+  // One keyset page; pass next_cursor back to load the next one. Search and
+  // category filters run on the server.
+  getProducts: async (params?: ProductListParams) => {
+    const response = await api.get('/shop/api/products/', { params });
     return response.data;
   },
   
@@ -188,8 +294,8 @@ export default api;
 // Admin API for managing the system
 export const adminAPI = {
   // Product Management
-  getAdminProducts: async () => {
-    const response = await api.get('/shop/api/products/');
+  getAdminProducts: async (params?: ProductListParams) => {
+    const response = await api.get('/shop/api/products/', { params: { limit: 50, ...params } });
     return response.data;
   },
   
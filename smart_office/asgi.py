@@ -2,6 +2,9 @@
 ASGI config for smart_office project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with any ASGI server, e.g. ``uvicorn smart_office.asgi:application``.
+The read-heavy JSON APIs are async views (see core/async_views.py); compare
+both deployments with ``manage.py benchmark_api``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -55,16 +55,19 @@ INSTALLED_APPS = [
     'core',
     'paymentslip',
     'accounts',
+    'jobs',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.staticfiles.StaticFilesMiddleware',  # inactive unless STATIC_SERVE_ENABLED
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.query_budget.QueryBudgetMiddleware',  # inactive unless QUERY_BUDGET_ENABLED
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,6 +87,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.i18n',
                 'django.template.context_processors.csrf',
+                'digital_shop.context_processors.cart_summary',
             ],
         },
     },
@@ -189,6 +193,7 @@ CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_METHODS = [
     'DELETE',
     'GET',
+    'HEAD',
     'OPTIONS',
     'PATCH',
     'POST',
@@ -205,6 +210,15 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'upload-offset',
+    'upload-checksum',
+]
+
+# Resumable upload progress headers read by the React frontend
+CORS_EXPOSE_HEADERS = [
+    'upload-offset',
+    'upload-length',
+    'location',
 ]
 
 # CSRF Trusted Origins (required for Django 4.0+)
@@ -222,9 +236,82 @@ CSRF_TRUSTED_ORIGINS = [
 # Session Configuration
 SESSION_COOKIE_AGE = 86400  # 24 hours in seconds
 SESSION_SAVE_EVERY_REQUEST = True  # Refresh session on every request
+SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# With a shared CACHES backend (Redis, Memcached) switch to SESSION_ENGINE = 'core.sessions', which
+# writes to the database only on change (see core/sessions.py); it refuses a per-process LocMemCache
+SESSION_REFRESH_INTERVAL = 300  # core.sessions: seconds between expiry-only writes and cache entry lifetime
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
 SESSION_COOKIE_SAMESITE = 'Lax'
 
 # Also include a section where the admin can change the price of each unit of typing or printing if it changes so that the user is informed and the calculation can be automatic.
+
+# Buffered view counters (see core/counters.py)
+VIEW_COUNTER_BACKEND = 'local'  # 'local' (per process) or 'cache' (shared Django cache)
+VIEW_COUNTER_FLUSH_INTERVAL = 30  # seconds between automatic flushes
+VIEW_COUNTER_MAX_PENDING = 500  # flush early once this many rows have pending increments
+
+# Staged print order uploads (see print_service/staging.py)
+UPLOAD_STAGING_ROOT = BASE_DIR / 'upload_staging'  # outside MEDIA_ROOT so staged files are never served
+UPLOAD_STAGING_MAX_AGE = SESSION_COOKIE_AGE  # seconds before cleanup_staged_uploads removes unclaimed files
+UPLOAD_MAX_SIZE = 200 * 1024 * 1024  # total size of one resumable upload
+UPLOAD_CHUNK_MAX_SIZE = 8 * 1024 * 1024  # largest PATCH body accepted by the chunked upload API
+
+# Cached single-row settings models (see core/singletons.py)
+SINGLETON_SETTINGS_LOCAL_TTL = 5  # seconds a process trusts its own copy
+SINGLETON_SETTINGS_CACHE_TIMEOUT = 3600  # seconds in the shared cache
+TEST_RUNNER = 'core.test_runner.TestRunner'  # clears the cached rows before every test
+
+# Per-request query budgets and N+1 detection (see core/query_budget.py)
+QUERY_BUDGET_ENABLED = False  # opt-in: count queries, log them and add X-DB-Queries for staff
+QUERY_BUDGET_ACTION = 'log'  # 'raise' turns budget and N+1 violations into errors, for tests
+QUERY_BUDGET_DEFAULT = None  # query limit for views without their own entry below
+QUERY_BUDGET_MAX_DUPLICATES = 5  # the same SQL run more often than this is reported as N+1
+QUERY_BUDGETS = {
+    # URL name or view path -> max queries, e.g. 'digital_shop:api_products': 10
+}
+
+# Cached cart totals for the header badge and cart pages (see digital_shop/cart_summary.py)
+CART_SUMMARY_CACHE_TIMEOUT = 300  # seconds
+
+# Cached shop home page lists (see digital_shop/storefront.py); banner start/end dates shorten it
+SHOP_HOME_CACHE_TIMEOUT = 300  # seconds
+
+# Resized catalog image renditions (see core/images.py)
+IMAGE_RENDITION_WIDTHS = (320, 640, 1024)  # pixels; originals are never upscaled
+IMAGE_RENDITION_FORMATS = ('webp', 'jpeg')
+IMAGE_RENDITION_QUALITY = 80
+
+# Payment slip normalization and review thumbnails (see core/images.py)
+SLIP_MAX_DIMENSION = 2000  # pixels, longest edge
+SLIP_QUALITY = 85
+SLIP_THUMBNAIL_SIZE = 320  # pixels, longest edge
+
+# Fingerprinted, precompressed static files (see core/staticfiles.py).
+# collectstatic writes hashed names plus .gz (and .br with the brotli package)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'core.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+STATIC_SERVE_ENABLED = not DEBUG  # serve STATIC_ROOT from the app; runserver serves static files in DEBUG
+STATIC_SERVE_MAX_AGE = 60  # seconds, for names without a content hash
+STATIC_COMPRESS_MIN_SIZE = 512  # bytes
+
+# ETags, 304s and shared cached bodies for the catalog JSON APIs (see core/response_cache.py).
+# Use a shared CACHES backend (Redis, Memcached) when running several processes
+RESPONSE_CACHE_TIMEOUT = 3600  # seconds a rendered response body is kept
+
+# Cached accessory and package deal catalog (see print_service/accessory_catalog.py)
+ACCESSORY_CATALOG_CACHE_TIMEOUT = 3600  # seconds; any accessory or package deal change starts a new entry
+
+# Database-backed background jobs (see jobs/queue.py); run them with manage.py run_workers
+JOB_QUEUE_ASYNC = True  # False runs jobs inline when they are queued
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 10  # seconds before the first retry, doubled for each further attempt
+JOB_RETRY_MAX_DELAY = 3600  # seconds
+JOB_LOCK_TIMEOUT = 600  # seconds before a job left running by a dead worker is queued again
+JOB_KEEP_DONE = 7 * 24 * 3600  # seconds finished jobs are kept
+JOB_POLL_INTERVAL = 1.0  # seconds an idle worker waits between polls
+JOB_WORKER_PROCESSES = 1
+JOB_WORKER_THREADS = 4
@@ -6,6 +6,11 @@ cd /Users/miladomidvar/Desktop/Djangoproject/calssic_sys
 python3 manage.py runserver 127.0.0.1:8000 &
 DJANGO_PID=$!
 
+# Start background job workers (emails, order updates, image processing)
+echo "Starting job workers..."
+python3 manage.py run_workers &
+WORKERS_PID=$!
+
 # Wait a moment for Django to start
 sleep 3
 
@@ -19,12 +24,12 @@ echo "Both servers are starting..."
 echo "Django backend: http://127.0.0.1:8000"
 echo "React frontend: http://localhost:3000"
 echo ""
-echo "Press Ctrl+C to stop both servers"
+echo "Press Ctrl+C to stop the servers and workers"
 
 # Function to cleanup on exit
 cleanup() {
     echo "Stopping servers..."
-    kill $DJANGO_PID $REACT_PID 2>/dev/null
+    kill $DJANGO_PID $WORKERS_PID $REACT_PID 2>/dev/null
     exit
 }
 
@@ -32,4 +37,4 @@ cleanup() {
 trap cleanup SIGINT SIGTERM
 
 # Wait for both processes
-wait $DJANGO_PID $REACT_PID
+wait $DJANGO_PID $WORKERS_PID $REACT_PID
@@ -13,6 +13,11 @@ cd "$SCRIPT_DIR"
 python3 manage.py runserver 8000 &
 DJANGO_PID=$!
 
+# Background job workers (emails, order updates, image processing)
+echo "⚙️  Starting job workers..."
+python3 manage.py run_workers &
+WORKERS_PID=$!
+
 # Wait a moment for Django to start
 sleep 3
 
@@ -35,13 +40,14 @@ echo "Test Account:"
 echo "📧 Email:    test@example.com"
 echo "🔑 Password: testpass123"
 echo ""
-echo "Press Ctrl+C to stop both servers..."
+echo "Press Ctrl+C to stop the servers and workers..."
 
 # Function to kill both processes when script is terminated
 cleanup() {
     echo ""
     echo "🛑 Shutting down servers..."
     kill $DJANGO_PID 2>/dev/null
+    kill $WORKERS_PID 2>/dev/null
     kill $REACT_PID 2>/dev/null
     echo "✅ Servers stopped."
     exit 0
@@ -13,16 +13,17 @@ class TypingOrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'user_name', 'status', 'total_price', 'created_at', 'final_approved', 'get_total_price')
     list_filter = ('status', 'final_approved', 'created_at')
     search_fields = ('user_name', 'user_email', 'id')
+    raw_id_fields = ('user',)
     inlines = [TypingOrderAccessoryInline]
     
     # Allow admin to edit these fields in the change view
-    readonly_fields = ('created_at', 'updated_at', 'get_total_price', 'get_accessories_total')
+    readonly_fields = ('created_at', 'updated_at', 'detected_page_count', 'get_total_price', 'get_accessories_total')
     fieldsets = (
         (_('Order Information'), {
-            'fields': ('user_name', 'user_email', 'user_phone', 'description', 'document_file')
+            'fields': ('user', 'user_name', 'user_email', 'user_phone', 'description', 'document_file')
         }),
         (_('Pricing and Status'), {
-            'fields': ('status', 'page_count', 'total_price', 'payment_slip')
+            'fields': ('status', 'page_count', 'detected_page_count', 'total_price', 'payment_slip')
         }),
         (_('Finalization'), {
             'fields': ('final_approved', 'final_note', 'final_approved_by_user', 'delivery_option')
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TypingServiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'typing_service'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -5,6 +5,7 @@ from .models import TypingOrder
 from django.utils.translation import gettext_lazy as _
 import os
 from .models import TypingPriceSettings
+from print_service import accessory_catalog
 
 
 class TypingOrderForm(forms.ModelForm):
@@ -42,13 +43,7 @@ class TypingOrderForm(forms.ModelForm):
     
     def get_accessories_by_category(self):
         """Group accessories by category for template rendering"""
-        accessories = self.fields['accessories'].queryset
-        categories = {}
-        for accessory in accessories:
-            if accessory.category not in categories:
-                categories[accessory.category] = []
-            categories[accessory.category].append(accessory)
-        return categories
+        return accessory_catalog.by_category('typing')
 
     def clean_upload_file(self):
         file = self.cleaned_data.get('upload_file')
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('typing_service', '0012_typingpricesettings_bulk_discount_10_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='typingorder',
+            name='detected_page_count',
+            field=models.PositiveIntegerField(blank=True, help_text='Counted automatically from the uploaded document.', null=True, verbose_name='Detected Page Count'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('typing_service', '0013_typingorder_detected_page_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='typingorder',
+            index=models.Index(fields=['user_email', '-created_at'], name='typing_order_email_created'),
+        ),
+        migrations.AddIndex(
+            model_name='typingorder',
+            index=models.Index(fields=['status', '-created_at'], name='typing_order_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='typingorder',
+            index=models.Index(condition=models.Q(('payment_slip__isnull', False), models.Q(('payment_slip', ''), _negated=True)), fields=['-created_at'], name='typing_order_slip_created'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def normalize_email(email):
+    # Same rule as core.customers.normalize_email, copied so this migration never changes
+    return (email or '').strip().lower()
+
+
+def link_order_users(apps, schema_editor):
+    """Fill email_normalized and link orders to the only account using their email"""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    TypingOrder = apps.get_model('typing_service', 'TypingOrder')
+
+    # Emails used by more than one account are ambiguous and left unlinked
+    user_ids = {}
+    for user_id, email in User.objects.exclude(email='').values_list('id', 'email').iterator():
+        email = normalize_email(email)
+        user_ids[email] = None if email in user_ids else user_id
+
+    last_pk = 0
+    while True:
+        rows = list(
+            TypingOrder.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'user_email', 'email_normalized', 'user_id')[:1000]
+        )
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        changed = []
+        for pk, email, stored, user_id in rows:
+            email = normalize_email(email)
+            new_user_id = user_id or user_ids.get(email)
+            if email != stored or new_user_id != user_id:
+                changed.append(TypingOrder(pk=pk, email_normalized=email, user_id=new_user_id))
+        TypingOrder.objects.bulk_update(changed, ['email_normalized', 'user'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('typing_service', '0016_order_slip_details'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_order_users, migrations.RunPython.noop),
+    ]
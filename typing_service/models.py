@@ -1,9 +1,13 @@
 # typing_service/models.py
 
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from core import customers, images
+from core.singletons import CachedSingletonMixin
+
 class TypingOrder(models.Model):
     STATUS_CHOICES = [
         ('pending_review', _('Pending Review')),
@@ -24,13 +28,24 @@ class TypingOrder(models.Model):
     user_name = models.CharField(_('User Name'), max_length=100)
     user_email = models.EmailField(_('User Email'), blank=True, null=True)
     user_phone = models.CharField(_('User Phone'), max_length=20, blank=True, null=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True,
+        related_name='typing_orders', verbose_name=_('User'),
+    )
+    # Lower-cased copy of ``user_email`` for indexed guest lookups; set on save
+    email_normalized = models.CharField(max_length=254, blank=True, default='', editable=False)
+    EMAIL_FIELD = 'user_email'
     description = models.TextField(_('Description'), blank=True)
     document_file = models.FileField(_('Document to Type'), upload_to='typing_documents/', blank=True, null=True)
     
     # Pricing and payment
     page_count = models.PositiveIntegerField(_('Page Count'), default=1)
+    detected_page_count = models.PositiveIntegerField(_('Detected Page Count'), blank=True, null=True, help_text=_("Counted automatically from the uploaded document."))
     total_price = models.PositiveIntegerField(_('Total Price'), default=0, help_text=_("Set by admin after review."))
     payment_slip = models.ImageField(_('Payment Slip'), upload_to='typing_payment_slips/', blank=True, null=True)
+    # Size and thumbnail of the normalized slip (see core/images.py)
+    slip_details = models.JSONField(default=dict, blank=True, editable=False)
+    SLIP_FIELD = 'payment_slip'
     
     # Status and workflow
     status = models.CharField(_('Status'), max_length=30, choices=STATUS_CHOICES, default='pending_review')
@@ -48,9 +63,30 @@ class TypingOrder(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     estimated_delivery = models.DateTimeField(_('Estimated Delivery'), blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # "My orders" by user or email and the dashboard queue, newest first
+            models.Index(fields=['user', '-created_at'], name='typing_order_user_created'),
+            models.Index(fields=['email_normalized', '-created_at'], name='typing_order_email_created'),
+            models.Index(fields=['status', '-created_at'], name='typing_order_status_created'),
+            # Partial, so counting the dashboard queue never reads orders without a slip
+            models.Index(
+                fields=['-created_at'], name='typing_order_slip_created',
+                condition=models.Q(payment_slip__isnull=False) & ~models.Q(payment_slip=''),
+            ),
+        ]
+
     def __str__(self):
         return f"Typing Order #{self.id} - {self.user_name}"
-    
+
+    def save(self, *args, **kwargs):
+        customers.prepare_order(self, kwargs)
+        super().save(*args, **kwargs)
+
+    @property
+    def slip_thumbnail_url(self):
+        return images.slip_thumbnail_url(self)
+
     def get_total_price(self):
         """Get total price including accessories"""
         base_price = self.total_price if hasattr(self, 'total_price') else 0
@@ -73,6 +109,19 @@ class TypingOrder(models.Model):
             for acc in self.accessories.all()
         ]
 
+    @property
+    def quoted_page_count(self):
+        """Pages to price: the count detected from the document, else the customer's estimate"""
+        return self.detected_page_count or self.page_count
+
+    def calculate_quote(self, pricing_settings=None):
+        """Price for the quoted page count, or None when no pricing is configured"""
+        if pricing_settings is None:
+            pricing_settings = TypingPriceSettings.load()
+        if not pricing_settings:
+            return None
+        return self.quoted_page_count * pricing_settings.price_per_page
+
 
 class TypedFile(models.Model):
     order = models.ForeignKey(TypingOrder, on_delete=models.CASCADE, related_name='typed_files')
@@ -83,7 +132,7 @@ class TypedFile(models.Model):
         return f"Typed File for Order #{self.order.id}"
 
 
-class TypingPriceSettings(models.Model):
+class TypingPriceSettings(CachedSingletonMixin, models.Model):
     price_per_page = models.PositiveIntegerField(
         _('Price per Page'),
         default=100000,
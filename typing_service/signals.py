@@ -0,0 +1,30 @@
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from core import images
+from jobs import queue as jobs
+from print_service import documents
+from .models import TypingOrder
+
+
+@receiver(post_init, sender=TypingOrder)
+def remember_document(sender, instance, **kwargs):
+    instance._analyzed_document = instance.document_file.name if instance.document_file else ''
+
+
+@receiver(post_save, sender=TypingOrder)
+def typing_order_saved(sender, instance, created, raw=False, **kwargs):
+    """Count the pages of a newly attached or replaced document in the background"""
+    if raw or not instance.document_file:
+        return
+    if created or instance.document_file.name != instance._analyzed_document:
+        instance._analyzed_document = instance.document_file.name
+        jobs.enqueue(documents.analyze_typing_order, instance.pk)
+
+
+@receiver(post_save, sender=TypingOrder)
+def typing_slip_saved(sender, instance, raw=False, **kwargs):
+    """Strip, downsize and thumbnail a newly uploaded payment slip in the background"""
+    if raw:
+        return
+    images.schedule_slip(instance)
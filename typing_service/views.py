@@ -9,10 +9,15 @@ from django.core.paginator import Paginator
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from django.db import transaction
 import json
-from .models import TypingOrder
+from .models import TypingOrder, TypingPriceSettings
 from .forms import TypingOrderForm
 from print_service.models import PaymentSettings # Import settings
+from print_service import accessory_catalog, order_lines, staging
+from core import customers
+from core.images import srcset
+from jobs import queue as jobs
 
 
 @login_required
@@ -22,36 +27,32 @@ def order_create_view(request):
     """
     if request.method == 'POST':
         form = TypingOrderForm(request.POST, request.FILES)
+        # A document sent through the resumable upload API arrives as a token
+        upload_token = request.POST.get('upload_token')
+        owner = staging.session_owner(request)
+        if upload_token:
+            try:
+                staging.read_complete(upload_token, owner=owner)
+            except staging.StagingError:
+                form.add_error('document_file', _('The uploaded document was not found or is incomplete.'))
         if form.is_valid():
-            order = form.save(commit=False)
-            # Set email from authenticated user
-            if request.user.is_authenticated:
-                order.user_email = request.user.email
-            order.save()
+            with transaction.atomic():
+                order = form.save(commit=False)
+                # Set email from authenticated user
+                if request.user.is_authenticated:
+                    order.user_email = request.user.email
+                    order.user = request.user
+                if upload_token:
+                    staging.save_to(upload_token, order.document_file, owner=owner)
+                order.save()
 
-            # Handle selected accessories
-            import json
-            selected_accessories = request.POST.get('selected_accessories')
-            if selected_accessories:
-                try:
-                    accessories_data = json.loads(selected_accessories)
-                    from print_service.models import Accessory
-                    from .models import TypingOrderAccessory
-                    for acc_data in accessories_data:
-                        accessory_id = acc_data.get('id')
-                        quantity = acc_data.get('quantity', 1)
-                        try:
-                            accessory = Accessory.objects.get(id=accessory_id)
-                            TypingOrderAccessory.objects.create(
-                                order=order,
-                                accessory=accessory,
-                                quantity=quantity,
-                                price=accessory.base_price * quantity
-                            )
-                        except Accessory.DoesNotExist:
-                            continue
-                except (json.JSONDecodeError, ValueError):
-                    pass
+                # Handle selected accessories
+                selected_accessories = request.POST.get('selected_accessories')
+                if selected_accessories:
+                    try:
+                        order_lines.add_accessories(order, json.loads(selected_accessories), 'typing')
+                    except ValueError:
+                        pass
 
             # Send confirmation email
             if order.user_email:
@@ -63,31 +64,23 @@ def order_create_view(request):
                     'order': order,
                     'track_url': track_url,
                 })
-                send_mail(
-                    subject,
+                jobs.enqueue(
+                    send_mail,
+                    str(subject),
                     '', # Plain text version (optional)
                     'noreply@smartoffice.com',
                     [order.user_email],
                     html_message=html_message,
-                    fail_silently=True # Prevents crashing if email fails
+                    priority=10,
                 )
 
             return redirect('typing_service:order_submitted', order_id=order.id)
     else:
         form = TypingOrderForm()
     
-    # Get accessories grouped by category
-    from print_service.models import Accessory
-    accessories = Accessory.objects.filter(is_active=True, service_type__in=['typing', 'both'])
-    accessories_by_category = {}
-    for accessory in accessories:
-        if accessory.category not in accessories_by_category:
-            accessories_by_category[accessory.category] = []
-        accessories_by_category[accessory.category].append(accessory)
-    
     return render(request, 'typing_service/order_create.html', {
         'form': form,
-        'accessories_by_category': accessories_by_category,
+        'accessories_by_category': accessory_catalog.by_category('typing'),
     })
 
 
@@ -130,7 +123,7 @@ def track_order_view(request):
         current_step_index = progress_steps.index(order.status)
 
     # --- Define progress steps and bank info for the template ---
-    bank_info = PaymentSettings.objects.first() # Get bank details
+    bank_info = PaymentSettings.load() # Get bank details
 
     # --- Handle POST requests for final approval ---
     if request.method == 'POST' and order:
@@ -157,7 +150,7 @@ def my_orders(request):
     """My Orders page for authenticated users"""
     user_email = request.user.email
     
-    orders = TypingOrder.objects.filter(user_email=user_email).order_by('-created_at')
+    orders = TypingOrder.objects.filter(user=request.user).order_by('-created_at')
     
     # Pagination
     paginator = Paginator(orders, 10)
@@ -189,25 +182,12 @@ def api_create_order(request):
             description=data.get('description', ''),
             page_count=data.get('page_count', 1),
             delivery_option=data.get('delivery_option', 'email'),
-            status='pending_review'
+            status='pending_review',
+            user=request.user if request.user.is_authenticated else None,
         )
         
         # Handle accessories if provided
-        accessories = data.get('accessories', [])
-        if accessories:
-            from print_service.models import Accessory
-            from .models import TypingOrderAccessory
-            for acc_data in accessories:
-                try:
-                    accessory = Accessory.objects.get(id=acc_data['id'])
-                    TypingOrderAccessory.objects.create(
-                        order=order,
-                        accessory=accessory,
-                        quantity=acc_data.get('quantity', 1),
-                        price=accessory.base_price * acc_data.get('quantity', 1)
-                    )
-                except Accessory.DoesNotExist:
-                    continue
+        order_lines.add_accessories(order, data.get('accessories', []), 'typing')
         
         return JsonResponse({
             'success': True,
@@ -234,7 +214,10 @@ def api_user_orders(request):
         }, status=400)
     
     try:
-        orders = TypingOrder.objects.filter(user_email=user_email).order_by('-created_at')
+        orders = TypingOrder.objects.filter(
+            email_normalized=customers.normalize_email(user_email)
+        ).order_by('-created_at')
+        pricing_settings = TypingPriceSettings.load()
         
         orders_data = []
         for order in orders:
@@ -252,6 +235,8 @@ def api_user_orders(request):
                 'user_phone': order.user_phone,
                 'description': order.description,
                 'page_count': order.page_count,
+                'detected_page_count': order.detected_page_count,
+                'quoted_price': order.calculate_quote(pricing_settings) if pricing_settings else None,
                 'delivery_option': order.delivery_option,
                 'status': order.status,
                 'created_at': order.created_at.isoformat(),
@@ -275,25 +260,17 @@ def api_user_orders(request):
 def api_accessories(request):
     """API endpoint to get available accessories for typing service"""
     try:
-        from print_service.models import Accessory
-        
-        accessories = Accessory.objects.filter(
-            is_active=True,
-            service_type__in=['typing', 'both']
-        )
-        
         accessories_by_category = {}
-        for accessory in accessories:
-            if accessory.category not in accessories_by_category:
-                accessories_by_category[accessory.category] = []
-            
-            accessories_by_category[accessory.category].append({
+        for category, accessories in accessory_catalog.by_category('typing').items():
+            accessories_by_category[category] = [{
                 'id': accessory.id,
                 'name': accessory.name,
                 'description': accessory.description,
                 'base_price': accessory.base_price,
-                'category': accessory.category
-            })
+                'category': accessory.category,
+                'image': accessory.image.url if accessory.image else '',
+                'srcset': srcset(accessory),
+            } for accessory in accessories]
         
         return JsonResponse({
             'success': True,
@@ -309,20 +286,11 @@ def api_accessories(request):
 
 def debug_accessories(request):
     """Debug view to check accessories data"""
-    from print_service.models import Accessory
     from .forms import TypingOrderForm
     
     form = TypingOrderForm()
     
-    # Get accessories grouped by category
-    accessories = Accessory.objects.filter(is_active=True, service_type__in=['typing', 'both'])
-    accessories_by_category = {}
-    for accessory in accessories:
-        if accessory.category not in accessories_by_category:
-            accessories_by_category[accessory.category] = []
-        accessories_by_category[accessory.category].append(accessory)
-    
     return render(request, 'typing_service/debug_accessories.html', {
         'form': form,
-        'accessories_by_category': accessories_by_category,
+        'accessories_by_category': accessory_catalog.by_category('typing'),
     })